@@ -0,0 +1,1022 @@
+import io
+import os
+import sys
+import json
+import uuid
+import time
+import random
+import tempfile
+import argparse
+import datetime
+import threading
+import subprocess
+import tracemalloc
+from typing import Callable, TextIO
+
+import bcrypt
+import psycopg2.extensions
+from concurrent.futures import ThreadPoolExecutor
+
+import bulk
+import cache
+import database
+import dedupe
+from database import Database
+from driver import Bot, drive
+from functions import ConsoleIO, Session, ScriptedIO
+from hashing import PasswordHasher
+from journal import AnswerJournal, JournaledStorage
+from metrics import Metrics
+from ordering import QuestionOrder
+from profiling import MenuTimers
+from question_store import QuestionStore
+from questionpack import QuestionPack, build_pack
+from render import CLEAR, Renderer
+from storage import (REPORT_EASIEST_QUESTIONS, REPORT_HARDEST_QUESTIONS, REPORT_MOST_ACTIVE_USERS, REPORT_MOST_CORRECT_USERS,
+                     REPORT_QUESTION_STATISTICS, REPORT_USER_ANSWERS, MemoryStorage, SQLiteStorage, Storage, rows_from_storage)
+
+# Benchmarks run against their own database so the game's `trivia` database is left untouched
+BENCH_DB_NAME: str = 'trivia_bench'
+BENCH_USERNAME: str = 'benchmark'
+# --compare lists the values that changed by at least this much
+COMPARE_THRESHOLD: float = 0.1
+
+
+def seed_questions(db: Database, total: int):
+    # Top the question bank up to `total` rows in a single statement
+    count = db.query("SELECT COUNT(*) FROM questions", 1)[0]
+    if count < total:
+        db.query(f"""
+            INSERT INTO questions (question, answer_1, answer_2, answer_3, answer_4, correct_answer)
+            SELECT 'Benchmark question #' || n, 'Answer 1', 'Answer 2', 'Answer 3', 'Answer 4', 1 + n % 4
+            FROM generate_series({count + 1}, {total}) AS n
+        """, commit=True)
+
+
+def get_bench_user(db: Database) -> int:
+    user_id = db.get_user_id(BENCH_USERNAME)
+    if user_id is None:
+        user_id = db.create_user(BENCH_USERNAME, 'benchmark1!', 'benchmark@example.com', datetime.date(2000, 1, 1))
+    return user_id
+
+
+def timed(function, repeat: int) -> float:
+    # Mean wall-clock time of a call in milliseconds
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+def first_page(storage: Storage, report: str) -> list[tuple]:
+    # What a statistics menu option reads before waiting for the admin
+    with storage.open_report(report) as pager:
+        return pager.page(0)
+
+
+def bench_question_lookup(db: Database, total: int = 100_000, repeat: int = 200):
+    """Next-question latency at increasing depths: keyset cursor vs. the former OFFSET scan."""
+    seed_questions(db, total)
+    user_id = get_bench_user(db)
+    print(f"{'depth':>8} | {'keyset (ms)':>12} | {'offset (ms)':>12}")
+    for depth in (1, 1_000, 10_000, 50_000, total):
+        # Place the user's cursor right before the `depth`-th question
+        cursor_id = db.query(f"SELECT COALESCE(MAX(id), 0) FROM (SELECT id FROM questions ORDER BY id LIMIT {depth - 1}) q", 1)[0]
+        db.query(f"""
+            INSERT INTO players (user_id, questions_solved, last_question_id) VALUES ({user_id}, {depth - 1}, {cursor_id})
+            ON CONFLICT (season, user_id) DO UPDATE SET questions_solved = EXCLUDED.questions_solved, last_question_id = EXCLUDED.last_question_id
+        """, commit=True)
+
+        keyset = timed(lambda: db.get_user_question(user_id), repeat)
+        offset = timed(lambda: db.query(f"SELECT * FROM questions ORDER BY id ASC LIMIT 1 OFFSET {depth - 1}", 1), repeat)
+        print(f"{depth:>8} | {keyset:>12.3f} | {offset:>12.3f}")
+    db.reset_user_answers(user_id)
+
+
+def bench_concurrent_players(db: Database, players: int = 200, questions: int = 25):
+    """Stress test: `players` threads play through the same Database at once, then the per-user invariants are checked."""
+    seed_questions(db, questions)
+    # Accounts are inserted directly, hashing 200 bcrypt passwords would dominate the run
+    password = bcrypt.hashpw(b'stress1!', bcrypt.gensalt(4)).decode('utf-8')
+    db.query(f"""
+        INSERT INTO users (username, password, email, dob)
+        SELECT 'stress_' || n, '{password}', 'stress@example.com', DATE '2000-01-01'
+        FROM generate_series(1, {players}) AS n
+        WHERE NOT EXISTS (SELECT 1 FROM users WHERE username = 'stress_' || n)
+    """, commit=True)
+
+    errors: list[BaseException] = []
+    barrier = threading.Barrier(players)
+
+    def player(number: int):
+        try:
+            barrier.wait()
+            user_id = db.get_user_id(f'stress_{number}')
+            db.reset_user_answers(user_id)
+            db.update_user_play_timestamp(user_id)
+            for _ in range(questions):
+                question = db.get_user_question(user_id)
+                db.handle_user_answer(user_id, question[0], 1 + number % 4)
+            db.get_user_statistics(user_id)
+            db.query("SELECT COUNT(*) FROM players WHERE season = current_season() AND questions_solved <> 0", 1)
+        except BaseException as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=player, args=(number,)) for number in range(1, players + 1)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    # Invariant: every player's counter and cursor match the answers that were stored for them
+    drifted = db.query(f"""
+        SELECT COUNT(*) FROM users u
+        LEFT JOIN players p ON p.season = current_season() AND p.user_id = u.id
+        WHERE u.username LIKE 'stress\\_%' AND (p.questions_solved IS DISTINCT FROM {questions}
+            OR p.questions_solved <> (SELECT COUNT(*) FROM user_answers ua WHERE ua.season = p.season AND ua.user_id = u.id)
+            OR p.last_question_id <> (SELECT MAX(question_id) FROM user_answers ua WHERE ua.season = p.season AND ua.user_id = u.id))
+    """, 1)[0]
+    print(f"{players} players x {questions} answers in {elapsed:.2f}s ({players * questions / elapsed:.0f} answers/s, pool size {db.pool_size})")
+    print(f"errors: {len(errors)} | players with inconsistent progress: {drifted}")
+    for e in errors[:5]:
+        print(f"  {type(e).__name__}: {e}")
+
+
+class ProbeIO(ScriptedIO):
+    # Samples stack depth on every prompt and traced memory every `interval` prompts
+    def __init__(self, lines, interval: int = 10_000):
+        super().__init__(lines)
+        self.interval = interval
+        self.max_depth: int = 0
+        self.memory_samples: list[tuple[int, int]] = []
+
+    def input(self, prompt: str = '') -> str:
+        depth, frame = 0, sys._getframe()
+        while frame is not None:
+            depth, frame = depth + 1, frame.f_back
+        self.max_depth = max(self.max_depth, depth)
+        if self.prompts % self.interval == 0:
+            self.memory_samples.append((self.prompts, tracemalloc.get_traced_memory()[0]))
+        return super().input(prompt)
+
+
+def bench_long_session(db: Database, questions: int = 50_000):
+    """Plays `questions` questions in a single headless session, stack depth and memory must stay flat."""
+    seed_questions(db, questions)
+    user_id = get_bench_user(db)
+    db.reset_user_answers(user_id)
+
+    def script():
+        yield from ('1', BENCH_USERNAME, 'benchmark1!', '1')
+        for _ in range(questions):
+            yield from ('1', '')
+        yield from ('5', '4')
+
+    io = ProbeIO(script())
+    tracemalloc.start()
+    start = time.perf_counter()
+    Session(db, io).run()
+    elapsed = time.perf_counter() - start
+    tracemalloc.stop()
+
+    answered = db.get_user_questions_solved(user_id)
+    print(f"answered {answered} questions in {elapsed:.1f}s, max stack depth {io.max_depth} frames")
+    for prompts, memory in io.memory_samples:
+        print(f"  after {prompts:>7} prompts: {memory / 1024:>8.1f} KiB traced")
+    db.reset_user_answers(user_id)
+
+
+class CountingCursor(psycopg2.extensions.cursor):
+    def execute(self, query, vars=None):
+        CountingConnection.round_trips += 1
+        return super().execute(query, vars)
+
+
+class CountingConnection(psycopg2.extensions.connection):
+    # Counts statements and transaction ends that actually reach the server
+    round_trips: int = 0
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cursor_factory = CountingCursor
+
+    def commit(self):
+        if self.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            CountingConnection.round_trips += 1
+        return super().commit()
+
+    def rollback(self):
+        if self.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            CountingConnection.round_trips += 1
+        return super().rollback()
+
+
+def bench_play_round_trips(db: Database, questions: int = 2_000):
+    """Round trips and latency per answered question: the former call sequence vs. the combined play_step."""
+    seed_questions(db, questions)
+    counted = Database(pool_size=1, connection_factory=CountingConnection)
+    counted.connect()
+    user_id = get_bench_user(counted)
+
+    def legacy():
+        if counted.get_user_play_timestamp(user_id) is None:
+            counted.update_user_play_timestamp(user_id)
+        question = counted.get_user_question(user_id)
+        counted.handle_user_answer(user_id, question[0], 1)
+
+    def combined():
+        question = counted.play_step(user_id)[1]
+        for _ in range(questions):
+            question = counted.play_step(user_id, question[0], 1)[1]
+
+    print(f"{'path':>10} | {'round trips/question':>20} | {'ms/question':>11}")
+    for name, run in (('legacy', lambda: [legacy() for _ in range(questions)]), ('play_step', combined)):
+        counted.reset_user_answers(user_id)
+        CountingConnection.round_trips = 0
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        print(f"{name:>10} | {CountingConnection.round_trips / questions:>20.2f} | {elapsed * 1000 / questions:>11.3f}")
+    counted.reset_user_answers(user_id)
+    counted.disconnect()
+
+
+def bench_bulk_import(db: Database, rows: int = 250_000, interactive_rows: int = 2_000):
+    """Rows/sec of the streaming COPY import and export vs. one create_question call per row."""
+    first_id = db.query("SELECT COALESCE(MAX(id), 0) FROM questions", 1)[0]
+    with tempfile.TemporaryDirectory() as directory:
+        for file_format in ('csv', 'jsonl'):
+            path = os.path.join(directory, f'questions.{file_format}')
+            with open(path, 'w', newline='', encoding='utf-8') as file:
+                if file_format == 'csv':
+                    file.write(','.join(bulk.QUESTION_COLUMNS) + '\n')
+                for n in range(rows):
+                    record = (f'Imported question #{n}?', 'Answer 1', 'Answer 2', 'Answer 3', 'Answer 4', 1 + n % 4)
+                    if file_format == 'csv':
+                        file.write(','.join(map(str, record)) + '\n')
+                    else:
+                        file.write(json.dumps(dict(zip(bulk.QUESTION_COLUMNS, record))) + '\n')
+
+            start = time.perf_counter()
+            imported, rejected = bulk.import_questions(db, path, progress=None)
+            elapsed = time.perf_counter() - start
+            print(f"import {file_format:>5}: {imported} rows in {elapsed:.2f}s ({imported / elapsed:,.0f} rows/s, {rejected} rejected)")
+
+            start = time.perf_counter()
+            exported = bulk.export_questions(db, path, progress=None)
+            elapsed = time.perf_counter() - start
+            print(f"export {file_format:>5}: {exported} rows in {elapsed:.2f}s ({exported / elapsed:,.0f} rows/s)")
+
+    start = time.perf_counter()
+    for n in range(interactive_rows):
+        db.create_question(f'Created question #{n}?', 'Answer 1', 'Answer 2', 'Answer 3', 'Answer 4', 1 + n % 4)
+    elapsed = time.perf_counter() - start
+    print(f"create_question: {interactive_rows} rows in {elapsed:.2f}s ({interactive_rows / elapsed:,.0f} rows/s)")
+
+    db.query(f"DELETE FROM questions WHERE id > {first_id}", commit=True)
+
+
+def bench_logins(db: Database, clients: int = 16, seconds: float = 2.0):
+    """Logins/sec of `clients` concurrent players for several bcrypt pool sizes and work factors."""
+    get_bench_user(db)
+    cores = os.cpu_count() or 1
+    print(f"{cores} CPU core(s), {clients} concurrent clients")
+    print(f"{'rounds':>6} | {'workers':>7} | {'logins/s':>9}")
+    for rounds in (4, 8, 10, 12):
+        for workers in sorted({0, 1, cores, cores * 2}):
+            hasher = PasswordHasher(rounds, workers)
+            pooled = Database(pool_size=clients, hasher=hasher)
+            pooled.connect()
+            # First login moves the stored hash to this work factor, and warms the worker processes up
+            assert pooled.is_password_matching(BENCH_USERNAME, 'benchmark1!')
+            logins = max(clients, int(seconds / (0.3 * 2 ** (rounds - 12)) * max(workers, 1)))
+            start = time.perf_counter()
+            with ThreadPoolExecutor(clients) as executor:
+                list(executor.map(lambda _: pooled.is_password_matching(BENCH_USERNAME, 'benchmark1!'), range(logins)))
+            elapsed = time.perf_counter() - start
+            print(f"{rounds:>6} | {workers if workers else 'inline':>7} | {logins / elapsed:>9.1f}")
+            pooled.disconnect()
+
+
+def bench_storage_engines(db: Database, questions: int = 2_000, users: int = 50, repeat: int = 500):
+    """Per-operation latency of the same workload on every storage engine, each starting empty."""
+    hasher = PasswordHasher(4, 0)
+    scratch = Database(hasher=hasher, dbname=f"{BENCH_DB_NAME}_engines")
+    scratch.drop_database()
+    with tempfile.TemporaryDirectory() as directory:
+        engines: dict[str, Storage] = {
+            'memory': MemoryStorage(hasher),
+            'sqlite': SQLiteStorage(os.path.join(directory, 'trivia.sqlite3'), hasher),
+            'postgres': scratch,
+        }
+        results: dict[str, dict[str, float]] = {}
+        for name, engine in engines.items():
+            engine.connect()
+            timings = results[name] = {}
+            timings['create_question'] = timed(lambda: engine.create_question('Question?', 'A', 'B', 'C', 'D', 1), questions)
+            numbers = iter(range(users))
+            timings['create_user'] = timed(lambda: engine.create_user(f'engine_{next(numbers)}', 'engine1!', 'engine@example.com', datetime.date(2000, 1, 1)), users)
+            user_ids = [engine.get_user_id(f'engine_{n}') for n in range(users)]
+            timings['get_user_id'] = timed(lambda: engine.get_user_id('engine_0'), repeat)
+            timings['get_user_question'] = timed(lambda: engine.get_user_question(user_ids[0]), repeat)
+
+            # Every user answers `repeat / users` questions, so the leaderboard has something to rank
+            answers = [(user_id, n) for n in range(max(repeat // users, 1)) for user_id in user_ids]
+            pending = iter(answers)
+            questions_on_screen = {user_id: engine.play_step(user_id)[1] for user_id in user_ids}
+
+            def answer():
+                user_id, n = next(pending)
+                questions_on_screen[user_id] = engine.play_step(user_id, questions_on_screen[user_id][0], 1 + n % 4)[1]
+            timings['play_step'] = timed(answer, len(answers))
+            timings['get_hall_of_fame'] = timed(lambda: engine.get_hall_of_fame(10, 10), repeat)
+            timings['get_user_rank'] = timed(lambda: engine.get_user_rank(user_ids[-1]), repeat)
+            timings['get_user_statistics'] = timed(lambda: engine.get_user_statistics(user_ids[0]), repeat)
+            timings['hardest questions page'] = timed(lambda: first_page(engine, REPORT_HARDEST_QUESTIONS), repeat // 10)
+            users_to_reset = iter(user_ids)
+            timings['reset_user_answers'] = timed(lambda: engine.reset_user_answers(next(users_to_reset)), users)
+            engine.disconnect()
+
+    print(f"{'operation (ms)':>22} | " + ' | '.join(f'{name:>9}' for name in results))
+    for operation in results['memory']:
+        print(f"{operation:>22} | " + ' | '.join(f'{timings[operation]:>9.4f}' for timings in results.values()))
+
+
+def bench_metrics_overhead(db: Database, questions: int = 2_000, repeat: int = 5):
+    """Cost of the query instrumentation: the same play-through with and without metrics, best of `repeat` runs."""
+    seed_questions(db, questions)
+    user_id = get_bench_user(db)
+    game_metrics = Metrics()
+    databases = {'off': Database(pool_size=1), 'on': Database(pool_size=1, metrics=game_metrics)}
+    results: dict[str, float] = {name: float('inf') for name in databases}
+    for instrumented in databases.values():
+        instrumented.connect()
+    # Interleaved runs, so drift on the machine hits both sides alike
+    for _ in range(repeat):
+        for name, instrumented in databases.items():
+            def play():
+                question = instrumented.play_step(user_id)[1]
+                for _ in range(questions):
+                    question = instrumented.play_step(user_id, question[0], 1)[1]
+                    instrumented.get_user_rank(user_id)
+                instrumented.reset_user_answers(user_id)
+            results[name] = min(results[name], timed(play, 1) / (questions * 2))
+    for instrumented in databases.values():
+        instrumented.disconnect()
+
+    scratch = Metrics()
+    start = time.perf_counter()
+    for _ in range(100_000):
+        scratch.observe_method('play_step', 0.001, 1, False, 0.0001)
+    observe = (time.perf_counter() - start) * 10
+    print(f"metrics off: {results['off']:.4f} ms/call | metrics on: {results['on']:.4f} ms/call "
+          f"| overhead {(results['on'] / results['off'] - 1) * 100:+.1f}% | observe_method {observe:.2f} µs")
+    print(f"play_step p50/p95/p99: " + ' / '.join(f"{game_metrics.methods['play_step'].latency.quantile(q) * 1000:.3f}ms" for q in (0.5, 0.95, 0.99)))
+
+
+def bench_query_cache(db: Database, views: int = 5_000, writes_every: int = 50, players: int = 200):
+    """Database round trips of a read-heavy admin workload (statistics and Hall of Fame views, a few answers in between)."""
+    seed_questions(db, 1_000)
+    db.query(f"""
+        INSERT INTO users (username, password, email, dob)
+        SELECT 'cache_' || n, 'x', 'cache@example.com', '2000-01-01' FROM generate_series(1, {players}) AS n
+        ON CONFLICT (username) DO NOTHING
+    """, commit=True)
+    user_ids = [db.get_user_id(f'cache_{n}') for n in range(1, players + 1)]
+    counted = Database(pool_size=1, connection_factory=CountingConnection)
+    counted.connect()
+    cached = cache.CachedStorage(counted)
+    print(f"{views} views, one answer every {writes_every} views")
+    print(f"{'storage':>8} | {'round trips':>11} | {'ms/view':>8} | cache")
+    for name, storage in (('direct', counted), ('cached', cached)):
+        for user_id in user_ids:
+            counted.reset_user_answers(user_id)
+        # What the statistics menu shows: the first page of each report
+        screens = (storage.count_players, lambda: first_page(storage, REPORT_EASIEST_QUESTIONS), lambda: first_page(storage, REPORT_HARDEST_QUESTIONS),
+                   lambda: first_page(storage, REPORT_MOST_CORRECT_USERS), lambda: first_page(storage, REPORT_MOST_ACTIVE_USERS),
+                   lambda: first_page(storage, REPORT_QUESTION_STATISTICS), lambda: storage.get_hall_of_fame(10, 0),
+                   lambda: storage.get_hall_of_fame(10, 10), lambda: storage.get_user_rank(user_ids[0]))
+        questions = {user_id: storage.play_step(user_id)[1] for user_id in user_ids}
+        CountingConnection.round_trips = 0
+        start = time.perf_counter()
+        for view in range(views):
+            screens[view % len(screens)]()
+            if view % writes_every == writes_every - 1:
+                user_id = user_ids[view // writes_every % players]
+                if questions[user_id] is not None:
+                    questions[user_id] = storage.play_step(user_id, questions[user_id][0], 1)[1]
+        elapsed = time.perf_counter() - start
+        stats = cached.cache.stats() if storage is cached else {}
+        hit_rate = f"{stats['hits'] / max(stats['hits'] + stats['misses'], 1):.0%} hits ({stats['hits']} hits, {stats['misses']} misses)" if stats else '-'
+        print(f"{name:>8} | {CountingConnection.round_trips:>11} | {elapsed * 1000 / views:>8.3f} | {hit_rate}")
+    for user_id in user_ids:
+        counted.reset_user_answers(user_id)
+    counted.disconnect()
+
+
+def bench_question_store(db: Database, total: int = 100_000, repeat: int = 2_000):
+    """Memory per 100k questions of the in-process store vs. the fetched rows, and next-question latency vs. the database."""
+    seed_questions(db, total)
+    user_id = get_bench_user(db)
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    rows = db.get_questions(0, total)
+    as_tuples = tracemalloc.get_traced_memory()[0] - before
+    del rows
+    before = tracemalloc.get_traced_memory()[0]
+    questions = QuestionStore(db)
+    start = time.perf_counter()
+    questions.refresh()
+    load = time.perf_counter() - start
+    as_store = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    per_100k = 100_000 / len(questions)
+    print(f"{len(questions)} questions loaded in {load:.2f}s")
+    print(f"memory per 100k questions: tuples {as_tuples * per_100k / 2 ** 20:.1f} MiB | store {as_store * per_100k / 2 ** 20:.1f} MiB "
+          f"(memory_usage() {questions.memory_usage() * per_100k / 2 ** 20:.1f} MiB)")
+
+    ids = questions.bank.ids
+    positions = [ids[n * (len(ids) - 1) // repeat] for n in range(repeat)]
+    lookups = iter(positions)
+    store = timed(lambda: questions.next_question(next(lookups)), repeat)
+    db.query(f"""
+        INSERT INTO players (user_id, last_question_id) VALUES ({user_id}, {positions[len(positions) // 2]})
+        ON CONFLICT (season, user_id) DO UPDATE SET last_question_id = EXCLUDED.last_question_id
+    """, commit=True)
+    database_lookup = timed(lambda: db.get_user_question(user_id), repeat)
+    db.reset_user_answers(user_id)
+    print(f"next question: store {store * 1000:.2f} µs | database {database_lookup * 1000:.2f} µs")
+
+
+# Run in a fresh interpreter by `bench_question_pack`: opens the bank one way, plays `lookups` questions and prints
+# the seconds it took plus the RSS it added (kB)
+COLD_START_SCRIPT: str = '''
+import sys, time
+import database
+from database import Database
+from question_store import QuestionStore
+from questionpack import QuestionPack
+
+def rss():
+    with open('/proc/self/status') as status:
+        return next(int(line.split()[1]) for line in status if line.startswith('VmRSS:'))
+
+source, path, lookups = sys.argv[1], sys.argv[2], int(sys.argv[3])
+before = rss()
+start = time.perf_counter()
+if source == 'pack':
+    questions = QuestionPack(path)
+else:
+    database.DB_NAME = path
+    db = Database()
+    db.connect()
+    questions = QuestionStore(db)
+    questions.refresh()
+question = questions.next_question(0)
+for _ in range(lookups - 1):
+    question = questions.next_question(question[0])
+print(time.perf_counter() - start, rss() - before)
+'''
+
+
+def bench_question_pack(db: Database, total: int = 100_000, lookups: int = 50):
+    """Cold start and RSS of a fresh process opening the bank from a question pack vs. loading it from the database."""
+    seed_questions(db, total)
+    path = os.path.join(tempfile.gettempdir(), 'trivia_bench.pack')
+    start = time.perf_counter()
+    count = build_pack(rows_from_storage(db), path)
+    print(f"{count} questions packed in {time.perf_counter() - start:.2f}s ({os.path.getsize(path) / 2 ** 20:.1f} MiB)")
+
+    def cold_start(source: str, target: str) -> tuple[float, int]:
+        output = subprocess.run([sys.executable, '-c', COLD_START_SCRIPT, source, target, str(lookups)], capture_output=True, text=True,
+                                check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+        seconds, rss = output.split()[-2:]
+        return float(seconds), int(rss)
+
+    # Warm the page cache for both so the comparison isn't about the disk
+    cold_start('pack', path)
+    cold_start('database', BENCH_DB_NAME)
+    pack_seconds, pack_rss = cold_start('pack', path)
+    database_seconds, database_rss = cold_start('database', BENCH_DB_NAME)
+    print(f"cold start + {lookups} questions: pack {pack_seconds * 1000:.1f} ms, +{pack_rss / 1024:.1f} MiB RSS | "
+          f"database {database_seconds * 1000:.1f} ms, +{database_rss / 1024:.1f} MiB RSS")
+
+    pack = QuestionPack(path)
+    questions = QuestionStore(db)
+    questions.refresh()
+    ids = questions.bank.ids
+    positions = [ids[n * (len(ids) - 1) // 2_000] for n in range(2_000)]
+    lookups_pack, lookups_store = iter(positions), iter(positions)
+    pack_lookup = timed(lambda: pack.next_question(next(lookups_pack)), len(positions))
+    store_lookup = timed(lambda: questions.next_question(next(lookups_store)), len(positions))
+    print(f"next question: pack {pack_lookup * 1000:.2f} µs | store {store_lookup * 1000:.2f} µs")
+    pack.close()
+    os.remove(path)
+
+
+def bench_report_paging(db: Database, answers: int = 100_000, pages: int = 5):
+    """Peak client memory and time to first rows of a power user's answers: fetchall vs. paging (a keyset read per page) vs. CSV streaming."""
+    seed_questions(db, answers)
+    user_id = db.get_user_id('benchmark_reports') or db.create_user('benchmark_reports', 'benchmark1!', 'reports@example.com', datetime.date(2000, 1, 1))
+    # Raw answers only, so the counters of the other benchmarks aren't touched
+    db.query(f"""
+        INSERT INTO user_answers (user_id, question_id, is_correct, answer_timestamp)
+        SELECT {user_id}, id, id % 3 <> 0, CURRENT_TIMESTAMP FROM questions ORDER BY id LIMIT {answers}
+        ON CONFLICT DO NOTHING
+    """, commit=True)
+
+    def measure(function) -> tuple[float, float]:
+        tracemalloc.start()
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return elapsed, peak / 2 ** 20
+
+    def page_through():
+        with db.open_report(REPORT_USER_ANSWERS, (user_id,)) as pager:
+            for number in (0, 1, pager.pages // 2, pager.pages - 1, 0)[:pages]:
+                pager.page(number)
+
+    path = os.path.join(tempfile.gettempdir(), 'trivia_bench_report.csv')
+    try:
+        for name, function in (("fetchall", lambda: db.get_user_answers(user_id)),
+                               (f"pager ({pages} pages)", page_through),
+                               ("CSV export", lambda: bulk.export_report(db, REPORT_USER_ANSWERS, path, (user_id,), progress=None))):
+            elapsed, peak = measure(function)
+            print(f"{name}: {elapsed * 1000:.0f} ms, peak {peak:.2f} MiB")
+    finally:
+        db.query(f"DELETE FROM user_answers WHERE user_id = {user_id}", commit=True)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def bench_answer_journal(db: Database, players: int = 8, answers: int = 1_000):
+    """Answers/sec of concurrent players answering synchronously vs. through the write-behind journal."""
+    seed_questions(db, answers)
+    questions = QuestionStore(db)
+    questions.refresh()
+    rows = [questions.bank.row(index) for index in range(answers)]
+    user_ids = [db.get_user_id(f'journal_{n}') or db.create_user(f'journal_{n}', 'journal1!', f'journal_{n}@example.com', datetime.date(2000, 1, 1))
+                for n in range(players)]
+    path = os.path.join(tempfile.gettempdir(), 'trivia_bench.journal')
+    for leftover in (path, f'{path}.checkpoint'):
+        if os.path.exists(leftover):
+            os.remove(leftover)
+
+    def run(storage: Storage) -> float:
+        for user_id in user_ids:
+            db.reset_user_answers(user_id)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(players) as executor:
+            list(executor.map(lambda user_id: [storage.handle_user_answer(user_id, row[0], row[6]) for row in rows], user_ids))
+        return time.perf_counter() - start
+
+    synchronous = run(db)
+    journaled = JournaledStorage(db, questions, AnswerJournal(db, path))
+    journaled.journal.open()
+    acknowledged = run(journaled)
+    start = time.perf_counter()
+    journaled.journal.sync()
+    drained = acknowledged + time.perf_counter() - start
+    stats = journaled.journal.stats()
+    journaled.journal.close()
+    total = players * answers
+    solved = sum(db.get_user_questions_solved(user_id) for user_id in user_ids)
+    print(f"{total} answers from {players} players: synchronous {total / synchronous:.0f}/s | journal {total / acknowledged:.0f}/s acknowledged, "
+          f"{total / drained:.0f}/s recorded ({stats['batches']} batches, {solved} recorded)")
+    for user_id in user_ids:
+        db.reset_user_answers(user_id)
+    for leftover in (path, f'{path}.checkpoint'):
+        os.remove(leftover)
+
+
+def bench_prepared_statements(db: Database, questions: int = 2_000, repeat: int = 500, rounds: int = 5):
+    """Per-call latency of the login and play paths with plain SQL vs. PREPAREd statements (best of interleaved rounds)."""
+    seed_questions(db, questions)
+    user_id = get_bench_user(db)
+    engines = {'plain': Database(pool_size=1, prepare_statements=False), 'prepared': Database(pool_size=1)}
+    for engine in engines.values():
+        engine.connect()
+    question_ids = [row[0] for row in db.get_questions(0, repeat)]
+
+    def password(engine: Database):
+        with engine.cursor('get_user_password') as cursor:
+            engine.execute_prepared(cursor, 'get_user_password', (BENCH_USERNAME,))
+            return cursor.fetchone()
+
+    def answers(engine: Database, method: str) -> Callable[[], object]:
+        # Every call answers the next question, the user starts over before each timing
+        engine.reset_user_answers(user_id)
+        remaining = iter(question_ids)
+        if method == 'play_step':
+            return lambda: engine.play_step(user_id, next(remaining), 1)
+        return lambda: engine.handle_user_answer(user_id, next(remaining), 1)
+
+    calls: dict[str, Callable[[Database], Callable[[], object]]] = {
+        'get_user_id (login)': lambda engine: lambda: engine.get_user_id(BENCH_USERNAME),
+        'password lookup (login)': lambda engine: lambda: password(engine),
+        'get_user_questions_solved': lambda engine: lambda: engine.get_user_questions_solved(user_id),
+        'get_user_question': lambda engine: lambda: engine.get_user_question(user_id),
+        'handle_user_answer': lambda engine: answers(engine, 'handle_user_answer'),
+        'play_step': lambda engine: answers(engine, 'play_step'),
+    }
+    best: dict[tuple[str, str], float] = {}
+    for _ in range(rounds):
+        for call, make in calls.items():
+            for name, engine in engines.items():
+                elapsed = timed(make(engine), repeat)
+                best[call, name] = min(best.get((call, name), elapsed), elapsed)
+    db.reset_user_answers(user_id)
+    for engine in engines.values():
+        engine.disconnect()
+
+    print(f"{'call':>26} | {'plain µs':>9} | {'prepared µs':>11} | change")
+    for call in calls:
+        plain, prepared = best[call, 'plain'] * 1000, best[call, 'prepared'] * 1000
+        print(f"{call:>26} | {plain:>9.1f} | {prepared:>11.1f} | {(prepared - plain) / plain:+.0%}")
+
+
+def bench_season_rollover(db: Database, answers: int = 10_000_000, users: int = 1_000):
+    """Global reset of `answers` answers: starting a new season (a partition attach) vs. deleting them in place."""
+    per_user = answers // users
+    seed_questions(db, per_user)
+    password = bcrypt.hashpw(b'season1!', bcrypt.gensalt(4)).decode('utf-8')
+    db.query(f"""
+        INSERT INTO users (username, password, email, dob)
+        SELECT 'season_' || n, '{password}', 'season@example.com', DATE '2000-01-01'
+        FROM generate_series(1, {users}) AS n
+        WHERE NOT EXISTS (SELECT 1 FROM users WHERE username = 'season_' || n)
+    """, commit=True)
+    season = db.get_season()
+
+    # Every user answers the first `per_user` questions in the current season, with matching progress and leaderboard
+    start = time.perf_counter()
+    db.query(f"""
+        INSERT INTO user_answers (user_id, question_id, is_correct, answer_timestamp)
+        SELECT u.id, q.id, (u.id + q.id) % 3 <> 0, CURRENT_TIMESTAMP
+        FROM (SELECT id FROM users WHERE username LIKE 'season\\_%') u
+        CROSS JOIN (SELECT id FROM questions ORDER BY id LIMIT {per_user}) q
+        ON CONFLICT DO NOTHING
+    """, commit=True)
+    db.query("""
+        INSERT INTO players (user_id, questions_solved, last_question_id, play_timestamp)
+        SELECT user_id, COUNT(*), MAX(question_id), MIN(answer_timestamp) FROM user_answers
+        WHERE season = current_season() AND user_id IN (SELECT id FROM users WHERE username LIKE 'season\\_%')
+        GROUP BY user_id
+        ON CONFLICT (season, user_id) DO UPDATE SET questions_solved = EXCLUDED.questions_solved, last_question_id = EXCLUDED.last_question_id
+    """, commit=True)
+    db.query(f"""
+        INSERT INTO leaderboard (user_id, correct_answers, play_timestamp, last_answer_timestamp)
+        SELECT user_id, COUNT(*), MIN(answer_timestamp), MAX(answer_timestamp) FROM user_answers
+        WHERE season = current_season() AND is_correct AND user_id IN (SELECT id FROM users WHERE username LIKE 'season\\_%')
+        GROUP BY user_id
+        ON CONFLICT (season, user_id) DO UPDATE SET correct_answers = EXCLUDED.correct_answers
+    """, commit=True)
+    seeded = db.query(f"SELECT COUNT(*) FROM user_answers WHERE season = {season}", 1)[0]
+    print(f"season {season}: {seeded} answers seeded in {time.perf_counter() - start:.1f}s")
+
+    try:
+        # The former way: delete the season's rows in place (rolled back, so the season can be rolled over afterwards)
+        start = time.perf_counter()
+        with db.cursor('bench_season_rollover', commit=False) as cursor:
+            for table in ('user_answers', 'players', 'leaderboard', 'question_stats'):
+                cursor.execute(f"DELETE FROM {table} WHERE season = {season};")
+        deleting = time.perf_counter() - start
+
+        hall_of_fame = db.get_hall_of_fame()
+        start = time.perf_counter()
+        new_season = db.start_season()
+        rollover = time.perf_counter() - start
+        print(f"mass delete: {deleting:.2f}s | start_season: {rollover * 1000:.1f} ms ({deleting / rollover:.0f}x)")
+
+        # The finished season stays readable, the new one starts empty
+        start = time.perf_counter()
+        kept = db.get_hall_of_fame(season=season) == hall_of_fame
+        with db.open_report(REPORT_MOST_ACTIVE_USERS, season=season) as pager:
+            players = pager.total
+        print(f"season {season} after the rollover: Hall of Fame {'unchanged' if kept else 'CHANGED'}, {players} players "
+              f"({(time.perf_counter() - start) * 1000:.0f} ms) | season {new_season}: {db.count_players()} players")
+    finally:
+        # Keep the benchmark database small: the seeded rows go, the season itself stays
+        db.query(f"TRUNCATE user_answers_{season}", commit=True)
+        for table in ('players', 'leaderboard', 'question_stats'):
+            db.query(f"DELETE FROM {table} WHERE season = {season}", commit=True)
+
+
+def bench_question_order(db: Database, total: int = 1_000_000, repeat: int = 20_000, rounds: int = 5):
+    """Per-player question orders on a `total` question bank: build time, next-question latency (vs. id order and an
+    ORDER BY random() per request) and a full run through the bank checking every question comes exactly once."""
+    seed_questions(db, total)
+    questions = QuestionStore(db)
+    questions.refresh()
+    # Synthetic difficulty for every question without counters yet (right answers 0-10 out of 10), undone by a rebuild
+    db.query("""
+        INSERT INTO question_stats (question_id, correct_answers, incorrect_answers)
+        SELECT id, id % 11, 10 - id % 11 FROM questions
+        ON CONFLICT DO NOTHING
+    """, commit=True)
+    try:
+        orders = {'random': QuestionOrder(questions, seed=1), 'adaptive': QuestionOrder(questions, adaptive=True, seed=1)}
+        for name, order in orders.items():
+            start = time.perf_counter()
+            order.build(db)
+            print(f"{name}: built over {len(order.ids)} questions in {time.perf_counter() - start:.2f}s, bands {[len(band) for band in order.bands]}")
+
+        generator = random.Random(1)
+        sequences = {name: order.sequence(1, []) for name, order in orders.items()}
+        latencies = {name: timed(lambda: sequence.next_question(generator.random() < 0.5), repeat) for name, sequence in sequences.items()}
+        last = iter(range(1, repeat + 1))
+        latencies['id order'] = timed(lambda: questions.next_question(next(last)), repeat)
+        latencies['ORDER BY random()'] = timed(lambda: db.query("SELECT * FROM questions WHERE id NOT IN (1, 2, 3) ORDER BY random() LIMIT 1", 1), rounds)
+        print(' | '.join(f"{name} {latency * 1000:.1f} µs" for name, latency in latencies.items()))
+
+        for name, order in orders.items():
+            # A player who answered the first `repeat` questions of their order resumes after them, then plays the rest
+            served = [sequence_question[0] for sequence_question in iter(order.sequence(2, []).next_question, None)]
+            start = time.perf_counter()
+            resumed = order.sequence(2, served[:repeat])
+            rest = [question[0] for question in iter(lambda: resumed.next_question(generator.random() < 0.5), None)]
+            elapsed = time.perf_counter() - start
+            print(f"{name}: {len(served)} served, {len(set(served))} distinct, all of them {set(served) == set(order.ids)} | resumed: "
+                  f"{len(rest)} more in {elapsed:.1f}s, repeats {len(set(rest) & set(served[:repeat]))}")
+    finally:
+        db.rebuild_question_stats()
+
+
+DUPLICATE_OPENERS: tuple[str, ...] = ('What is', 'Which', 'Who was', 'In which year did', 'How many', 'Where is')
+
+
+def synthetic_questions(total: int, duplicates: float, seed: int = 1) -> tuple[list[str], dict[int, int]]:
+    """`total` made up questions (the bench database's are all alike) of which a `duplicates` share are copies of an
+    earlier one with a typo, two words swapped, a word added or the case and punctuation changed. Returns the texts
+    (question n has id n + 1) and the planted copies as {copy id: original id}."""
+    generator = random.Random(seed)
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    words = [''.join(generator.choices(letters, k=generator.randint(3, 9))) for _ in range(20_000)]
+    texts: list[str] = []
+    planted: dict[int, int] = {}
+    for n in range(total):
+        if texts and generator.random() < duplicates:
+            original = generator.randrange(len(texts))
+            text = texts[original]
+            edit = generator.randrange(4)
+            if edit == 0:
+                position = generator.randrange(len(text) - 1)
+                text = text[:position] + generator.choice(letters) + text[position + 1:]
+            elif edit == 1:
+                parts = text.split()
+                position = generator.randrange(len(parts) - 1)
+                parts[position], parts[position + 1] = parts[position + 1], parts[position]
+                text = ' '.join(parts)
+            elif edit == 2:
+                parts = text.split()
+                parts.insert(generator.randrange(len(parts) + 1), generator.choice(words))
+                text = ' '.join(parts)
+            else:
+                text = text.rstrip('?').upper() + ' ...'
+            planted[n + 1] = original + 1
+            texts.append(text)
+        else:
+            texts.append(f"{generator.choice(DUPLICATE_OPENERS)} {' '.join(generator.choices(words, k=generator.randint(5, 12)))}?")
+    return texts, planted
+
+
+def bench_duplicates(db: Database, total: int = 500_000, duplicates: float = 0.05, checks: int = 2_000, import_rows: int = 20_000):
+    """Near-duplicate index over `total` questions: build time and size, check latency vs. a scan of every signature,
+    the cluster report, how many planted copies it finds, and the cost of the check on a COPY import."""
+    texts, planted = synthetic_questions(total, duplicates)
+    index = dedupe.DuplicateIndex()
+    start = time.perf_counter()
+    index.load((n + 1, text) for n, text in enumerate(texts))
+    elapsed = time.perf_counter() - start
+    size = sum(len(part) * part.itemsize for part in (index.ids, index.signatures, *index.keys, *index.positions))
+    print(f"build: {len(index)} questions in {elapsed:.1f}s ({len(index) / elapsed:,.0f}/s), {size / 2 ** 20:.1f} MiB ({size / len(index):.0f} B/question)")
+
+    generator = random.Random(2)
+    copies = generator.sample(sorted(planted), checks)
+    found = sum(planted[copy] in {question_id for question_id, _ in index.find(texts[copy - 1])} for copy in copies)
+    queries = iter([texts[copy - 1] for copy in copies])
+    latency = timed(lambda: index.find(next(queries)), checks)
+
+    def scan(text: str) -> list[int]:
+        values = dedupe.signature(text, index.bins)
+        return [index.ids[position] for position in range(len(index)) if index.similarity(values, position) >= index.threshold]
+
+    queries = iter([texts[copy - 1] for copy in copies])
+    scan_latency = timed(lambda: scan(next(queries)), 3)
+    print(f"check: {latency * 1000:.0f} µs (linear scan of the signatures {scan_latency:.0f} ms), original of a planted copy found {found / checks:.1%}")
+
+    start = time.perf_counter()
+    clusters = index.clusters()
+    elapsed = time.perf_counter() - start
+    cluster_of = {question_id: number for number, cluster in enumerate(clusters) for question_id in cluster}
+    grouped = sum(copy in cluster_of and cluster_of[copy] == cluster_of.get(original) for copy, original in planted.items())
+    involved = set(planted) | set(planted.values())
+    false_positives = sum(question_id not in involved for question_id in cluster_of)
+    print(f"clusters: {len(clusters)} groups ({len(cluster_of)} questions) in {elapsed:.1f}s | planted pairs grouped {grouped / len(planted):.1%}, "
+          f"grouped questions with no planted copy {false_positives}")
+
+    first_id = db.query("SELECT COALESCE(MAX(id), 0) FROM questions", 1)[0]
+    import_texts, _ = synthetic_questions(import_rows, 0, seed=3)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'questions.csv')
+        with open(path, 'w', newline='', encoding='utf-8') as file:
+            file.write(','.join(bulk.QUESTION_COLUMNS) + '\n')
+            for n, text in enumerate(import_texts):
+                # Every 20th row is a question of the index
+                text = texts[generator.randrange(total)] if n % 20 == 0 else text
+                file.write(','.join((text, 'Answer 1', 'Answer 2', 'Answer 3', 'Answer 4', str(1 + n % 4))) + '\n')
+        try:
+            for name, duplicate_index in (('without check', None), ('with check', index)):
+                start = time.perf_counter()
+                imported, rejected = bulk.import_questions(db, path, progress=None, duplicates=duplicate_index)
+                elapsed = time.perf_counter() - start
+                print(f"import {name}: {imported} rows in {elapsed:.2f}s ({imported / elapsed:,.0f} rows/s, {rejected} rejected)")
+        finally:
+            db.query(f"DELETE FROM questions WHERE id > {first_id}", commit=True)
+
+
+class CountingStream(io.RawIOBase):
+    # Stands in for a terminal: every write that reaches it would be a write(2)
+    def __init__(self):
+        self.writes: int = 0
+        self.size: int = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.writes += 1
+        self.size += len(data)
+        return len(data)
+
+
+class NewlineIO:
+    # The front-end before render.py: 100 newlines per screen, every print and prompt written (and flushed) on its own
+    def __init__(self, stdin: TextIO, stdout: TextIO):
+        self.stdin = stdin
+        self.stdout = stdout
+
+    def input(self, prompt: str = '') -> str:
+        self.print(prompt, end='')
+        line = self.stdin.readline()
+        if not line:
+            raise EOFError
+        return line.rstrip('\n')
+
+    def print(self, *values, sep: str = ' ', end: str = '\n'):
+        self.stdout.write((sep.join(str(value) for value in values) + end).replace(CLEAR, '\n' * 100))
+        self.stdout.flush()
+
+    def close(self):
+        pass
+
+
+def bench_rendering(db: Database, questions: int = 2_000, players: int = 100, pages: int = 500):
+    """Bytes and writes reaching the terminal per answered question and per Hall of Fame page, with 100-newline clears
+    and one write per print vs. the render modes, which send a screen in one write."""
+    storage = MemoryStorage(PasswordHasher(4, 0))
+    storage.connect()
+    for n in range(questions):
+        storage.create_question(f'Benchmark question #{n}?', 'Answer 1', 'Answer 2', 'Answer 3', 'Answer 4', 1 + n % 4)
+    for n in range(players):
+        storage.handle_user_answer(storage.create_user(f'player{n}', 'benchmark1!', 'player@example.com', datetime.date(2000, 1, 1)), 1, 1)
+    user_id = storage.create_user(BENCH_USERNAME, 'benchmark1!', 'benchmark@example.com', datetime.date(2000, 1, 1))
+    login = ('1', BENCH_USERNAME, 'benchmark1!')
+    scripts = {
+        'answered question': (questions, (*login, '1', *('1', '') * questions, '5', '4')),
+        # Back and forth between the first two pages
+        'Hall of Fame page': (pages, (*login, '3', *('n', 'p') * (pages // 2), '', '4')),
+    }
+
+    def play(make_io: Callable[[TextIO, TextIO], object], lines: tuple[str, ...]) -> CountingStream:
+        storage.reset_user_answers(user_id)
+        stream = CountingStream()
+        # A terminal's stdout is line buffered
+        stdout = io.TextIOWrapper(io.BufferedWriter(stream), encoding='utf-8', line_buffering=True)
+        Session(storage, make_io(io.StringIO(''.join(f'{line}\n' for line in lines)), stdout)).run()
+        stdout.flush()
+        return stream
+
+    for name, (count, lines) in scripts.items():
+        print(f"per {name}:")
+        results = {'100 newlines': play(NewlineIO, lines)}
+        for mode in ('ansi', 'alternate', 'plain'):
+            results[mode] = play(lambda stdin, stdout: ConsoleIO(Renderer(mode), stdin, stdout), lines)
+        for mode, stream in results.items():
+            print(f"  {mode:>12}: {stream.size / count:6.1f} bytes, {stream.writes / count:5.2f} writes")
+    storage.disconnect()
+
+
+def bench_sessions(db: Database, players: int = 20, questions: int = 50, pages: int = 5, admins: int = 5, seed: int = 1) -> dict:
+    """Reproducible session suite through the headless driver: `players` accounts register, log in, play `questions`
+    questions and page through the Hall of Fame, then `admins` admins open reports. Menu action timings per phase."""
+    seed_questions(db, questions)
+    # Fresh accounts every run, the seeds keep what they do the same
+    prefix = f'suite_{uuid.uuid4().hex[:8]}'
+    phases = {
+        'register': ('register', [['register', 'logout']] * players),
+        'login': ('login', [['login', 'logout']] * players),
+        'play': ('play', [['login', 'play', 'logout']] * players),
+        'hall_of_fame': ('user', [['login', 'hall_of_fame', 'logout']] * players),
+        'admin_stats': ('statistics', [['admin', 'reports', 'logout']] * admins),
+    }
+    results = {}
+    for phase, (action, plans) in phases.items():
+        timers = MenuTimers()
+        bots = [Bot(plan, f'{prefix}_{number}', seed=seed + number, questions=questions, pages=pages) for number, plan in enumerate(plans)]
+        sessions, prompts, elapsed, errors = drive(db, bots, timers=timers)
+        summary = timers.summary()
+        results[phase] = {'sessions': sessions, 'prompts': prompts, 'seconds': elapsed, 'sessions_per_s': sessions / elapsed, 'errors': len(errors), 'actions': summary}
+        timing = summary.get(action, {})
+        print(f"{phase:>12}: {sessions} sessions in {elapsed:.2f}s ({sessions / elapsed:.1f}/s), `{action}` x{timing.get('count', 0)} "
+              f"p50 {timing.get('p50_ms', 0):.2f} ms p95 {timing.get('p95_ms', 0):.2f} ms, {len(errors)} failed")
+        for error in errors[:3]:
+            print(f"  {type(error).__name__}: {error}")
+    return results
+
+
+BENCHMARKS = {
+    'question_lookup': bench_question_lookup,
+    'concurrent_players': bench_concurrent_players,
+    'long_session': bench_long_session,
+    'play_round_trips': bench_play_round_trips,
+    'bulk_import': bench_bulk_import,
+    'logins': bench_logins,
+    'storage_engines': bench_storage_engines,
+    'metrics_overhead': bench_metrics_overhead,
+    'query_cache': bench_query_cache,
+    'question_store': bench_question_store,
+    'question_pack': bench_question_pack,
+    'report_paging': bench_report_paging,
+    'answer_journal': bench_answer_journal,
+    'prepared_statements': bench_prepared_statements,
+    'season_rollover': bench_season_rollover,
+    'question_order': bench_question_order,
+    'duplicates': bench_duplicates,
+    'rendering': bench_rendering,
+    'sessions': bench_sessions,
+}
+
+
+def flatten(results: dict, prefix: str = '') -> dict[str, float]:
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f'{prefix}{key}.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[f'{prefix}{key}'] = value
+    return flat
+
+
+def compare(path: str, record: dict):
+    # Every number of both runs that moved by more than COMPARE_THRESHOLD
+    with open(path, encoding='utf-8') as file:
+        previous = json.load(file)
+    old, new = flatten(previous['benchmarks']), flatten(record['benchmarks'])
+    changes = [(key, old[key], new[key]) for key in sorted(old.keys() & new.keys()) if old[key] and abs(new[key] / old[key] - 1) >= COMPARE_THRESHOLD]
+    print(f"\n[COMPARE: {previous.get('version')} -> {record['version']}, {len(changes)} of {len(old.keys() & new.keys())} values moved by {COMPARE_THRESHOLD:.0%} or more]")
+    for key, before, after in changes:
+        print(f"{key}: {before:.4g} -> {after:.4g} ({after / before - 1:+.0%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Trivia benchmarks, run against the trivia_bench database")
+    parser.add_argument('names', nargs='*', metavar='NAME', help=f"benchmarks to run (all by default): {', '.join(BENCHMARKS)}")
+    parser.add_argument('--json', metavar='PATH', help="record the run time and results of every benchmark to PATH")
+    parser.add_argument('--compare', metavar='PATH', help="compare this run with one recorded with --json")
+    args = parser.parse_args()
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(unknown)}")
+    try:
+        version = subprocess.run(['git', 'describe', '--always', '--dirty'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        version = 'unknown'
+    record = {'version': version, 'python': sys.version.split()[0], 'date': datetime.datetime.now().isoformat(timespec='seconds'), 'benchmarks': {}}
+
+    database.DB_NAME = BENCH_DB_NAME
+    db = Database()
+    db.connect()
+    try:
+        for name in args.names or list(BENCHMARKS):
+            print(f"\n[BENCHMARK: {name}]")
+            start = time.perf_counter()
+            results = BENCHMARKS[name](db)
+            record['benchmarks'][name] = {'seconds': time.perf_counter() - start, **({'results': results} if results else {})}
+    finally:
+        db.disconnect()
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as file:
+            json.dump(record, file, indent=2)
+    if args.compare:
+        compare(args.compare, record)
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
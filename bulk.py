@@ -0,0 +1,171 @@
+import io
+import csv
+import json
+import time
+from typing import Callable, Iterator
+
+from database import Database
+from dedupe import DuplicateIndex
+from storage import REPORT_BATCH_SIZE, REPORT_COLUMNS, Storage, check_correct_answer
+
+QUESTION_COLUMNS: tuple[str, ...] = ('question', 'answer_1', 'answer_2', 'answer_3', 'answer_4', 'correct_answer')
+BULK_BATCH_SIZE: int = 10_000
+
+
+def detect_format(path: str) -> str:
+    return 'jsonl' if path.lower().endswith(('.jsonl', '.ndjson')) else 'csv'
+
+
+def read_rows(path: str, file_format: str) -> Iterator[tuple[int, dict | None, str | dict]]:
+    # Yields (line number, parsed record or None if unparsable, raw row) without loading the whole file
+    with open(path, newline='', encoding='utf-8') as file:
+        if file_format == 'jsonl':
+            for line_number, line in enumerate(file, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    record = None
+                yield line_number, record if isinstance(record, dict) else None, line.rstrip('\r\n')
+        else:
+            reader = csv.DictReader(file)
+            for record in reader:
+                yield reader.line_num, record, record
+
+
+def validate(record: dict | None) -> tuple:
+    """Turn a parsed record into a `questions` row, raises ValueError with the reason when it isn't valid."""
+    if record is None:
+        raise ValueError("unparsable row")
+    missing = [column for column in QUESTION_COLUMNS if record.get(column) is None]
+    if missing:
+        raise ValueError(f"missing {', '.join(missing)}")
+    texts = [str(record[column]).strip() for column in QUESTION_COLUMNS[:5]]
+    empty = [column for column, text in zip(QUESTION_COLUMNS, texts) if not text]
+    if empty:
+        raise ValueError(f"empty {', '.join(empty)}")
+    try:
+        correct_answer = int(record['correct_answer'])
+    except (TypeError, ValueError):
+        raise ValueError(f"correct_answer is not a number: {record['correct_answer']!r}") from None
+    check_correct_answer(correct_answer)
+    return (*texts, correct_answer)
+
+
+def print_progress(rows: int, rejected: int, elapsed: float):
+    print(f"[BULK: {rows} rows ({rejected} rejected) in {elapsed:.1f}s, {rows / max(elapsed, 1e-9):.0f} rows/s]")
+
+
+def check_duplicate(duplicates: DuplicateIndex, question: str, line_number: int):
+    # Rows of the file are indexed under the negated line number until they get an id
+    matches = duplicates.find(question)
+    if matches:
+        match_id, similarity = matches[0]
+        source = f"line {-match_id}" if match_id < 0 else f"question #{match_id}"
+        raise ValueError(f"near-duplicate of {source} ({similarity:.0%} alike)")
+    duplicates.add(-line_number, question)
+
+
+def import_questions(db: Database, path: str, file_format: str | None = None, batch_size: int = BULK_BATCH_SIZE,
+                     reject_path: str | None = None, progress: Callable[[int, int, float], None] | None = print_progress,
+                     duplicates: DuplicateIndex | None = None) -> tuple[int, int]:
+    """Stream questions from a CSV or JSONL file into `questions` with COPY, one transaction per batch.
+
+    Rows that fail validation are skipped and written to `reject_path` (as JSONL with the line number and reason).
+    With a `duplicates` index of the bank, so are near-duplicates of a question in it or of an earlier row of the file.
+    Returns (imported, rejected).
+    """
+    file_format = file_format or detect_format(path)
+    imported: int = 0
+    rejected: int = 0
+    start = time.perf_counter()
+    reject_file = open(reject_path, 'w', encoding='utf-8') if reject_path else None
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    pending: int = 0
+
+    def flush():
+        nonlocal imported, pending
+        buffer.seek(0)
+        with db.cursor('import_questions') as cursor:
+            cursor.copy_expert(f"COPY questions ({', '.join(QUESTION_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buffer)
+        imported += pending
+        pending = 0
+        buffer.seek(0)
+        buffer.truncate()
+        if progress:
+            progress(imported, rejected, time.perf_counter() - start)
+
+    try:
+        for line_number, record, raw in read_rows(path, file_format):
+            try:
+                row = validate(record)
+                if duplicates is not None:
+                    check_duplicate(duplicates, row[0], line_number)
+            except ValueError as e:
+                rejected += 1
+                if reject_file:
+                    reject_file.write(json.dumps({'line': line_number, 'error': str(e), 'row': raw}) + '\n')
+                continue
+            writer.writerow(row)
+            pending += 1
+            if pending >= batch_size:
+                flush()
+        if pending:
+            flush()
+    finally:
+        if reject_file:
+            reject_file.close()
+    return imported, rejected
+
+
+def export_questions(db: Database, path: str, file_format: str | None = None, batch_size: int = BULK_BATCH_SIZE,
+                     progress: Callable[[int, int, float], None] | None = print_progress) -> int:
+    """Stream the question bank to a CSV or JSONL file (importable again with `import_questions`), returns the row count."""
+    file_format = file_format or detect_format(path)
+    exported: int = 0
+    start = time.perf_counter()
+    with open(path, 'w', newline='', encoding='utf-8') as file:
+        if file_format == 'csv':
+            # COPY writes straight into the file as the rows arrive
+            with db.cursor('export_questions') as cursor:
+                cursor.copy_expert(f"COPY (SELECT id, {', '.join(QUESTION_COLUMNS)} FROM questions ORDER BY id) TO STDOUT WITH (FORMAT csv, HEADER)", file)
+                exported = cursor.rowcount
+        else:
+            # Keyset pages over the primary key, so memory stays bounded by `batch_size`
+            last_id: int = 0
+            while True:
+                with db.cursor('export_questions') as cursor:
+                    cursor.execute(f"SELECT id, {', '.join(QUESTION_COLUMNS)} FROM questions WHERE id > %s ORDER BY id LIMIT %s", (last_id, batch_size))
+                    rows = cursor.fetchall()
+                if not rows:
+                    break
+                for row in rows:
+                    file.write(json.dumps(dict(zip(('id', *QUESTION_COLUMNS), row))) + '\n')
+                exported += len(rows)
+                last_id = rows[-1][0]
+                if progress:
+                    progress(exported, 0, time.perf_counter() - start)
+    if progress and file_format == 'csv':
+        progress(exported, 0, time.perf_counter() - start)
+    return exported
+
+
+def export_report(storage: Storage, report: str, path: str, params: tuple = (), batch_size: int = REPORT_BATCH_SIZE,
+                  progress: Callable[[int, int, float], None] | None = print_progress, season: int | None = None) -> int:
+    """Stream one of the admin reports (of `season`, the current one by default) to a CSV file, `batch_size` rows at a
+    time, returns the row count."""
+    exported: int = 0
+    start = time.perf_counter()
+    with open(path, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(REPORT_COLUMNS[report])
+        for row in storage.stream_report(report, params, batch_size, season):
+            writer.writerow(row)
+            exported += 1
+            if progress and exported % BULK_BATCH_SIZE == 0:
+                progress(exported, 0, time.perf_counter() - start)
+    if progress:
+        progress(exported, 0, time.perf_counter() - start)
+    return exported
\ No newline at end of file
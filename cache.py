@@ -0,0 +1,236 @@
+import time
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Callable, Iterator
+
+from storage import (REPORT_BATCH_SIZE, REPORT_EASIEST_QUESTIONS, REPORT_HARDEST_QUESTIONS, REPORT_MOST_ACTIVE_USERS, REPORT_MOST_CORRECT_USERS,
+                     REPORT_PAGE_SIZE, REPORT_QUESTION_DIFFICULTY, REPORT_QUESTION_STATISTICS, REPORT_USER_ANSWERS, Pager, Storage)
+
+CACHE_TTL: float = 5.0
+CACHE_MAX_ENTRIES: int = 1024
+
+# What each cached read depends on, a write to any of these drops it
+TAG_USERS: str = 'users'
+TAG_QUESTIONS: str = 'questions'
+TAG_ANSWERS: str = 'answers'
+REPORT_TAGS: dict[str, tuple[str, ...]] = {
+    REPORT_EASIEST_QUESTIONS: (TAG_ANSWERS, TAG_QUESTIONS),
+    REPORT_HARDEST_QUESTIONS: (TAG_ANSWERS, TAG_QUESTIONS),
+    REPORT_MOST_CORRECT_USERS: (TAG_ANSWERS, TAG_USERS),
+    REPORT_MOST_ACTIVE_USERS: (TAG_ANSWERS, TAG_USERS),
+    REPORT_USER_ANSWERS: (TAG_ANSWERS, TAG_QUESTIONS),
+    REPORT_QUESTION_STATISTICS: (TAG_ANSWERS, TAG_QUESTIONS),
+    REPORT_QUESTION_DIFFICULTY: (TAG_ANSWERS, TAG_QUESTIONS),
+}
+
+
+class QueryCache:
+    """Size-bounded LRU of query results that expire after `ttl` seconds.
+
+    Entries carry tags (what they were computed from). `invalidate(tag)` bumps the tag's generation, entries made under
+    an older generation are treated as misses and dropped lazily, so invalidation is O(1) no matter the cache size.
+    Results loaded less than `settle` seconds after a write to their tags are returned but not kept: with reads on
+    replicas they may predate the write, and would be served to the writer too.
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, ttl: float = CACHE_TTL, settle: float = 0.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.settle = settle
+        # Tag -> monotonic time of its last invalidation, only kept with `settle`
+        self.written: dict[str, float] = {}
+        self.lock = threading.Lock()
+        # key -> (expires, generations of its tags, value)
+        self.entries: OrderedDict[tuple, tuple[float, tuple[int, ...], object]] = OrderedDict()
+        self.generations: dict[str, int] = {}
+        self.hits: int = 0
+        self.misses: int = 0
+        self.invalidations: int = 0
+        self.evictions: int = 0
+
+    def get_or_load(self, key: tuple, tags: tuple[str, ...], load: Callable[[], object]):
+        now = time.monotonic()
+        with self.lock:
+            generations = tuple(self.generations.get(tag, 0) for tag in tags)
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] > now and entry[1] == generations:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+
+        value = load()
+        with self.lock:
+            # A write that landed while loading makes this result stale already, don't keep it
+            if generations == tuple(self.generations.get(tag, 0) for tag in tags) and \
+                    (not self.settle or all(now - self.written.get(tag, float('-inf')) >= self.settle for tag in tags)):
+                self.entries[key] = (now + self.ttl, generations, value)
+                self.entries.move_to_end(key)
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+                    self.evictions += 1
+        return value
+
+    def invalidate(self, *tags: str):
+        with self.lock:
+            for tag in tags:
+                self.generations[tag] = self.generations.get(tag, 0) + 1
+                if self.settle:
+                    self.written[tag] = time.monotonic()
+            self.invalidations += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self) -> dict[str, int]:
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'invalidations': self.invalidations, 'evictions': self.evictions, 'entries': len(self.entries)}
+
+
+class CachedStorage(Storage):
+    """Serves the Hall of Fame and admin statistics of `storage` out of a `QueryCache`.
+
+    Writes made through this object invalidate what they affect right away. Writes made elsewhere (another server
+    process on the same database) only show up once the entries expire, so `ttl` bounds how stale a view can get.
+    Anything outside the `Storage` interface is passed straight through.
+    """
+
+    def __init__(self, storage: Storage, cache: QueryCache | None = None):
+        self.storage = storage
+        self.cache = cache or QueryCache()
+
+    def __getattr__(self, name: str):
+        return getattr(self.storage, name)
+
+    @property
+    def hasher(self):
+        return self.storage.hasher
+
+    @hasher.setter
+    def hasher(self, hasher):
+        self.storage.hasher = hasher
+
+    def connect(self):
+        self.storage.connect()
+
+    def disconnect(self):
+        self.cache.clear()
+        self.storage.disconnect()
+
+    def _cached(self, key: tuple, tags: tuple[str, ...], load: Callable[[], object]):
+        return self.cache.get_or_load(key, tags, load)
+
+    # ===== [WRITES] =====
+
+    def create_user(self, username: str, password: str, email: str, dob: date) -> int | None:
+        try:
+            return self.storage.create_user(username, password, email, dob)
+        finally:
+            self.cache.invalidate(TAG_USERS)
+
+    def create_question(self, question: str, answer_1: str, answer_2: str, answer_3: str, answer_4: str, correct_answer: int) -> int | None:
+        try:
+            return self.storage.create_question(question, answer_1, answer_2, answer_3, answer_4, correct_answer)
+        finally:
+            self.cache.invalidate(TAG_QUESTIONS)
+
+    def handle_user_answer(self, user_id: int, question_id: int, answer: int) -> bool:
+        try:
+            return self.storage.handle_user_answer(user_id, question_id, answer)
+        finally:
+            self.cache.invalidate(TAG_ANSWERS)
+
+    def play_step(self, user_id: int, question_id: int | None = None, answer: int | None = None) -> tuple[bool | None, tuple | None]:
+        if question_id is None:
+            return self.storage.play_step(user_id)
+        try:
+            return self.storage.play_step(user_id, question_id, answer)
+        finally:
+            self.cache.invalidate(TAG_ANSWERS)
+
+    def record_answers(self, answers: list[tuple[int, int, bool, datetime]]) -> int:
+        try:
+            return self.storage.record_answers(answers)
+        finally:
+            self.cache.invalidate(TAG_ANSWERS)
+
+    def reset_user_answers(self, user_id: int):
+        try:
+            self.storage.reset_user_answers(user_id)
+        finally:
+            self.cache.invalidate(TAG_ANSWERS)
+
+    def start_season(self) -> int:
+        try:
+            return self.storage.start_season()
+        finally:
+            self.cache.invalidate(TAG_ANSWERS)
+
+    # ===== [UNCACHED READS] =====
+
+    def is_password_matching(self, username: str, password: str) -> bool:
+        return self.storage.is_password_matching(username, password)
+
+    def get_user_id(self, username: str) -> int | None:
+        return self.storage.get_user_id(username)
+
+    def get_user_questions_solved(self, user_id: int) -> int:
+        return self.storage.get_user_questions_solved(user_id)
+
+    def get_user_statistics(self, user_id: int) -> tuple | None:
+        return self.storage.get_user_statistics(user_id)
+
+    def get_user_question_ids(self, user_id: int) -> list[int]:
+        return self.storage.get_user_question_ids(user_id)
+
+    def get_questions(self, after_id: int = 0, limit: int = 10_000) -> list[tuple]:
+        return self.storage.get_questions(after_id, limit)
+
+    def get_question_bank_version(self) -> tuple[int, int, int]:
+        return self.storage.get_question_bank_version()
+
+    def get_user_question(self, user_id: int) -> tuple | None:
+        return self.storage.get_user_question(user_id)
+
+    def get_season(self) -> int:
+        return self.storage.get_season()
+
+    def open_report(self, report: str, params: tuple = (), page_size: int = REPORT_PAGE_SIZE, season: int | None = None) -> Pager:
+        # The total and each page are cached on their own, so only the pages that were looked at take room. The storage's
+        # report is only opened on a miss
+        key = ('open_report', report, params, season)
+        tags = REPORT_TAGS[report]
+        opened: list[Pager] = []
+
+        def storage_pager() -> Pager:
+            if not opened:
+                opened.append(self.storage.open_report(report, params, page_size, season))
+            return opened[0]
+
+        def fetch(limit: int, offset: int) -> list[tuple]:
+            return self._cached((*key, limit, offset), tags, lambda: storage_pager().fetch(limit, offset))
+
+        def close():
+            if opened:
+                opened[0].close()
+        return Pager(fetch, lambda: self._cached((*key, 'total'), tags, lambda: storage_pager().total), page_size, close)
+
+    # Streams can be any size, they go to the storage rather than the cache
+    def stream_report(self, report: str, params: tuple = (), batch_size: int = REPORT_BATCH_SIZE, season: int | None = None) -> Iterator[tuple]:
+        return self.storage.stream_report(report, params, batch_size, season)
+
+    # ===== [CACHED READS] =====
+
+    def get_user_answers(self, user_id: int) -> list[tuple]:
+        return self._cached(('get_user_answers', user_id), (TAG_ANSWERS, TAG_QUESTIONS), lambda: self.storage.get_user_answers(user_id))
+
+    def get_hall_of_fame(self, limit: int = 10, offset: int = 0, season: int | None = None) -> list[tuple]:
+        return self._cached(('get_hall_of_fame', limit, offset, season), (TAG_ANSWERS, TAG_USERS), lambda: self.storage.get_hall_of_fame(limit, offset, season))
+
+    def get_user_rank(self, user_id: int) -> int | None:
+        return self._cached(('get_user_rank', user_id), (TAG_ANSWERS,), lambda: self.storage.get_user_rank(user_id))
+
+    def count_players(self) -> int:
+        return self._cached(('count_players',), (TAG_ANSWERS,), self.storage.count_players)
\ No newline at end of file
@@ -1,144 +1,346 @@
+import re
+import time
+import weakref
+import functools
+import threading
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
 import psycopg2
-import bcrypt
-from datetime import date
+import psycopg2.errors
+import psycopg2.extensions
+from datetime import date, datetime
+
+from hashing import PasswordHasher
+from metrics import InstrumentedCursor, Metrics
+from migrations import LEADERBOARD_SOURCE, QUESTION_STATS_SOURCE, migrate
+from pool import ConnectionPool, PoolTimeout
+from replicas import REPLICA_MAX_STALENESS, Replica, ReplicaFailed, ReplicaRouter
+from storage import (REPORT_BATCH_SIZE, REPORT_EASIEST_QUESTIONS, REPORT_HARDEST_QUESTIONS, REPORT_MOST_ACTIVE_USERS, REPORT_MOST_CORRECT_USERS,
+                     REPORT_PAGE_SIZE, REPORT_QUESTION_DIFFICULTY, REPORT_QUESTION_STATISTICS, REPORT_USER_ANSWERS, Pager, Storage, check_correct_answer)
 
 DB_NAME: str = 'trivia'
 DB_USER: str = "admin"
 DB_PASSWORD: str = "admin"
 DB_HOST: str = "localhost"
 DB_PORT: str = "5559"
-
-class Database:
-    def __init__(self):
-        self.connection = None
-        self.cursor = None
+DB_POOL_SIZE: int = 10
+DB_POOL_TIMEOUT: float = 30.0
+# libpq connection strings ("host=... port=..." or postgresql:// URIs) of the primary, None for the DB_* settings above,
+# and of its streaming replicas. A DSN without a database name gets the one of the storage
+DB_DSN: str | None = None
+DB_REPLICAS: tuple[str, ...] = ()
+
+# Hot statements: PREPAREd on a connection the first time it runs them, then only EXECUTEd (parsed and planned once)
+PREPARED_STATEMENTS: dict[str, tuple[str, str]] = {
+    'get_user_id': ("TEXT", "SELECT id FROM users WHERE username = $1"),
+    'get_user_password': ("TEXT", "SELECT password FROM users WHERE username = $1"),
+    'get_user_questions_solved': ("INT", "SELECT COALESCE((SELECT questions_solved FROM players WHERE season = current_season() AND user_id = $1), 0)"),
+    'get_user_question': ("INT", "SELECT * FROM get_user_question ($1)"),
+    'handle_user_answer': ("INT, INT, INT", "SELECT handle_user_answer ($1, $2, $3)"),
+    'play_step': ("INT, INT, INT", "SELECT * FROM play_step ($1, $2, $3)"),
+}
+# The same statements with psycopg2 placeholders, for when preparing is turned off
+UNPREPARED_STATEMENTS: dict[str, str] = {name: re.sub(r'\$\d+', '%s', statement) for name, (_, statement) in PREPARED_STATEMENTS.items()}
+
+# Queries behind the reports. The first parameter of each is the season, NULL for the current one. Each row ends with
+# the report's unique ORDER BY keys, k1 (k2), which `open_report` pages on: they are cut off before rows are returned
+REPORTS: dict[str, str] = {
+    REPORT_EASIEST_QUESTIONS: """
+        SELECT q.question, qs.correct_answers, q.id AS k1
+        FROM (SELECT COALESCE(%s, current_season()) AS season) s
+        JOIN question_stats qs ON qs.season = s.season
+        JOIN questions q ON qs.question_id = q.id
+        WHERE qs.correct_answers = (SELECT MAX(correct_answers) FROM question_stats WHERE season = s.season) AND qs.correct_answers > 0
+        ORDER BY k1
+    """,
+    REPORT_HARDEST_QUESTIONS: """
+        SELECT q.question, qs.correct_answers, q.id AS k1
+        FROM (SELECT COALESCE(%s, current_season()) AS season) s
+        JOIN question_stats qs ON qs.season = s.season
+        JOIN questions q ON qs.question_id = q.id
+        WHERE qs.correct_answers = (SELECT MIN(correct_answers) FROM question_stats WHERE season = s.season AND correct_answers > 0)
+        ORDER BY k1
+    """,
+    # Straight from the leaderboard instead of counting every answer
+    REPORT_MOST_CORRECT_USERS: """
+        SELECT u.username, l.correct_answers, -l.correct_answers AS k1, l.user_id AS k2
+        FROM (SELECT COALESCE(%s, current_season()) AS season) s
+        JOIN leaderboard l ON l.season = s.season
+        JOIN users u ON l.user_id = u.id
+        ORDER BY k1, k2
+    """,
+    # `questions_solved` is bumped by every answer
+    REPORT_MOST_ACTIVE_USERS: """
+        SELECT u.username, p.questions_solved, -p.questions_solved AS k1, p.user_id AS k2
+        FROM (SELECT COALESCE(%s, current_season()) AS season) s
+        JOIN players p ON p.season = s.season
+        JOIN users u ON p.user_id = u.id
+        WHERE p.questions_solved > 0
+        ORDER BY k1, k2
+    """,
+    # Only the season's partition is scanned
+    REPORT_USER_ANSWERS: """
+        SELECT q.question, ua.is_correct, MIN(ua.question_id) AS k1, ua.is_correct AS k2
+        FROM (SELECT COALESCE(%s, current_season()) AS season) s
+        JOIN user_answers ua ON ua.season = s.season
+        JOIN questions q ON ua.question_id = q.id
+        WHERE ua.user_id = %s
+        GROUP BY q.question, ua.is_correct
+        ORDER BY k1, k2
+    """,
+    REPORT_QUESTION_STATISTICS: """
+        SELECT q.question,
+               COALESCE(qs.correct_answers + qs.incorrect_answers, 0),
+               COALESCE(qs.correct_answers, 0),
+               COALESCE(qs.incorrect_answers, 0),
+               q.id AS k1
+        FROM (SELECT COALESCE(%s, current_season()) AS season) s
+        CROSS JOIN questions q
+        LEFT JOIN question_stats qs ON qs.season = s.season AND qs.question_id = q.id
+        ORDER BY k1
+    """,
+    # Every answer up to and including the season, to rank questions by how often they're answered right
+    REPORT_QUESTION_DIFFICULTY: """
+        SELECT qs.question_id, SUM(qs.correct_answers + qs.incorrect_answers), SUM(qs.correct_answers), qs.question_id AS k1
+        FROM (SELECT COALESCE(%s, current_season()) AS season) s
+        JOIN question_stats qs ON qs.season <= s.season
+        GROUP BY qs.question_id
+        HAVING SUM(qs.correct_answers + qs.incorrect_answers) > 0
+        ORDER BY k1
+    """,
+}
+# How many key columns end the rows of each report
+REPORT_KEYS: dict[str, int] = {
+    REPORT_EASIEST_QUESTIONS: 1,
+    REPORT_HARDEST_QUESTIONS: 1,
+    REPORT_MOST_CORRECT_USERS: 2,
+    REPORT_MOST_ACTIVE_USERS: 2,
+    REPORT_USER_ANSWERS: 2,
+    REPORT_QUESTION_STATISTICS: 1,
+    REPORT_QUESTION_DIFFICULTY: 1,
+}
+
+
+def replica_read(method: Callable) -> Callable:
+    """For `Database` methods that only read (and have no other side effect): see `Database.read`."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        return self.read(method, self, *args, **kwargs)
+    return wrapper
+
+
+class Database(Storage):
+    def __init__(self, pool_size: int = DB_POOL_SIZE, pool_timeout: float = DB_POOL_TIMEOUT, connection_factory=None, hasher: PasswordHasher | None = None, dbname: str | None = None, metrics: Metrics | None = None,
+                 prepare_statements: bool = True, dsn: str | None = DB_DSN, replicas: tuple[str, ...] = DB_REPLICAS,
+                 max_staleness: float = REPLICA_MAX_STALENESS):
+        self.dbname = dbname
+        self.dsn = dsn
+        # Statistics, Hall of Fame and report reads go to these when they are fresh enough (see `ReplicaRouter`)
+        self.replica_dsns = tuple(replicas)
+        self.max_staleness = max_staleness
+        self.replicas: ReplicaRouter | None = None
+        self.metrics = metrics
+        # Off behind poolers that don't keep server sessions (PgBouncer in transaction mode)
+        self.prepare_statements = prepare_statements
+        # Names PREPAREd on each connection, a reconnect is a new connection object and starts over
+        self.prepared: weakref.WeakKeyDictionary[psycopg2.extensions.connection, set[str]] = weakref.WeakKeyDictionary()
+        self.prepared_lock = threading.Lock()
+        self.pool_size = pool_size
+        self.pool_timeout = pool_timeout
+        self.connection_factory = connection_factory
+        self.hasher = hasher or PasswordHasher()
+        self.pool: ConnectionPool | None = None
+
+    def open_connection(self, dbname: str | None = None, dsn: str | None = None):
+        dsn = dsn or self.dsn
+        if dsn is not None:
+            params = psycopg2.extensions.parse_dsn(dsn)
+            if dbname or self.dbname or 'dbname' not in params:
+                params['dbname'] = dbname or self.dbname or DB_NAME
+            return psycopg2.connect(**params, connection_factory=self.connection_factory)
+        return psycopg2.connect(
+            dbname=dbname or self.dbname or DB_NAME,
+            user=DB_USER,
+            password=DB_PASSWORD,
+            host=DB_HOST,
+            port=DB_PORT,
+            connection_factory=self.connection_factory
+        )
 
     def connect(self):
         # Try connecting to `trivia` database.
+        dbname = self.dbname or DB_NAME
         try:
-            self.connection = psycopg2.connect(
-                dbname=DB_NAME,
-                user=DB_USER,
-                password=DB_PASSWORD,
-                host=DB_HOST,
-                port=DB_PORT
-            )
-            self.cursor = self.connection.cursor()
+            self.open_connection().close()
         except psycopg2.OperationalError:
-            print(f"[PG-WARNING: FAILED TO CONNECT TO DATABASE `{DB_NAME}` -> CREATING...]")
+            print(f"[PG-WARNING: FAILED TO CONNECT TO DATABASE `{dbname}` -> CREATING...]")
             # Connect to the main database of pgsql to create the `trivia` database
             try:
-                self.connection = psycopg2.connect(
-                    dbname="postgres",
-                    user=DB_USER,
-                    password=DB_PASSWORD,
-                    host=DB_HOST,
-                    port=DB_PORT
-                )
-                self.cursor = self.connection.cursor()
-                self.connection.autocommit = True
-                self.cursor.execute(f"CREATE DATABASE {DB_NAME}")
-                self.connection.autocommit = False
-                self.cursor.close()
-                self.connection.close()
-
-                # Connecting to `trivia` after creating it
-                try:
-                    self.connection = psycopg2.connect(
-                        dbname=DB_NAME,
-                        user=DB_USER,
-                        password=DB_PASSWORD,
-                        host=DB_HOST,
-                        port=DB_PORT
-                    )
-                    self.cursor = self.connection.cursor()
-
-                    # Creating tables
-                    self.create_tables()
-                    # Creating routines
-                    self.create_stored_routines()
-
-                except psycopg2.OperationalError as e:
-                    self.connection.rollback()
-                    print(f"[PG-ERROR: FAILED TO CONNECT TO `{DB_NAME}` AFTER CREATION]:\n{e}")
-                    raise
-
+                connection = self.open_connection("postgres")
+                connection.autocommit = True
+                with connection.cursor() as cursor:
+                    cursor.execute(f"CREATE DATABASE {dbname}")
+                connection.close()
             except psycopg2.OperationalError as e:
-                self.connection.rollback()
-                print(f"[PG-ERROR: FAILED TO CREATE DATABASE `{DB_NAME}`]:\n{e}")
+                print(f"[PG-ERROR: FAILED TO CREATE DATABASE `{dbname}`]:\n{e}")
                 raise
 
-    def disconnect(self):
-        if self.cursor:
-            self.cursor.close()
-        if self.connection:
-            self.connection.close()
+        # Every call checks a connection out of the pool, so the methods below are safe to use from many threads
+        self.pool = ConnectionPool(self.open_connection, self.pool_size, self.pool_timeout)
+        if self.replica_dsns:
+            self.replicas = ReplicaRouter(self.pool, self.replica_dsns, lambda dsn: self.open_connection(dsn=dsn), self.pool_size, self.pool_timeout, self.max_staleness)
 
-    def create_tables(self):
-        try:
-            # TABLE: users
-            self.cursor.execute("""
-                CREATE TABLE IF NOT EXISTS users (
-                    id SERIAL PRIMARY KEY,
-                    username TEXT NOT NULL,
-                    password TEXT NOT NULL,
-                    email TEXT NOT NULL,
-                    dob DATE NOT NULL,
-                    questions_solved INT NOT NULL DEFAULT 0,
-                    play_timestamp TIMESTAMPTZ
-                )
-            """)
-            self.connection.commit()
-
-            # TABLE: questions
-            self.cursor.execute("""
-                CREATE TABLE IF NOT EXISTS questions (
-                    id SERIAL PRIMARY KEY,
-                    question TEXT NOT NULL,
-                    answer_1 TEXT NOT NULL,
-                    answer_2 TEXT NOT NULL,
-                    answer_3 TEXT NOT NULL,
-                    answer_4 TEXT NOT NULL,
-                    correct_answer SMALLINT NOT NULL
-                )
-            """)
-            self.connection.commit()
-
-            # TABLE: user_answers
-            self.cursor.execute("""
-                CREATE TABLE IF NOT EXISTS user_answers (
-                    user_id INT NOT NULL,
-                    question_id INT NOT NULL,
-                    is_correct BOOLEAN NOT NULL,
-                    answer_timestamp TIMESTAMPTZ,
-                    PRIMARY KEY (user_id, question_id),
-                    FOREIGN KEY (user_id) REFERENCES users (id),
-                    FOREIGN KEY (question_id) REFERENCES questions (id)
-                )
-            """)
-            self.connection.commit()
+        # Applying the pending schema migrations, then (re)installing the routines
+        migrate(self)
+        self.create_stored_routines()
 
-        # EXCEPTION: Failure to create tables
+    def disconnect(self):
+        if self.replicas:
+            self.replicas.close()
+        if self.pool:
+            self.pool.close()
+        self.hasher.close()
+
+    def wrote(self, *user_ids: int):
+        # After a commit: this thread's reads (a session runs on one thread) and the reads about these users stay on the
+        # primary until every replica they could be sent to has the write
+        if self.replicas:
+            self.replicas.wrote(user_ids)
+
+    def replica_stats(self) -> dict[str, int]:
+        return self.replicas.stats() if self.replicas else {}
+
+    def drop_database(self):
+        # Only meant for scratch databases (conformance checks), call it before `connect`
+        connection = self.open_connection("postgres")
+        connection.autocommit = True
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP DATABASE IF EXISTS {self.dbname or DB_NAME}")
+        connection.close()
+
+    @contextmanager
+    def cursor(self, function: str, error: str | None = None, commit: bool = True, name: str | None = None, scrollable: bool | None = None,
+               read_only: bool = False, user_id: int | None = None):
+        """Check a connection out of the pool for a single unit of work and yield a fresh cursor on it.
+
+        A `read_only` unit of work may run on a replica instead of the primary (about `user_id`, if it is about a user):
+        the router picks one that is fresh enough, or none. A replica that can't be reached is set aside and the work
+        runs on the primary.
+
+        The transaction is committed (or rolled back when `commit` is False) on exit. On an `OperationalError`
+        the connection is dropped from the pool so the next checkout reconnects. With a `name` the cursor is a
+        server-side one: the result stays in PostgreSQL and is fetched in batches.
+
+        With `metrics` set, the call (pool wait included) is recorded under `function` and every statement on the cursor
+        under its own text.
+        """
+        metrics = self.metrics
+        start = time.perf_counter() if metrics else 0.0
+        commit_seconds: float | None = None
+        cursor = None
+        pool = self.pool
+        replica: Replica | None = self.replicas.choose(user_id) if read_only and self.replicas else None
+        if replica is not None:
+            try:
+                connection = replica.pool.checkout()
+                pool = replica.pool
+            except (psycopg2.OperationalError, PoolTimeout):
+                self.replicas.failed(replica)
+                replica = None
+        if replica is None:
+            connection = pool.checkout()
+        broken: bool = False
+        failed: bool = True
+        try:
+            if metrics:
+                with connection.cursor(name, cursor_factory=InstrumentedCursor, scrollable=scrollable) as cursor:
+                    cursor.metrics = metrics
+                    yield cursor
+            else:
+                with connection.cursor(name, scrollable=scrollable) as cursor:
+                    yield cursor
+            if commit:
+                commit_start = time.perf_counter()
+                connection.commit()
+                commit_seconds = time.perf_counter() - commit_start
+            else:
+                connection.rollback()
+            failed = False
         except psycopg2.OperationalError as e:
-            self.connection.rollback()
-            print(f"[PG-ERROR: FAILED TO CREATE TABLES]:\n{e}")
+            broken = True
+            self._rollback(connection)
+            print(f"[PG-ERROR: {error or f'FAILED TO EXECUTE FUNCTION `{function}`'}]:\n{e}")
+            if replica is not None:
+                self.replicas.failed(replica)
+                raise ReplicaFailed(str(e)) from e
+            raise
+        except BaseException:
+            broken = not self._rollback(connection)
             raise
+        finally:
+            pool.checkin(connection, broken)
+            if metrics:
+                metrics.observe_method(function, time.perf_counter() - start, getattr(cursor, 'rows', 0), failed, commit_seconds)
+
+    def read(self, function: Callable, *args, **kwargs):
+        """Call `function`, whose units of work are all `read_only`, and call it again with every read on the primary if a
+        replica failed under one of them: the player gets the answer instead of an error."""
+        try:
+            return function(*args, **kwargs)
+        except ReplicaFailed:
+            with self.replicas.on_primary():
+                return function(*args, **kwargs)
+
+    def execute_prepared(self, cursor, name: str, params: tuple):
+        """Run PREPARED_STATEMENTS[name] on `cursor`, PREPAREing it first if its connection hasn't yet.
+
+        A statement deallocated behind our back (DISCARD ALL, DEALLOCATE ALL, a pooler handing us another server session)
+        is PREPAREd again and EXECUTEd once more: the EXECUTE is sent behind a savepoint, in the same round trip, so the
+        failure doesn't abort the work done earlier in the transaction.
+        """
+        if not self.prepare_statements:
+            cursor.execute(UNPREPARED_STATEMENTS[name], params)
+            return
+        types, statement = PREPARED_STATEMENTS[name]
+        with self.prepared_lock:
+            prepared = self.prepared.setdefault(cursor.connection, set())
+        execute = f"EXECUTE {name} ({', '.join(['%s'] * len(params))});"
+        if name not in prepared:
+            # PREPARE isn't transactional, the statement stays even if this transaction rolls back
+            cursor.execute(f"PREPARE {name} ({types}) AS {statement};")
+            prepared.add(name)
+        try:
+            cursor.execute(f"SAVEPOINT execute_prepared; {execute}", params)
+        except psycopg2.errors.InvalidSqlStatementName:
+            prepared.clear()
+            cursor.execute("ROLLBACK TO SAVEPOINT execute_prepared;")
+            cursor.execute(f"PREPARE {name} ({types}) AS {statement};")
+            prepared.add(name)
+            cursor.execute(execute, params)
+
+    @staticmethod
+    def _rollback(connection) -> bool:
+        try:
+            connection.rollback()
+            return True
+        except psycopg2.Error:
+            return False
 
     def create_stored_routines(self):
-        try:
+        with self.cursor('create_stored_routines', "FAILED TO CREATE ROUTINES") as cursor:
             # STORED FUNCTION: create_user
-            self.cursor.execute("DROP FUNCTION IF EXISTS create_user (TEXT, TEXT, TEXT, DATE);")
-            self.cursor.execute("""
+            cursor.execute("DROP FUNCTION IF EXISTS create_user (TEXT, TEXT, TEXT, DATE);")
+            cursor.execute("""
                 CREATE OR REPLACE FUNCTION create_user (_username TEXT, _password TEXT, _email TEXT, _dob DATE)
                 RETURNS INT
                 AS $$
                     DECLARE
                         _user_id INT;
                     BEGIN
-                        IF EXISTS (SELECT 1 FROM users WHERE username = _username) THEN
-                            RETURN NULL;
-                        END IF;
+                        -- users_username_key settles concurrent registrations of the same name, the loser gets NULL
                         INSERT INTO users (username, password, email, dob) VALUES (_username, _password, _email, _dob)
+                        ON CONFLICT (username) DO NOTHING
                         RETURNING id INTO _user_id;
                         RETURN _user_id;
                     END;
@@ -146,8 +348,8 @@ class Database:
             """)
 
             # STORED PROCEDURE: create_question
-            self.cursor.execute("DROP FUNCTION IF EXISTS create_question (TEXT, TEXT, TEXT, TEXT, TEXT, INT);")
-            self.cursor.execute("""
+            cursor.execute("DROP FUNCTION IF EXISTS create_question (TEXT, TEXT, TEXT, TEXT, TEXT, INT);")
+            cursor.execute("""
                 CREATE OR REPLACE FUNCTION create_question (_question TEXT, _answer_1 TEXT, _answer_2 TEXT, _answer_3 TEXT, _answer_4 TEXT, _correct_answer INT)
                 RETURNS INT
                 AS $$
@@ -161,14 +363,16 @@ class Database:
             """)
 
             # STORED FUNCTION: handle_user_answer -> BOOLEAN
-            self.cursor.execute("DROP FUNCTION IF EXISTS handle_user_answer (INT, INT, INT);")
-            self.cursor.execute("""
+            cursor.execute("DROP FUNCTION IF EXISTS handle_user_answer (INT, INT, INT);")
+            cursor.execute("""
                 CREATE OR REPLACE FUNCTION handle_user_answer (_user_id INT, _question_id INT, _answer INT)
                 RETURNS BOOLEAN
                 AS $$
                     DECLARE
+                        _season INT := current_season();
                         _correct_answer SMALLINT;
                         _is_correct BOOLEAN;
+                        _play_timestamp TIMESTAMPTZ;
                     BEGIN
                         SELECT correct_answer INTO _correct_answer FROM questions WHERE id = _question_id;
                         IF _answer = _correct_answer THEN
@@ -176,24 +380,50 @@ class Database:
                         ELSE
                             _is_correct := FALSE;
                         END IF;
-                        INSERT INTO user_answers (user_id, question_id, is_correct, answer_timestamp) VALUES (_user_id, _question_id, _is_correct, CURRENT_TIMESTAMP);
-                        UPDATE users SET questions_solved = questions_solved + 1 WHERE id = _user_id;
+                        -- A second session or a retry answering again: the first answer's verdict stands and nothing is counted twice
+                        INSERT INTO user_answers (season, user_id, question_id, is_correct, answer_timestamp) VALUES (_season, _user_id, _question_id, _is_correct, CURRENT_TIMESTAMP)
+                        ON CONFLICT (season, user_id, question_id) DO NOTHING;
+                        IF NOT FOUND THEN
+                            SELECT is_correct INTO _is_correct FROM user_answers WHERE season = _season AND user_id = _user_id AND question_id = _question_id;
+                            RETURN _is_correct;
+                        END IF;
+                        -- The user's first answer of the season creates their progress row
+                        INSERT INTO players (season, user_id, questions_solved, last_question_id) VALUES (_season, _user_id, 1, _question_id)
+                        ON CONFLICT (season, user_id) DO UPDATE SET
+                            questions_solved = players.questions_solved + 1,
+                            last_question_id = GREATEST(players.last_question_id, EXCLUDED.last_question_id)
+                        RETURNING play_timestamp INTO _play_timestamp;
+                        IF _is_correct THEN
+                            INSERT INTO leaderboard (season, user_id, correct_answers, play_timestamp, last_answer_timestamp)
+                            VALUES (_season, _user_id, 1, _play_timestamp, CURRENT_TIMESTAMP)
+                            ON CONFLICT (season, user_id) DO UPDATE SET
+                                correct_answers = leaderboard.correct_answers + 1,
+                                play_timestamp = EXCLUDED.play_timestamp,
+                                last_answer_timestamp = EXCLUDED.last_answer_timestamp;
+                        END IF;
+                        INSERT INTO question_stats (season, question_id, correct_answers, incorrect_answers)
+                        VALUES (_season, _question_id, _is_correct::INT, (NOT _is_correct)::INT)
+                        ON CONFLICT (season, question_id) DO UPDATE SET
+                            correct_answers = question_stats.correct_answers + EXCLUDED.correct_answers,
+                            incorrect_answers = question_stats.incorrect_answers + EXCLUDED.incorrect_answers;
                         RETURN _is_correct;
                     END;
                 $$ LANGUAGE plpgsql;
             """)
 
             # STORED FUNCTION: get_user_question -> questions
-            self.cursor.execute("DROP FUNCTION IF EXISTS get_user_question (INT);")
-            self.cursor.execute("""
+            cursor.execute("DROP FUNCTION IF EXISTS get_user_question (INT);")
+            cursor.execute("""
                 CREATE OR REPLACE FUNCTION get_user_question (_user_id INT)
                 RETURNS questions
                 AS $$
                     DECLARE
                         _result questions;
                     BEGIN
-                        SELECT * INTO _result FROM questions ORDER BY id ASC LIMIT 1 OFFSET (
-                            SELECT questions_solved FROM users WHERE id = _user_id);
+                        -- Index seek past the user's cursor for the season, deleted questions are simply skipped
+                        SELECT * INTO _result FROM questions WHERE id > COALESCE((
+                            SELECT last_question_id FROM players WHERE season = current_season() AND user_id = _user_id), 0)
+                        ORDER BY id ASC LIMIT 1;
                         IF NOT FOUND THEN
                             RETURN NULL;
                         ELSE
@@ -204,182 +434,410 @@ class Database:
             """)
 
             # STORED PROCEDURE: reset_user_answers
-            self.cursor.execute("DROP PROCEDURE IF EXISTS reset_user_answers (INT);")
-            self.cursor.execute("""
+            cursor.execute("DROP PROCEDURE IF EXISTS reset_user_answers (INT);")
+            cursor.execute("""
                 CREATE OR REPLACE PROCEDURE reset_user_answers (_user_id INT)
                 AS $$
+                    DECLARE
+                        _season INT := current_season();
+                        _question_ids INT[];
+                        _correct_answers BIGINT[];
+                        _incorrect_answers BIGINT[];
                     BEGIN
-                        DELETE FROM user_answers WHERE user_id = _user_id;
-                        UPDATE users SET questions_solved = 0, play_timestamp = NULL WHERE id = _user_id;
+                        -- Starts the user over within the current season, past seasons are left alone.
+                        -- Rows are locked in the order handle_user_answer and record_answers lock them (user_answers, players,
+                        -- leaderboard, then question_stats by question id), so a reset and an answer can't deadlock
+                        WITH deleted AS (
+                            DELETE FROM user_answers WHERE season = _season AND user_id = _user_id RETURNING question_id, is_correct
+                        )
+                        SELECT array_agg(question_id ORDER BY question_id), array_agg(correct_answers ORDER BY question_id), array_agg(incorrect_answers ORDER BY question_id)
+                        INTO _question_ids, _correct_answers, _incorrect_answers
+                        FROM (
+                            SELECT question_id, COUNT(*) FILTER (WHERE is_correct) AS correct_answers, COUNT(*) FILTER (WHERE NOT is_correct) AS incorrect_answers
+                            FROM deleted
+                            GROUP BY question_id
+                        ) ua;
+                        DELETE FROM players WHERE season = _season AND user_id = _user_id;
+                        DELETE FROM leaderboard WHERE season = _season AND user_id = _user_id;
+                        -- Take the user's answers back out of the per-question counters
+                        PERFORM 1 FROM question_stats
+                        WHERE season = _season AND question_id = ANY (_question_ids)
+                        ORDER BY question_id FOR UPDATE;
+                        UPDATE question_stats qs SET
+                            correct_answers = qs.correct_answers - ua.correct_answers,
+                            incorrect_answers = qs.incorrect_answers - ua.incorrect_answers
+                        FROM unnest(_question_ids, _correct_answers, _incorrect_answers) AS ua (question_id, correct_answers, incorrect_answers)
+                        WHERE qs.season = _season AND qs.question_id = ua.question_id;
                     END;
                 $$ LANGUAGE plpgsql
             """)
 
-            # Commit Routines
-            self.connection.commit()
-
-        # EXCEPTION: Failure to create stored procedures
-        except psycopg2.OperationalError as e:
-            self.connection.rollback()
-            print(f"[PG-ERROR: FAILED TO CREATE ROUTINES]:\n{e}")
-            raise
+            # STORED FUNCTION: play_step -> (is_correct, next question)
+            cursor.execute("DROP FUNCTION IF EXISTS play_step (INT, INT, INT);")
+            cursor.execute("""
+                CREATE OR REPLACE FUNCTION play_step (_user_id INT, _question_id INT, _answer INT)
+                RETURNS TABLE (is_correct BOOLEAN, next_id INT, next_question TEXT, next_answer_1 TEXT, next_answer_2 TEXT, next_answer_3 TEXT, next_answer_4 TEXT, next_correct_answer SMALLINT)
+                AS $$
+                    DECLARE
+                        _is_correct BOOLEAN;
+                        _next questions;
+                    BEGIN
+                        -- Stamp the start of the user's run through the season if it hasn't been yet. Neither statement
+                        -- locks an already stamped row (ON CONFLICT DO UPDATE would, even when its WHERE fails), which would
+                        -- deadlock with concurrent answers of the same user
+                        INSERT INTO players (season, user_id, play_timestamp) VALUES (current_season(), _user_id, CURRENT_TIMESTAMP)
+                        ON CONFLICT (season, user_id) DO NOTHING;
+                        UPDATE players SET play_timestamp = CURRENT_TIMESTAMP
+                        WHERE season = current_season() AND user_id = _user_id AND play_timestamp IS NULL;
+                        -- Record the answer (if any) and serve the next question in the same transaction
+                        IF _question_id IS NOT NULL THEN
+                            _is_correct := handle_user_answer(_user_id, _question_id, _answer);
+                        END IF;
+                        _next := get_user_question(_user_id);
+                        RETURN QUERY SELECT _is_correct, (_next).*;
+                    END;
+                $$ LANGUAGE plpgsql;
+            """)
 
     def is_password_matching(self, username: str, password: str) -> bool:
-        try:
-            self.cursor.execute("SELECT password FROM users WHERE username = %s;", (username,))
-            result = self.cursor.fetchone()
-            if result is None:
-                return False
-            db_password = result[0]
-            password_in_bytes = password.encode('utf-8')
-            db_password_in_bytes = db_password.encode('utf-8')
-            return bcrypt.checkpw(password_in_bytes, db_password_in_bytes)
-        except psycopg2.OperationalError as e:
-            self.connection.rollback()
-            print(f"[PG-ERROR: FAILED TO EXECUTE FUNCTION `get_user_password` IN PY-FUNCTION `is_password_matching`]:\n{e}")
-            raise
+        with self.cursor('is_password_matching', "FAILED TO EXECUTE FUNCTION `get_user_password` IN PY-FUNCTION `is_password_matching`") as cursor:
+            self.execute_prepared(cursor, 'get_user_password', (username,))
+            result = cursor.fetchone()
+        if result is None:
+            return False
+        db_password = result[0]
+        if not self.hasher.check(password, db_password):
+            return False
+
+        # Transparently move the stored hash to the configured work factor
+        if self.hasher.needs_rehash(db_password):
+            new_password = self.hasher.hash(password)
+            with self.cursor('is_password_matching') as cursor:
+                cursor.execute("UPDATE users SET password = %s WHERE username = %s AND password = %s;", (new_password, username, db_password))
+        return True
 
     def get_user_id(self, username: str) -> int | None:
-        try:
-            self.cursor.execute("SELECT id FROM users WHERE username = %s;", (username,))
-            result = self.cursor.fetchone()
+        with self.cursor('get_user_id') as cursor:
+            self.execute_prepared(cursor, 'get_user_id', (username,))
+            result = cursor.fetchone()
             if result is None:
                 return None
             return result[0]
-        except psycopg2.OperationalError as e:
-            self.connection.rollback()
-            print(f"[PG-ERROR: FAILED TO EXECUTE FUNCTION `get_user_id`]:\n{e}")
-            raise
 
     def create_user(self, username: str, password: str, email: str, dob: date) -> int | None:
-        try:
-            hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-            self.cursor.execute("SELECT create_user (%s, %s, %s, %s)", (username, hashed_password, email, dob))
-            result = self.cursor.fetchone()[0]
-            self.connection.commit()
-            return result
-        except psycopg2.OperationalError as e:
-            self.connection.rollback()
-            print(f"[PG-ERROR: FAILED TO EXECUTE FUNCTION `create_user`]:\n{e}")
-            raise
+        # Hash before checking out a connection, bcrypt is slow and the connection would sit idle meanwhile
+        hashed_password = self.hasher.hash(password)
+        with self.cursor('create_user') as cursor:
+            cursor.execute("SELECT create_user (%s, %s, %s, %s)", (username, hashed_password, email, dob))
+            result = cursor.fetchone()[0]
+        self.wrote()
+        return result
 
     def create_question(self, question: str, answer_1: str, answer_2: str, answer_3: str, answer_4: str, correct_answer: int) -> int | None:
-        try:
-            self.cursor.execute("SELECT create_question (%s, %s, %s, %s, %s, %s)", (question, answer_1, answer_2, answer_3, answer_4, correct_answer))
-            result = self.cursor.fetchone()[0]
-            self.connection.commit()
-            return result
-        except psycopg2.OperationalError as e:
-            self.connection.rollback()
-            print(f"[PG-ERROR: FAILED TO EXECUTE FUNCTION `create_question`]:\n{e}")
-            raise
+        check_correct_answer(correct_answer)
+        with self.cursor('create_question') as cursor:
+            cursor.execute("SELECT create_question (%s, %s, %s, %s, %s, %s)", (question, answer_1, answer_2, answer_3, answer_4, correct_answer))
+            result = cursor.fetchone()[0]
+        self.wrote()
+        return result
+
+    def get_questions(self, after_id: int = 0, limit: int = 10_000) -> list[tuple]:
+        with self.cursor('get_questions') as cursor:
+            cursor.execute("SELECT * FROM questions WHERE id > %s ORDER BY id LIMIT %s;", (after_id, limit))
+            return cursor.fetchall()
+
+    def get_question_bank_version(self) -> tuple[int, int, int]:
+        # Kept up to date by the `question_bank_*` triggers on `questions`
+        with self.cursor('get_question_bank_version') as cursor:
+            cursor.execute("SELECT version, generation, questions FROM question_bank;")
+            return cursor.fetchone()
 
     def get_user_question(self, user_id: int) -> tuple | None:
-        try:
-            self.cursor.execute("SELECT * FROM get_user_question (%s)", (user_id,))
-            result = self.cursor.fetchone()
-            return result if result else None
-        except psycopg2.OperationalError as e:
-            self.connection.rollback()
-            print(f"[PG-ERROR: FAILED TO EXECUTE FUNCTION `get_user_question`]:\n{e}")
-            raise
+        with self.cursor('get_user_question') as cursor:
+            self.execute_prepared(cursor, 'get_user_question', (user_id,))
+            result = cursor.fetchone()
+            # The function returns a NULL row (all columns None) once every question has been answered
+            return result if result and result[0] is not None else None
 
     def handle_user_answer(self, user_id, question_id, answer):
-        try:
-            self.cursor.execute("SELECT handle_user_answer (%s, %s, %s)", (user_id, question_id, answer))
-            result = self.cursor.fetchone()[0]
-            self.connection.commit()
-            return result
-        except psycopg2.OperationalError as e:
-            self.connection.rollback()
-            print(f"[PG-ERROR: FAILED TO EXECUTE FUNCTION `handle_user_answer`]:\n{e}")
-            raise
+        with self.cursor('handle_user_answer') as cursor:
+            self.execute_prepared(cursor, 'handle_user_answer', (user_id, question_id, answer))
+            result = cursor.fetchone()[0]
+        self.wrote(user_id)
+        return result
+
+    def play_step(self, user_id: int, question_id: int | None = None, answer: int | None = None) -> tuple[bool | None, tuple | None]:
+        """Answer `question_id` (if given) and fetch the next question in one round trip.
+
+        Also stamps the user's play timestamp when it isn't set. Returns the verdict (None when nothing was answered)
+        and the next question row, or None when the user has answered every question.
+        """
+        with self.cursor('play_step') as cursor:
+            self.execute_prepared(cursor, 'play_step', (user_id, question_id, answer))
+            result = cursor.fetchone()
+        self.wrote(user_id)
+        return result[0], (result[1:] if result[1] is not None else None)
+
+    def record_answers(self, answers: list[tuple[int, int, bool, datetime]]) -> int:
+        # The whole batch in one statement: dedupe it (DISTINCT ON keeps the earliest answer), drop what is already
+        # recorded or refers to a missing user/question, then bump the counters of what actually got inserted
+        if not answers:
+            return 0
+        with self.cursor('record_answers') as cursor:
+            cursor.execute("""
+                WITH batch AS (
+                    SELECT DISTINCT ON (b.user_id, b.question_id) s.season, b.user_id, b.question_id, b.is_correct, b.answer_timestamp
+                    FROM unnest(%s::INT[], %s::INT[], %s::BOOLEAN[], %s::TIMESTAMPTZ[]) AS b (user_id, question_id, is_correct, answer_timestamp)
+                    CROSS JOIN (SELECT current_season() AS season) s
+                    JOIN users u ON u.id = b.user_id
+                    JOIN questions q ON q.id = b.question_id
+                    WHERE NOT EXISTS (SELECT 1 FROM user_answers ua WHERE ua.season = s.season AND ua.user_id = b.user_id AND ua.question_id = b.question_id)
+                    ORDER BY b.user_id, b.question_id, b.answer_timestamp
+                ), inserted AS (
+                    INSERT INTO user_answers (season, user_id, question_id, is_correct, answer_timestamp)
+                    SELECT * FROM batch
+                    ON CONFLICT (season, user_id, question_id) DO NOTHING
+                    RETURNING season, user_id, question_id, is_correct, answer_timestamp
+                ), solved AS (
+                    INSERT INTO players (season, user_id, questions_solved, last_question_id)
+                    SELECT season, user_id, COUNT(*), MAX(question_id) FROM inserted GROUP BY season, user_id
+                    ON CONFLICT (season, user_id) DO UPDATE SET
+                        questions_solved = players.questions_solved + EXCLUDED.questions_solved,
+                        last_question_id = GREATEST(players.last_question_id, EXCLUDED.last_question_id)
+                    RETURNING season, user_id, play_timestamp
+                ), ranked AS (
+                    INSERT INTO leaderboard (season, user_id, correct_answers, play_timestamp, last_answer_timestamp)
+                    SELECT i.season, i.user_id, COUNT(*), s.play_timestamp, MAX(i.answer_timestamp)
+                    FROM inserted i
+                    JOIN solved s ON s.season = i.season AND s.user_id = i.user_id
+                    WHERE i.is_correct
+                    GROUP BY i.season, i.user_id, s.play_timestamp
+                    ON CONFLICT (season, user_id) DO UPDATE SET
+                        correct_answers = leaderboard.correct_answers + EXCLUDED.correct_answers,
+                        play_timestamp = EXCLUDED.play_timestamp,
+                        last_answer_timestamp = GREATEST(leaderboard.last_answer_timestamp, EXCLUDED.last_answer_timestamp)
+                ), counted AS (
+                    INSERT INTO question_stats (season, question_id, correct_answers, incorrect_answers)
+                    SELECT season, question_id, COUNT(*) FILTER (WHERE is_correct), COUNT(*) FILTER (WHERE NOT is_correct)
+                    FROM inserted
+                    GROUP BY season, question_id
+                    ORDER BY question_id
+                    ON CONFLICT (season, question_id) DO UPDATE SET
+                        correct_answers = question_stats.correct_answers + EXCLUDED.correct_answers,
+                        incorrect_answers = question_stats.incorrect_answers + EXCLUDED.incorrect_answers
+                )
+                SELECT COUNT(*) FROM inserted
+            """, [list(column) for column in zip(*answers)])
+            inserted = cursor.fetchone()[0]
+        self.wrote(*{answer[0] for answer in answers})
+        return inserted
 
     def reset_user_answers(self, user_id):
-        try:
-            self.cursor.execute("CALL reset_user_answers (%s)", (user_id,))
-            self.connection.commit()
-        except psycopg2.OperationalError as e:
-            self.connection.rollback()
-            print(f"[PG-ERROR: FAILED TO EXECUTE FUNCTION `reset_user_answers`]:\n{e}")
-            raise
+        with self.cursor('reset_user_answers') as cursor:
+            cursor.execute("CALL reset_user_answers (%s)", (user_id,))
+        self.wrote(user_id)
 
     def get_user(self, user_id):
-        try:
-            self.cursor.execute("SELECT * FROM users WHERE id = %s;", (user_id,))
-            return self.cursor.fetchone()
-        except psycopg2.OperationalError as e:
-            self.connection.rollback()
-            print(f"[PG-ERROR: FAILED TO EXECUTE FUNCTION `get_user`]:\n{e}")
-            raise
+        with self.cursor('get_user') as cursor:
+            cursor.execute("SELECT * FROM users WHERE id = %s;", (user_id,))
+            return cursor.fetchone()
 
     def get_user_questions_solved(self, user_id):
-        try:
-            self.cursor.execute("SELECT questions_solved FROM users WHERE id = %s;", (user_id,))
-            return self.cursor.fetchone()[0]
-        except psycopg2.OperationalError as e:
-            self.connection.rollback()
-            print(f"[PG-ERROR: FAILED TO EXECUTE FUNCTION `get_user_questions_solved`]:\n{e}")
-            raise
+        with self.cursor('get_user_questions_solved') as cursor:
+            self.execute_prepared(cursor, 'get_user_questions_solved', (user_id,))
+            return cursor.fetchone()[0]
 
     def get_user_play_timestamp(self, user_id):
-        try:
-            self.cursor.execute("SELECT play_timestamp FROM users WHERE id = %s;", (user_id,))
-            return self.cursor.fetchone()[0]
-        except psycopg2.OperationalError as e:
-            self.connection.rollback()
-            print(f"[PG-ERROR: FAILED TO EXECUTE FUNCTION `get_user_play_timestamp`]:\n{e}")
-            raise
+        with self.cursor('get_user_play_timestamp') as cursor:
+            cursor.execute("SELECT play_timestamp FROM players WHERE season = current_season() AND user_id = %s;", (user_id,))
+            result = cursor.fetchone()
+            return result[0] if result else None
 
     def update_user_play_timestamp(self, user_id):
-        try:
-            self.cursor.execute("UPDATE users SET play_timestamp = CURRENT_TIMESTAMP WHERE id = %s;", (user_id,))
-            return self.connection.commit()
-        except psycopg2.OperationalError as e:
-            self.connection.rollback()
-            print(f"[PG-ERROR: FAILED TO EXECUTE FUNCTION `update_user_play_timestamp`]:\n{e}")
-            raise
+        with self.cursor('update_user_play_timestamp') as cursor:
+            cursor.execute("""
+                INSERT INTO players (season, user_id, play_timestamp) VALUES (current_season(), %s, CURRENT_TIMESTAMP)
+                ON CONFLICT (season, user_id) DO UPDATE SET play_timestamp = EXCLUDED.play_timestamp
+            """, (user_id,))
+        self.wrote(user_id)
 
+    @replica_read
     def get_user_statistics(self, user_id):
-        try:
-            self.cursor.execute("""
-                SELECT u.*, COUNT(*)
+        with self.cursor('get_user_statistics', read_only=True, user_id=user_id) as cursor:
+            cursor.execute("""
+                SELECT u.id, u.username, u.password, u.email, u.dob, COALESCE(p.questions_solved, 0), p.play_timestamp, COALESCE(l.correct_answers, 0)
                 FROM users u
-                JOIN user_answers ua ON u.id = ua.user_id
-                WHERE u.id = %s AND ua.is_correct = true
-                GROUP BY u.id
+                LEFT JOIN players p ON p.season = current_season() AND p.user_id = u.id
+                LEFT JOIN leaderboard l ON l.season = current_season() AND l.user_id = u.id
+                WHERE u.id = %s
             """, (user_id,))
-            return self.cursor.fetchone()
-        except psycopg2.OperationalError as e:
-            self.connection.rollback()
-            print(f"[PG-ERROR: FAILED TO EXECUTE FUNCTION `get_user_statistics`]:\n{e}")
-            raise
+            return cursor.fetchone()
 
+    @replica_read
     def query(self, query: str, fetch:int = 0,commit: bool = False):
-        try:
-            self.cursor.execute(query) # SQL Injection risk... DO NOT USE EXTERNALLY
+        # Pooled calls always end their transaction: writes only persist with `commit`, reads are rolled back (and may
+        # run on a replica)
+        with self.cursor('query', commit=commit, read_only=bool(fetch) and not commit) as cursor:
+            cursor.execute(query) # SQL Injection risk... DO NOT USE EXTERNALLY
+            result = None
             if fetch == 1:
-                return self.cursor.fetchone()
+                result = cursor.fetchone()
             elif fetch == 2:
-                return self.cursor.fetchall()
-            if commit:
-                self.connection.commit()
-        except psycopg2.OperationalError as e:
-            self.connection.rollback()
-            print(f"[PG-ERROR: FAILED TO EXECUTE FUNCTION `query)`]:\nQUERY: {query}\n{e}")
-            raise
+                result = cursor.fetchall()
+        if commit:
+            self.wrote()
+        return result
 
+    @replica_read
     def get_user_answers(self, user_id):
-        try:
-            self.cursor.execute("""
-                SELECT q.question, ua.is_correct
-                FROM user_answers ua
-                JOIN questions q ON ua.question_id = q.id
-                WHERE ua.user_id = %s
-                GROUP BY q.question, ua.is_correct
+        with self.cursor('get_user_answers', read_only=True, user_id=user_id) as cursor:
+            cursor.execute(REPORTS[REPORT_USER_ANSWERS], (None, user_id))
+            return [row[:-REPORT_KEYS[REPORT_USER_ANSWERS]] for row in cursor.fetchall()]
+
+    def get_user_question_ids(self, user_id: int) -> list[int]:
+        with self.cursor('get_user_question_ids') as cursor:
+            cursor.execute("SELECT question_id FROM user_answers WHERE season = current_season() AND user_id = %s ORDER BY question_id;", (user_id,))
+            return [row[0] for row in cursor.fetchall()]
+
+    @replica_read
+    def get_hall_of_fame(self, limit: int = 10, offset: int = 0, season: int | None = None) -> list[tuple]:
+        # A page of (rank, username, correct_answers, playtime), read straight off the `leaderboard_rank` index
+        with self.cursor('get_hall_of_fame', read_only=True) as cursor:
+            cursor.execute("""
+                SELECT %s + ROW_NUMBER() OVER (), username, correct_answers, playtime
+                FROM (
+                    SELECT u.username, l.correct_answers, to_char(l.last_answer_timestamp - l.play_timestamp, 'HH24:MI:SS.MS') AS playtime
+                    FROM leaderboard l
+                    JOIN users u ON l.user_id = u.id
+                    WHERE l.season = COALESCE(%s, current_season())
+                    ORDER BY -l.correct_answers, l.last_answer_timestamp - l.play_timestamp, l.user_id
+                    LIMIT %s OFFSET %s
+                ) page
+            """, (offset, season, limit, offset))
+            return cursor.fetchall()
+
+    @replica_read
+    def get_user_rank(self, user_id: int) -> int | None:
+        # Position of the user in the Hall of Fame, None if they haven't answered correctly yet
+        with self.cursor('get_user_rank', read_only=True, user_id=user_id) as cursor:
+            cursor.execute("""
+                SELECT 1 + (
+                    SELECT COUNT(*) FROM leaderboard l
+                    WHERE l.season = me.season
+                      AND (-l.correct_answers, l.last_answer_timestamp - l.play_timestamp, l.user_id)
+                        < (-me.correct_answers, me.last_answer_timestamp - me.play_timestamp, me.user_id)
+                )
+                FROM leaderboard me
+                WHERE me.season = current_season() AND me.user_id = %s
             """, (user_id,))
-            return self.cursor.fetchall()
-        except psycopg2.OperationalError as e:
-            self.connection.rollback()
-            print(f"[PG-ERROR: FAILED TO EXECUTE FUNCTION `get_user_answers`]:\n{e}")
-            raise
\ No newline at end of file
+            result = cursor.fetchone()
+            return result[0] if result else None
+
+    def check_leaderboard(self) -> list[tuple]:
+        """Compare `leaderboard` against the raw answers, every season of it.
+
+        Returns (season, user_id, expected, actual) for every entry that differs, where both sides are
+        (correct_answers, play_timestamp, last_answer_timestamp) tuples or None for a missing entry.
+        """
+        with self.cursor('check_leaderboard') as cursor:
+            cursor.execute(f"""
+                SELECT COALESCE(e.season, l.season), COALESCE(e.user_id, l.user_id),
+                       e.correct_answers, e.play_timestamp, e.last_answer_timestamp,
+                       l.correct_answers, l.play_timestamp, l.last_answer_timestamp
+                FROM ({LEADERBOARD_SOURCE}) e
+                FULL JOIN leaderboard l ON l.season = e.season AND l.user_id = e.user_id
+                WHERE e.user_id IS NULL OR l.user_id IS NULL
+                   OR e.correct_answers <> l.correct_answers
+                   OR e.play_timestamp IS DISTINCT FROM l.play_timestamp
+                   OR e.last_answer_timestamp IS DISTINCT FROM l.last_answer_timestamp
+            """)
+            return [(row[0], row[1], row[2:5] if row[2] is not None else None, row[5:8] if row[5] is not None else None) for row in cursor.fetchall()]
+
+    def rebuild_leaderboard(self):
+        with self.cursor('rebuild_leaderboard') as cursor:
+            cursor.execute("LOCK TABLE leaderboard IN EXCLUSIVE MODE;")
+            cursor.execute("DELETE FROM leaderboard;")
+            cursor.execute(f"INSERT INTO leaderboard (season, user_id, correct_answers, play_timestamp, last_answer_timestamp) {LEADERBOARD_SOURCE}")
+        self.wrote()
+
+    @replica_read
+    def count_players(self) -> int:
+        with self.cursor('count_players', read_only=True) as cursor:
+            cursor.execute("SELECT COUNT(*) FROM players WHERE season = current_season() AND questions_solved <> 0;")
+            return cursor.fetchone()[0]
+
+    def get_season(self) -> int:
+        with self.cursor('get_season') as cursor:
+            cursor.execute("SELECT current_season();")
+            return cursor.fetchone()[0]
+
+    def start_season(self) -> int:
+        """Attach an empty answers partition for the next season and make it the current one.
+
+        Nothing is deleted or rewritten: the finished season's partition, leaderboard and counters stay as they are, and
+        each player's progress starts over as soon as the season's row is committed. ATTACH PARTITION only takes a SHARE
+        UPDATE EXCLUSIVE lock, so games in progress keep reading and writing while it runs.
+        """
+        with self.cursor('start_season', "FAILED TO START A NEW SEASON") as cursor:
+            # Serializes concurrent rollovers without blocking answers (their foreign key checks only take ROW SHARE)
+            cursor.execute("LOCK TABLE seasons IN SHARE ROW EXCLUSIVE MODE;")
+            cursor.execute("SELECT MAX(id) + 1 FROM seasons;")
+            season: int = cursor.fetchone()[0]
+            cursor.execute(f"CREATE TABLE user_answers_{season} (LIKE user_answers INCLUDING DEFAULTS);")
+            cursor.execute(f"ALTER TABLE user_answers ATTACH PARTITION user_answers_{season} FOR VALUES IN ({season});")
+            cursor.execute("INSERT INTO seasons (id) VALUES (%s);", (season,))
+        self.wrote()
+        return season
+
+    def open_report(self, report: str, params: tuple = (), page_size: int = REPORT_PAGE_SIZE, season: int | None = None) -> Pager:
+        """Page through a report, each page is a keyset read with a connection of its own.
+
+        Nothing is held between two pages, neither a pooled connection nor a transaction: the menus keep a pager open while
+        the admin reads the page. The pager remembers the keys (see `REPORTS`) of the last row of every page it has read,
+        a page picks up after the nearest one of them and MOVEs a server-side cursor over whatever is left to skip, so
+        going back or forward a page never rereads the rows before it. The COUNT(*) only runs if the total is asked for.
+        """
+        query = REPORTS[report]
+        params = (season, *params)
+        user_id = params[1] if report == REPORT_USER_ANSWERS else None
+        keys = [f'k{number}' for number in range(1, REPORT_KEYS[report] + 1)]
+        after = f"WHERE ({', '.join(keys)}) > ({', '.join(['%s'] * len(keys))})"
+        # The offset of each row read after a page's last one, and that row's keys
+        last_keys: dict[int, tuple] = {}
+
+        def count() -> int:
+            with self.cursor('open_report', commit=False, read_only=True, user_id=user_id) as cursor:
+                cursor.execute(f"SELECT COUNT(*) FROM ({query}) report", params)
+                return cursor.fetchone()[0]
+
+        def fetch(limit: int, offset: int) -> list[tuple]:
+            start = max((known for known in last_keys if known <= offset), default=0)
+            last_key = last_keys.get(start, ())
+            with self.cursor('open_report', commit=False, name=f'page_{report}', read_only=True, user_id=user_id) as cursor:
+                cursor.execute(f"SELECT * FROM ({query}) report {after if last_key else ''} ORDER BY {', '.join(keys)} LIMIT %s",
+                               (*params, *last_key, offset - start + limit))
+                if offset > start:
+                    cursor.scroll(offset - start)
+                rows = cursor.fetchall()
+            if rows:
+                last_keys[offset + len(rows)] = rows[-1][-len(keys):]
+            return [row[:-len(keys)] for row in rows]
+        return Pager(functools.partial(self.read, fetch), functools.partial(self.read, count), page_size)
+
+    def stream_report(self, report: str, params: tuple = (), batch_size: int = REPORT_BATCH_SIZE, season: int | None = None) -> Iterator[tuple]:
+        # A forward-only server-side cursor, iterating it FETCHes `batch_size` rows at a time. Not run again when a
+        # replica fails: the rows before the failure are gone already
+        with self.cursor('stream_report', commit=False, name=f'stream_{report}', read_only=True,
+                         user_id=params[0] if report == REPORT_USER_ANSWERS else None) as cursor:
+            cursor.itersize = batch_size
+            cursor.execute(REPORTS[report], (season, *params))
+            keys = REPORT_KEYS[report]
+            for row in cursor:
+                yield row[:-keys]
+
+    def rebuild_question_stats(self):
+        with self.cursor('rebuild_question_stats') as cursor:
+            cursor.execute("LOCK TABLE question_stats IN EXCLUSIVE MODE;")
+            cursor.execute("DELETE FROM question_stats;")
+            cursor.execute(f"INSERT INTO question_stats (season, question_id, correct_answers, incorrect_answers) {QUESTION_STATS_SOURCE}")
+        self.wrote()
\ No newline at end of file
@@ -0,0 +1,263 @@
+import re
+import csv
+import bisect
+import random
+import zlib
+import threading
+from functools import cache
+from array import array
+from typing import Iterable
+
+from storage import Storage, rows_from_storage
+
+# Questions are compared on the sets of their character 3-grams (Jaccard similarity)
+DEDUPE_SHINGLE: int = 3
+# Signature of DEDUPE_BANDS * DEDUPE_ROWS bins, two questions are candidates when all the bins of one band match
+DEDUPE_BANDS: int = 8
+DEDUPE_ROWS: int = 4
+DEDUPE_THRESHOLD: float = 0.7
+# Members of an LSH bucket a question is verified against when clustering, before it is taken as a new member
+DEDUPE_REPRESENTATIVES: int = 8
+
+_SEPARATORS = re.compile(r'[\W_]+')
+_BIN_VALUE: int = 0xFFFF
+
+
+def normalize(text: str) -> str:
+    """Lower case, with punctuation and runs of white space turned into single spaces."""
+    return _SEPARATORS.sub(' ', text.lower()).strip()
+
+
+def shingles(text: str) -> set[int]:
+    data = f' {normalize(text)} '.encode('utf-8')
+    return {zlib.crc32(data[n:n + DEDUPE_SHINGLE]) for n in range(max(len(data) - DEDUPE_SHINGLE + 1, 1))}
+
+
+@cache
+def _probes(bins: int) -> tuple[tuple[int, ...], ...]:
+    # Per bin, the order in which an empty one looks at the others for a value to borrow, the same for every text
+    return tuple(tuple(random.Random(number).sample(range(bins), bins)) for number in range(bins))
+
+
+def signature(text: str, bins: int) -> list[int]:
+    """One-permutation MinHash: each shingle hash goes to one of `bins` bins by its top bits, and a bin keeps the
+    lowest of its values. Empty bins borrow the value of a non-empty one, picked along a fixed pseudo-random order of
+    their own (optimal densification), so short texts still get a full signature and a run of empty bins isn't all
+    copied from the same neighbour. Two signatures agree on a bin with a probability of the Jaccard similarity of the
+    texts."""
+    width = (bins - 1).bit_length()
+    mins = [None] * bins
+    for value in shingles(text):
+        # crc32 is linear, scramble it before splitting off the bin
+        value = (value * 0x9E3779B1) & 0xFFFFFFFF
+        number, value = value >> (32 - width), value & _BIN_VALUE
+        if number < bins and (mins[number] is None or value < mins[number]):
+            mins[number] = value
+    if None not in mins:
+        return mins
+    values = mins[:]
+    for number, probes in enumerate(_probes(bins)):
+        if mins[number] is None:
+            source = next((source for source in probes if mins[source] is not None), None)
+            if source is None:
+                return [0] * bins
+            # The offset keeps two texts from agreeing on a bin only because both were empty there
+            values[number] = (mins[source] + (source - number) % bins * 0x9E37) & _BIN_VALUE
+    return values
+
+
+class DuplicateIndex:
+    """Near-duplicate lookup over question texts with MinHash signatures and locality-sensitive hashing.
+
+    A question lands in one bucket per band of its signature, and `find` only verifies the questions sharing a bucket
+    with the text, so a check costs a few binary searches whatever the size of the bank. Similarities are estimated
+    from the signatures: the share of bins on which two questions agree. Built from a whole bank with `load`, the
+    buckets are sorted arrays (about 170 bytes per question); `add` keeps later questions in a dict until the next
+    `load`.
+    """
+
+    def __init__(self, threshold: float = DEDUPE_THRESHOLD, bands: int = DEDUPE_BANDS, rows: int = DEDUPE_ROWS):
+        self.threshold = threshold
+        self.band_count = bands
+        self.rows = rows
+        self.bins = bands * rows
+        self.ids = array('i')
+        self.signatures = array('H')
+        # Per band: the bucket keys in ascending order, and the position in `ids` of the question each belongs to
+        self.keys: list[array] = [array('q') for _ in range(bands)]
+        self.positions: list[array] = [array('i') for _ in range(bands)]
+        # Bucket key -> positions, for the questions added since `load`
+        self.recent: dict[int, list[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _band_keys(self, values: list[int]) -> list[int]:
+        rows = self.rows
+        return [hash((band, *values[band * rows:(band + 1) * rows])) for band in range(self.band_count)]
+
+    def load(self, rows: Iterable[tuple]):
+        """Index `rows` (id, question, ...), replacing anything indexed before."""
+        self.ids, self.signatures, self.recent = array('i'), array('H'), {}
+        keys = [array('q') for _ in range(self.band_count)]
+        for question_id, question, *_ in rows:
+            values = signature(question, self.bins)
+            self.ids.append(question_id)
+            self.signatures.extend(values)
+            for band, key in enumerate(self._band_keys(values)):
+                keys[band].append(key)
+        for band, band_keys in enumerate(keys):
+            order = sorted(range(len(band_keys)), key=band_keys.__getitem__)
+            self.keys[band] = array('q', (band_keys[position] for position in order))
+            self.positions[band] = array('i', order)
+
+    def add(self, question_id: int, question: str):
+        values = signature(question, self.bins)
+        position = len(self.ids)
+        self.ids.append(question_id)
+        self.signatures.extend(values)
+        for key in self._band_keys(values):
+            self.recent.setdefault(key, []).append(position)
+
+    def similarity(self, values: list[int], position: int) -> float:
+        stored = self.signatures[position * self.bins:(position + 1) * self.bins]
+        return sum(a == b for a, b in zip(values, stored)) / self.bins
+
+    def _bucket(self, band: int, key: int) -> list[int]:
+        keys = self.keys[band]
+        index = bisect.bisect_left(keys, key)
+        end = bisect.bisect_right(keys, key, index)
+        return self.positions[band][index:end].tolist() + self.recent.get(key, [])
+
+    def _candidates(self, values: list[int]) -> set[int]:
+        candidates = set()
+        for band, key in enumerate(self._band_keys(values)):
+            candidates.update(self._bucket(band, key))
+        return candidates
+
+    def find(self, question: str) -> list[tuple[int, float]]:
+        """(question id, estimated similarity) of the indexed questions at least `threshold` alike, most alike first."""
+        values = signature(question, self.bins)
+        matches = []
+        for position in self._candidates(values):
+            similarity = self.similarity(values, position)
+            if similarity >= self.threshold:
+                matches.append((self.ids[position], similarity))
+        matches.sort(key=lambda match: (-match[1], match[0]))
+        return matches
+
+    def clusters(self) -> list[list[int]]:
+        """Groups of question ids that are near-duplicates of one another (directly or through other members), each
+        in ascending id order, largest group first. Only groups of two or more are returned."""
+        parents = list(range(len(self.ids)))
+
+        def root(position: int) -> int:
+            while parents[position] != position:
+                parents[position] = parents[parents[position]]
+                position = parents[position]
+            return position
+
+        # The buckets the questions added since `load` are in, then the loaded ones holding two questions or more
+        buckets: list[Iterable[int]] = []
+        for position in sorted({position for positions in self.recent.values() for position in positions}):
+            values = self.signatures[position * self.bins:(position + 1) * self.bins].tolist()
+            buckets.extend(self._bucket(band, key) for band, key in enumerate(self._band_keys(values)))
+        for keys, positions in zip(self.keys, self.positions):
+            start = 0
+            for end in range(1, len(keys) + 1):
+                if end == len(keys) or keys[end] != keys[start]:
+                    if end - start > 1:
+                        buckets.append(positions[start:end])
+                    start = end
+        for bucket in buckets:
+            # Compare each member with a few that were kept, a near-duplicate of any of them joins its group
+            kept: list[int] = []
+            for position in bucket:
+                values = self.signatures[position * self.bins:(position + 1) * self.bins]
+                for other in kept:
+                    if root(other) != root(position) and self.similarity(values, other) >= self.threshold:
+                        parents[root(position)] = root(other)
+                if len(kept) < DEDUPE_REPRESENTATIVES:
+                    kept.append(position)
+
+        groups: dict[int, list[int]] = {}
+        for position in range(len(self.ids)):
+            groups.setdefault(root(position), []).append(self.ids[position])
+        clusters = [sorted(group) for group in groups.values() if len(group) > 1]
+        clusters.sort(key=lambda cluster: (-len(cluster), cluster[0]))
+        return clusters
+
+
+def index_storage(storage: Storage, threshold: float = DEDUPE_THRESHOLD) -> DuplicateIndex:
+    index = DuplicateIndex(threshold)
+    index.load(rows_from_storage(storage))
+    return index
+
+
+class SharedDuplicateIndex:
+    """The `DuplicateIndex` of a storage's question bank, one per process for all its sessions.
+
+    Built on the first `find`, then kept current by `add` for the questions created through the process. It is built
+    again when `Storage.get_question_bank_version` tells of changes `add` didn't see: questions changed or deleted, or
+    created by another process. One session rebuilds it while `lock` is free, the others keep looking in the index
+    they have until the new one is swapped in.
+    """
+
+    def __init__(self, storage: Storage, threshold: float = DEDUPE_THRESHOLD):
+        self.storage = storage
+        self.threshold = threshold
+        self.index: DuplicateIndex | None = None
+        self.generation: int | None = None
+        # `lock` guards the index, `build_lock` is held through a rebuild
+        self.lock = threading.Lock()
+        self.build_lock = threading.Lock()
+
+    @property
+    def built(self) -> bool:
+        return self.index is not None
+
+    def find(self, question: str) -> list[tuple[int, float]]:
+        _, generation, questions = self.storage.get_question_bank_version()
+        index = self._current(generation, questions)
+        # Only the first find has to wait for a build, the others go on with the index they have
+        if index is None and self.build_lock.acquire(blocking=self.index is None):
+            try:
+                index = self._current(generation, questions)
+                if index is None:
+                    index = index_storage(self.storage, self.threshold)
+                    with self.lock:
+                        self.index, self.generation = index, generation
+            finally:
+                self.build_lock.release()
+        with self.lock:
+            return (index if index is not None else self.index).find(question)
+
+    def _current(self, generation: int, questions: int) -> DuplicateIndex | None:
+        # The index, if it is up to date with that version of the bank
+        with self.lock:
+            if self.index is not None and generation == self.generation and questions == len(self.index):
+                return self.index
+            return None
+
+    def add(self, question_id: int, question: str):
+        with self.lock:
+            if self.index is not None:
+                self.index.add(question_id, question)
+
+
+def export_clusters(storage: Storage, path: str, threshold: float = DEDUPE_THRESHOLD) -> tuple[int, int]:
+    """Write the near-duplicate groups of the whole question bank to a CSV file (cluster, id, question), returns the
+    number of groups and of questions in them."""
+    clusters = index_storage(storage, threshold).clusters()
+    cluster_of = {question_id: number for number, cluster in enumerate(clusters, 1) for question_id in cluster}
+    texts: dict[int, str] = {}
+    for question_id, question, *_ in rows_from_storage(storage):
+        if question_id in cluster_of:
+            texts[question_id] = question
+    with open(path, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(('cluster', 'id', 'question'))
+        for number, cluster in enumerate(clusters, 1):
+            for question_id in cluster:
+                writer.writerow((number, question_id, texts.get(question_id, '')))
+    return len(clusters), len(cluster_of)
\ No newline at end of file
@@ -0,0 +1,188 @@
+import re
+import time
+import random
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable
+
+from dedupe import SharedDuplicateIndex
+from functions import Session
+from ordering import QuestionOrder
+from profiling import MenuTimers, Profiler
+from question_store import QuestionStore
+from questionpack import QuestionPack
+from render import CLEAR
+from storage import Storage
+
+# What a bot does after logging in: the player menu actions, then the admin ones
+PLAYER_ACTIONS: tuple[str, ...] = ('play', 'my_statistics', 'hall_of_fame')
+ADMIN_ACTIONS: tuple[str, ...] = ('create_question', 'reports')
+DRIVER_QUESTIONS: int = 10
+DRIVER_PAGES: int = 3
+DRIVER_ADMIN_SHARE: float = 0.1
+# Admin reports a bot picks from (see `Session.statistics_menu`)
+DRIVER_REPORTS: tuple[int, ...] = (1, 2, 3, 4, 5, 6, 7)
+
+PLAYER_MENU: dict[str, str] = {'play': '1', 'my_statistics': '2', 'hall_of_fame': '3', 'logout': '4'}
+ADMIN_MENU: dict[str, str] = {'create_question': '1', 'reports': '2', 'logout': '4'}
+
+
+class DriverError(Exception):
+    pass
+
+
+class Bot:
+    """Plays one headless session by answering each prompt from the screen it ends.
+
+    `plan` lists what to do in order: `register`, `login` or `admin` at the start menu, then menu actions
+    (`PLAYER_ACTIONS`, `ADMIN_ACTIONS`) up to a `logout`. Once the plan is done the bot leaves at the start menu. A
+    screen it has no reply for raises `DriverError`, so flows that changed show up instead of looping.
+    """
+
+    def __init__(self, plan: Iterable[str], username: str, password: str = 'Driver-1', seed: int | None = None,
+                 questions: int = DRIVER_QUESTIONS, pages: int = DRIVER_PAGES):
+        self.plan = deque(plan)
+        self.username = username
+        self.password = password
+        self.random = random.Random(seed)
+        self.questions = questions
+        self.pages = pages
+        self.admin: bool = False
+        self.answers_left: int = 0
+        self.pages_left: int = 0
+        self.reports: list[int] = []
+
+    def next_action(self, menu: dict[str, str]) -> str:
+        action = self.plan.popleft() if self.plan else 'logout'
+        if action not in menu:
+            raise DriverError(f"`{action}` is not on this menu")
+        if action == 'play':
+            self.answers_left = self.questions
+        elif action == 'hall_of_fame':
+            self.pages_left = self.random.randint(0, self.pages)
+        elif action == 'reports':
+            self.reports = self.random.sample(DRIVER_REPORTS, self.random.randint(1, 3))
+        return menu[action]
+
+    def reply(self, screen: str, prompt: str) -> str:
+        if prompt.endswith('Insert your choice: '):
+            if '1. Login\n2. Register' in screen:
+                if not self.plan:
+                    raise EOFError
+                entry = self.plan.popleft()
+                self.admin = entry == 'admin'
+                return '2' if entry == 'register' else '1'
+            if 'Would you like to continue the game' in screen:
+                return '1'
+            if '1. Play\n' in screen:
+                return self.next_action(PLAYER_MENU)
+            if '1. Create a Question\n' in screen:
+                return self.next_action(ADMIN_MENU)
+            if '9. Return\n' in screen:
+                if self.reports:
+                    self.pages_left = self.random.randint(0, self.pages)
+                    return str(self.reports.pop())
+                return '9'
+        elif prompt.endswith('Username: '):
+            if 'already taken' in screen:
+                raise DriverError(f"username {self.username} is taken")
+            return 'admin' if self.admin else self.username
+        elif prompt.endswith('Password: '):
+            if 'Invalid password' in screen:
+                return 'EXIT'
+            return 'admin' if self.admin else self.password
+        elif prompt.endswith('E-mail: '):
+            return f'{self.username}@example.com'
+        elif prompt.endswith('D.O.B: '):
+            return '2000-01-01'
+        elif prompt.endswith('Insert your answer: '):
+            if self.answers_left > 0:
+                self.answers_left -= 1
+                return str(self.random.randint(1, 4))
+            return '5'
+        elif 'The right answer is #' in prompt:
+            return ''
+        elif prompt.endswith('Question: '):
+            return f"Which number did {self.username} draw, {self.random.getrandbits(64):x}?"
+        elif re.search(r'Answer [1-4]: $', prompt):
+            return str(self.random.randint(1, 1000))
+        elif prompt.endswith('Correct Answer: '):
+            return str(self.random.randint(1, 4))
+        elif prompt.endswith('Y/N: '):
+            # Create its question, keep it even if it looks like another one, never start a new season
+            return 'y' if 'create this question' in prompt or 'still like to create' in prompt else 'n'
+        elif prompt.endswith('User ID: '):
+            return str(self.random.randint(1, 100))
+        elif 'N. Next page' in prompt:
+            if self.pages_left > 0:
+                self.pages_left -= 1
+                return 'n'
+            return ''
+        elif 'otherwise press ENTER' in prompt:
+            self.answers_left = 0
+            return ''
+        elif 'ENTER' in prompt:
+            return ''
+        raise DriverError(f"no reply for the screen: {screen[-200:]!r}")
+
+
+class DriverIO:
+    # Front-end of a headless session: hands the bot the whole screen ending with each prompt
+    def __init__(self, bot: Bot):
+        self.bot = bot
+        self.screen: list[str] = []
+        self.prompts: int = 0
+
+    def input(self, prompt: str = '') -> str:
+        self.screen.append(prompt)
+        screen = ''.join(self.screen)
+        self.screen.clear()
+        self.prompts += 1
+        return self.bot.reply(screen[screen.rfind(CLEAR) + 1:], prompt.replace(CLEAR, ''))
+
+    def print(self, *values, sep: str = ' ', end: str = '\n'):
+        self.screen.append(sep.join(str(value) for value in values) + end)
+
+    def close(self):
+        pass
+
+
+def random_plan(generator: random.Random, admin_share: float = DRIVER_ADMIN_SHARE) -> list[str]:
+    """A player who registers, plays, looks around and comes back later, or an admin looking at the game."""
+    if generator.random() < admin_share:
+        return ['admin', *generator.choices(ADMIN_ACTIONS, weights=(1, 4), k=generator.randint(1, 3)), 'logout']
+    plan = ['register']
+    for _ in range(generator.randint(1, 3)):
+        plan += [*generator.choices(PLAYER_ACTIONS, weights=(6, 1, 2), k=generator.randint(1, 4)), 'logout', 'login']
+    return plan[:-1]
+
+
+def random_bots(sessions: int, seed: int, prefix: str, questions: int = DRIVER_QUESTIONS, admin_share: float = DRIVER_ADMIN_SHARE) -> list[Bot]:
+    # Same seed, same sessions: only `prefix` (which keeps usernames unique between runs) differs
+    generator = random.Random(seed)
+    return [Bot(random_plan(generator, admin_share), f'{prefix}_{number}', seed=generator.getrandbits(64), questions=questions)
+            for number in range(sessions)]
+
+
+def drive(db: Storage, bots: Iterable[Bot], questions: QuestionStore | QuestionPack | None = None, order: QuestionOrder | None = None,
+          timers: MenuTimers | None = None, profiler: Profiler | None = None, concurrency: int = 1) -> tuple[int, int, float, list[BaseException]]:
+    """Run a headless session per bot, `concurrency` at a time, returns (sessions, prompts, seconds, errors)."""
+    bots = list(bots)
+    ios = [DriverIO(bot) for bot in bots]
+    errors: list[BaseException] = []
+    duplicates = SharedDuplicateIndex(db)
+
+    def run(io: DriverIO):
+        session = Session(db, io, questions, order, timers, duplicates)
+        try:
+            if profiler is not None:
+                profiler.run(session.run)
+            else:
+                session.run()
+        except Exception as e:
+            errors.append(e)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='driver') as executor:
+        list(executor.map(run, ios))
+    return len(bots), sum(io.prompts for io in ios), time.perf_counter() - start, errors
\ No newline at end of file
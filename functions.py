@@ -1,358 +1,507 @@
 import re
+import sys
 import datetime
+from collections import deque
+from typing import Callable, Iterable, TextIO
 
 from database import Database
+from dedupe import SharedDuplicateIndex
+from hashing import PasswordHasherBusy
+from ordering import QuestionOrder, QuestionSequence
+from profiling import MenuTimers, Profiler, TimedIO
+from question_store import QuestionStore
+from questionpack import QuestionPack
+from render import CLEAR, Frame, Renderer
+from storage import (REPORT_EASIEST_QUESTIONS, REPORT_HARDEST_QUESTIONS, REPORT_MOST_ACTIVE_USERS, REPORT_MOST_CORRECT_USERS,
+                     REPORT_QUESTION_STATISTICS, REPORT_USER_ANSWERS, Storage)
 
 MENU_START: int = 0
 MENU_LOGIN: int = 1
 MENU_REGISTER: int = 2
 MENU_ADMIN: int = 3
 MENU_USER: int = 4
+MENU_STATISTICS: int = 5
 MENU_QUESTION: int = 1000
+MENU_NAMES: dict[int, str] = {MENU_START: 'start', MENU_LOGIN: 'login', MENU_REGISTER: 'register', MENU_ADMIN: 'admin',
+                              MENU_USER: 'user', MENU_STATISTICS: 'statistics', MENU_QUESTION: 'play'}
 
-db = Database()
-user_id: int | None = None
-status: bool = True
+HALL_OF_FAME_PAGE_SIZE: int = 10
+STATISTICS_PAGE_SIZE: int = 20
 
-def initialize_game():
+db: Storage = Database()
+
+def initialize_game(questions: QuestionStore | QuestionPack | None = None, order: QuestionOrder | None = None, render_mode: str = 'auto',
+                    profiler: Profiler | None = None, duplicates: SharedDuplicateIndex | None = None):
     # Connect or Create Database
     db.connect()
-
-    # Display Menu until game status is disabled
-    while status:
-        display_menu(MENU_START)
-
-def display_menu(menu_id):
-    global user_id
+    if questions is not None:
+        questions.refresh()
+    if order is not None:
+        order.build(db)
+
+    # Play a single session on this terminal
+    profiler = profiler or Profiler()
+    profiler.run(Session(db, ConsoleIO(Renderer(render_mode, sys.stdout.isatty())), questions, order, profiler.timers, duplicates).run)
+
+class ConsoleIO:
+    # Terminal front-end of a session, the prints of a screen are held back and written with its prompt in one go
+    def __init__(self, renderer: Renderer | None = None, stdin: TextIO | None = None, stdout: TextIO | None = None):
+        self.stdin = stdin or sys.stdin
+        self.stdout = stdout or sys.stdout
+        self.frame = Frame(renderer or Renderer(tty=self.stdout.isatty()))
+
+    def input(self, prompt: str = '') -> str:
+        self.write(self.frame.take(prompt))
+        line = self.stdin.readline()
+        if not line:
+            raise EOFError
+        return line.rstrip('\r\n')
+
+    def print(self, *values, sep: str = ' ', end: str = '\n'):
+        self.frame.add(sep.join(str(value) for value in values) + end)
+
+    def close(self):
+        self.write(self.frame.take() + self.frame.renderer.close())
+
+    def write(self, text: str):
+        if text:
+            self.stdout.write(text)
+            self.stdout.flush()
+
+class ScriptedIO:
+    """Headless front-end of a session, for replays and benchmarks.
+
+    Answers prompts from `lines` (any iterable, so generators keep long sessions lazy) and raises `EOFError` once they
+    run out. Only the last `keep` prompts/prints are kept in `transcript`, the rest is just counted in `output_size`.
+    """
+
+    def __init__(self, lines: Iterable[str], keep: int = 100):
+        self.lines = iter(lines)
+        self.transcript: deque[str] = deque(maxlen=keep)
+        self.output_size: int = 0
+        self.prompts: int = 0
+
+    def input(self, prompt: str = '') -> str:
+        self.print(prompt, end='')
+        self.prompts += 1
+        try:
+            return next(self.lines)
+        except StopIteration:
+            raise EOFError from None
+
+    def print(self, *values, sep: str = ' ', end: str = '\n'):
+        text = (sep.join(str(value) for value in values) + end).replace(CLEAR, '')
+        self.output_size += len(text)
+        self.transcript.append(text)
+
+    def close(self):
+        pass
+
+class Session:
+    """A single player's trip through the menus.
+
+    All state lives on the session and all I/O goes through `io` (anything with `input`, `print` and `close` like
+    `ConsoleIO`, screens start with `render.CLEAR`),
+    so many sessions can share one `Storage`. `io.input` raising `EOFError` ends the session. With a shared
+    `QuestionStore` or `QuestionPack` the questions after the first one are served from memory, the session keeps its
+    own cursor. With a `QuestionOrder` on top of it, every player goes through the bank in an order of their own. The
+    near-duplicate check of new questions uses `duplicates`, which the sessions of a process should share too.
+
+    The menus form a state machine: every handler runs a single screen and returns the id of the next menu, and `run`
+    loops over them, so the stack stays flat no matter how long the session goes on.
+    """
+
+    def __init__(self, db: Storage, io=None, questions: QuestionStore | QuestionPack | None = None, order: QuestionOrder | None = None,
+                 timers: MenuTimers | None = None, duplicates: SharedDuplicateIndex | None = None):
+        self.db = db
+        self.io = io or ConsoleIO()
+        # Time every menu action, without the time the player takes to answer
+        self.timers = timers
+        if timers is not None:
+            self.io = TimedIO(self.io)
+        self.questions = questions
+        self.order = order
+        # The player's own way through `order` while they are in the game
+        self.sequence: QuestionSequence | None = None
+        self.user_id: int | None = None
+        self.status: bool = True
+        self.menu: int = MENU_START
+        # Question currently on screen, fetched together with the verdict of the previous one
+        self.question: tuple | None = None
+        # Season the admin statistics show, None for the current one
+        self.season: int | None = None
+        # Near-duplicate index of the question bank, built the first time an admin creates a question
+        self.duplicates = duplicates if duplicates is not None else SharedDuplicateIndex(db)
+        self.handlers = {
+            MENU_START: self.start_menu,
+            MENU_LOGIN: self.login,
+            MENU_REGISTER: self.register,
+            MENU_ADMIN: self.admin_menu,
+            MENU_STATISTICS: self.statistics_menu,
+            MENU_USER: self.user_menu,
+            MENU_QUESTION: self.play,
+        }
+
+    def run(self):
+        # Display Menu until game status is disabled
+        try:
+            while self.status:
+                self.menu = self.display_menu(self.menu)
+        except EOFError:
+            self.status = False
+        finally:
+            self.io.close()
+
+    def display_menu(self, menu_id: int) -> int:
+        if self.timers is not None:
+            return self.timers.run(MENU_NAMES[menu_id], self.io, self.handlers[menu_id])
+        return self.handlers[menu_id]()
 
     # ========================================= [START MENU] ============================================
 
-    # MENU_START
-    if menu_id == MENU_START:
-        while True:
-            selection = input("\n" * 100 + "Please select an option from the menu:\n1. Login\n2. Register\nInsert your choice: ")
-            if not selection.isnumeric():
-                input("Invalid input! Press ENTER to continue...")
-                continue
-            selection = int(selection)
-
-            # MENU_START -> Login (1)
-            if selection == 1:
-                username: str = input("\n" * 100 + "Please enter your credentials!\nUsername: ")
-                password: str = input("Password: ")
-                if username == 'admin' and password == 'admin':
-                    display_menu(MENU_ADMIN)
-                else:
-                    correct_password: bool = db.is_password_matching(username, password)
-                    # While password is invalid
-                    while not correct_password and password != 'EXIT':
-                        password = input("\n" * 100 + "Invalid password, please try again!\nTo exit please type 'EXIT'.\nPassword: ")
-                        correct_password = db.is_password_matching(username, password)
-                    # If successfully logged in
-                    if correct_password:
-                        user_id = db.get_user_id(username)
-                        display_menu(MENU_USER)
-
-            # MENU_START -> Register (2)
-            elif selection == 2:
-
-                # Register -> Username
-                username: str = input("\n" * 100 + "Please enter your desired username!\nUsername: ")
-                while db.get_user_id(username) is not None:
-                    username = input("\n" * 100 + "This username is already taken, please pick something else!\nUsername: ")
-
-                # Register -> Password
-                # Password regex pattern
-                password_pattern = re.compile(r"^(?=.*[A-Za-z])(?=.*\d)(?=.*[^A-Za-z0-9]).{6,32}$")
-                password: str = input("\n" * 100 + "Please enter your desired password!\nPassword Rules: 6-32 characters, must include alphabetic characters, numbers, and a special symbol!\nPassword: ")
-                while not password_pattern.match(password):
-                    password: str = input("\n" * 100 + "Your password does not meet the criteria!\nPassword Rules: 6-32 characters, must include alphabetic characters, numbers, and a special symbol!\nPassword: ")
-
-                # Register -> Email
-                email: str = input("\n" * 100 + "Please enter your e-mail address:\nE-mail: ")
-                email_pattern = re.compile(r"^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$")
-                while not email_pattern.match(email):
-                    email = input("\n" * 100 + "Invalid email address!:\nE-mail: ")
-
-                # Register -> D.O.B
-                dob: str = input("\n" * 100 + "Please enter your date-of-birth (YYYY-MM-DD)!\nD.O.B: ")
-                dob_pattern = re.compile(r"^\d{4}-(0[1-9]|1[0-2])-(0[1-9]|[12]\d|3[01])$")
-                while not dob_pattern.match(dob):
-                    dob = input("\n" * 100 + "Invalid date-of-birth, please use YYYY-MM-DD format!\nD.O.B: ")
-                dob_date = datetime.datetime.strptime(dob, "%Y-%m-%d").date()
-
-                # Create user & Move to Player Menu
-                user_id = db.create_user(username, password, email, dob_date)
-                display_menu(MENU_USER)
-            else:
-                input("Invalid input! Press ENTER to continue...")
-                continue
+    def start_menu(self) -> int:
+        selection = self.io.input(CLEAR + "Please select an option from the menu:\n1. Login\n2. Register\nInsert your choice: ")
+        if not selection.isnumeric():
+            self.io.input("Invalid input! Press ENTER to continue...")
+            return MENU_START
+        selection = int(selection)
 
+        # MENU_START -> Login (1)
+        if selection == 1:
+            return MENU_LOGIN
+
+        # MENU_START -> Register (2)
+        elif selection == 2:
+            return MENU_REGISTER
+
+        self.io.input("Invalid input! Press ENTER to continue...")
+        return MENU_START
+
+    def login(self) -> int:
+        username: str = self.io.input(CLEAR + "Please enter your credentials!\nUsername: ")
+        password: str = self.io.input("Password: ")
+        if username == 'admin' and password == 'admin':
+            return MENU_ADMIN
+
+        try:
+            correct_password: bool = self.db.is_password_matching(username, password)
+            # While password is invalid
+            while not correct_password and password != 'EXIT':
+                password = self.io.input(CLEAR + "Invalid password, please try again!\nTo exit please type 'EXIT'.\nPassword: ")
+                correct_password = self.db.is_password_matching(username, password)
+        except PasswordHasherBusy:
+            self.io.input(CLEAR + "The server is busy, please try to log in again in a moment!\nPress ENTER to return...")
+            return MENU_START
+        # If successfully logged in
+        if correct_password:
+            self.user_id = self.db.get_user_id(username)
+            return MENU_USER
+        return MENU_START
+
+    def register(self) -> int:
+        # Register -> Username
+        username: str = self.io.input(CLEAR + "Please enter your desired username!\nUsername: ")
+        while self.db.get_user_id(username) is not None:
+            username = self.io.input(CLEAR + "This username is already taken, please pick something else!\nUsername: ")
+
+        # Register -> Password
+        # Password regex pattern
+        password_pattern = re.compile(r"^(?=.*[A-Za-z])(?=.*\d)(?=.*[^A-Za-z0-9]).{6,32}$")
+        password: str = self.io.input(CLEAR + "Please enter your desired password!\nPassword Rules: 6-32 characters, must include alphabetic characters, numbers, and a special symbol!\nPassword: ")
+        while not password_pattern.match(password):
+            password: str = self.io.input(CLEAR + "Your password does not meet the criteria!\nPassword Rules: 6-32 characters, must include alphabetic characters, numbers, and a special symbol!\nPassword: ")
+
+        # Register -> Email
+        email: str = self.io.input(CLEAR + "Please enter your e-mail address:\nE-mail: ")
+        email_pattern = re.compile(r"^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$")
+        while not email_pattern.match(email):
+            email = self.io.input(CLEAR + "Invalid email address!:\nE-mail: ")
+
+        # Register -> D.O.B
+        dob: str = self.io.input(CLEAR + "Please enter your date-of-birth (YYYY-MM-DD)!\nD.O.B: ")
+        dob_pattern = re.compile(r"^\d{4}-(0[1-9]|1[0-2])-(0[1-9]|[12]\d|3[01])$")
+        while not dob_pattern.match(dob):
+            dob = self.io.input(CLEAR + "Invalid date-of-birth, please use YYYY-MM-DD format!\nD.O.B: ")
+        dob_date = datetime.datetime.strptime(dob, "%Y-%m-%d").date()
+
+        # Create user & Move to Player Menu
+        try:
+            self.user_id = self.db.create_user(username, password, email, dob_date)
+        except PasswordHasherBusy:
+            self.io.input(CLEAR + "The server is busy, please try to register again in a moment!\nPress ENTER to return...")
+            return MENU_START
+        return MENU_USER
 
     # ========================================= [ADMINISTRATIVE MENU] ============================================
 
-    # Administrative Menu
-    if menu_id == MENU_ADMIN:
-        while True:
-            selection = input("\n" * 100 + "Please select an option from the menu:\n1. Create a Question\n2. View Game Statistics\n3. Log out\nInsert your choice: ")
-            if not selection.isnumeric():
-                input("Invalid input! please press ENTER and try again...")
-                continue
-            selection = int(selection)
+    def admin_menu(self) -> int:
+        selection = self.io.input(CLEAR + "Please select an option from the menu:\n1. Create a Question\n2. View Game Statistics\n3. Start a New Season\n4. Log out\nInsert your choice: ")
+        if not selection.isnumeric():
+            self.io.input("Invalid input! please press ENTER and try again...")
+            return MENU_ADMIN
+        selection = int(selection)
 
-            # Admin Menu -> Create Database
-            if selection == 1:
-                question: str = input("\n" * 100 + "Please enter the body of the question!\nQuestion: ")
-                answer_1: str = input("\n" * 100 + "Please enter the first answer!\nAnswer 1: ")
-                answer_2: str = input("\n" * 100 + "Please enter the second answer!\nAnswer 2: ")
-                answer_3: str = input("\n" * 100 + "Please enter the third answer!\nAnswer 3: ")
-                answer_4: str = input("\n" * 100 + "Please enter the fourth answer!\nAnswer 4: ")
-                correct_answer: int = int(input("\n" * 100 + "Please enter the number of the correct answer!\nCorrect Answer: "))
-                confirmation: str = input("\n" * 100 + f"Question: {question}\nAnswer 1: {answer_1}\nAnswer 2: {answer_2}\nAnswer 3: {answer_3}\nAnswer 4: {answer_4}\nCorrect Answer: {correct_answer}\nAre you sure you would like to create this question? Y/N: ")
-                if confirmation.lower() == 'y':
-                    question_id: int | None = db.create_question(question, answer_1, answer_2, answer_3, answer_4, correct_answer)
-                    if question_id is not None:
-                        print(f"Question #{question_id} has been successfully created!")
-                    else:
-                        print(f"Something went wrong, question_id returned None upon creation!")
+        # Admin Menu -> Create Database
+        if selection == 1:
+            question: str = self.io.input(CLEAR + "Please enter the body of the question!\nQuestion: ")
+            similar: list[str] = self.similar_questions(question)
+            if similar:
+                confirmation: str = self.io.input(CLEAR + "This question looks a lot like:\n" + "\n".join(similar) + "\nWould you still like to create it? Y/N: ")
+                if confirmation.lower() != 'y':
+                    self.io.input("Question creation process has been stopped! Press ENTER to return...")
+                    return MENU_ADMIN
+            answer_1: str = self.io.input(CLEAR + "Please enter the first answer!\nAnswer 1: ")
+            answer_2: str = self.io.input(CLEAR + "Please enter the second answer!\nAnswer 2: ")
+            answer_3: str = self.io.input(CLEAR + "Please enter the third answer!\nAnswer 3: ")
+            answer_4: str = self.io.input(CLEAR + "Please enter the fourth answer!\nAnswer 4: ")
+            correct_answer: str = self.io.input(CLEAR + "Please enter the number of the correct answer!\nCorrect Answer: ").strip()
+            while correct_answer not in ('1', '2', '3', '4'):
+                correct_answer = self.io.input(CLEAR + "The correct answer must be 1, 2, 3 or 4!\nCorrect Answer: ").strip()
+            confirmation: str = self.io.input(CLEAR + f"Question: {question}\nAnswer 1: {answer_1}\nAnswer 2: {answer_2}\nAnswer 3: {answer_3}\nAnswer 4: {answer_4}\nCorrect Answer: {correct_answer}\nAre you sure you would like to create this question? Y/N: ")
+            if confirmation.lower() == 'y':
+                question_id: int | None = self.db.create_question(question, answer_1, answer_2, answer_3, answer_4, int(correct_answer))
+                if self.questions is not None:
+                    self.questions.refresh()
+                if question_id is not None:
+                    self.duplicates.add(question_id, question)
+                    self.io.print(f"Question #{question_id} has been successfully created!")
                 else:
-                    input("Question creation process has been stopped! Press ENTER to return...")
-                    continue
+                    self.io.print(f"Something went wrong, question_id returned None upon creation!")
+            else:
+                self.io.input("Question creation process has been stopped! Press ENTER to return...")
+
+        # Admin Menu -> View Game Statistics
+        elif selection == 2:
+            return MENU_STATISTICS
+
+        # Admin Menu -> Start a New Season
+        elif selection == 3:
+            confirmation: str = self.io.input(CLEAR + f"Season {self.db.get_season()} is in progress.\nEvery player will start over, the current season stays in the Hall of Fame history.\nAre you sure you would like to start a new season? Y/N: ")
+            if confirmation.lower() == 'y':
+                self.io.input(f"Season {self.db.start_season()} has started! Press ENTER to return...")
+
+        # Admin Menu -> Log out
+        elif selection == 4:
+            self.user_id = None
+            return MENU_START
+
+        return MENU_ADMIN
+
+    def similar_questions(self, question: str, limit: int = 3) -> list[str]:
+        if not self.duplicates.built:
+            self.io.print("Looking for similar questions...")
+        similar = []
+        for question_id, similarity in self.duplicates.find(question)[:limit]:
+            rows = self.db.get_questions(question_id - 1, 1)
+            if rows and rows[0][0] == question_id:
+                similar.append(f"#{question_id} ({similarity:.0%} alike): {rows[0][1]}")
+        return similar
+
+    def statistics_menu(self) -> int:
+        selection = self.io.input(CLEAR +
+            "Please select which of the following statistics would you like to display:\n" +
+            "1. Count of users who have played\n" +
+            "2. Easiest Question(s)\n" +
+            "3. Hardest Question(s)\n" +
+            "4. Users who have answered the most questions correctly\n" +
+            "5. Users who have answered the least questions\n" +
+            "6. View user answers\n" +
+            "7. Question-specific statistics\n" +
+            f"8. Choose season (showing: {self.season or 'current'})\n" +
+            "9. Return\n" +
+            "Insert your choice: ")
+        if not selection.isnumeric():
+            self.io.input("Invalid input! please press ENTER and try again...")
+            return MENU_STATISTICS
+        selection = int(selection)
 
+        # Count of users who have played
+        if selection == 1:
+            if self.season is None:
+                result = self.db.count_players()
+            else:
+                # Everyone who played a past season is in its activity ranking
+                with self.db.open_report(REPORT_MOST_ACTIVE_USERS, season=self.season) as pager:
+                    result = pager.total
+            self.io.input(CLEAR + f"Users who have played: {result}\nPress ENTER to return...")
+
+        # Easiest Question(s)
+        elif selection == 2:
+            self.show_report(REPORT_EASIEST_QUESTIONS, lambda row: f"{row[0]} ({row[1]} solved correctly)")
+
+        # Hardest Question(s)
+        elif selection == 3:
+            self.show_report(REPORT_HARDEST_QUESTIONS, lambda row: f"{row[0]} ({row[1]} solved correctly)")
+
+        # Users who have answered the most questions correctly
+        elif selection == 4:
+            self.show_report(REPORT_MOST_CORRECT_USERS, lambda row: f"{row[0]} ({row[1]} questions solved correctly)")
+
+        # Users who have answered the most questions (regardless whether they're correct or not)
+        elif selection == 5:
+            self.show_report(REPORT_MOST_ACTIVE_USERS, lambda row: f"{row[0]} ({row[1]} questions solved)")
+
+        # View user answers
+        elif selection == 6:
+            while True:
+                target_id = self.io.input(CLEAR + "Please enter the User ID of the targeted user:\nUser ID: ")
+                if target_id.isnumeric():
+                    target_id = int(target_id)
+                    break
+            self.show_report(REPORT_USER_ANSWERS, lambda row: f"{row[0]} ({row[1]})", (target_id,))
+
+        # Question Statistics (Bonus)
+        elif selection == 7:
+            self.show_report(REPORT_QUESTION_STATISTICS, lambda row: f"{row[0]} [Answers: {row[1]}] [Correct Answers: {row[2]}] [Incorrect Answers: {row[3]}]")
+
+        # Choose season
+        elif selection == 8:
+            current: int = self.db.get_season()
+            season = self.io.input(CLEAR + f"Please enter a season between 1 and {current}, or press ENTER for the current one:\nSeason: ")
+            if season.isnumeric() and 1 <= int(season) <= current:
+                self.season = None if int(season) == current else int(season)
+            elif not season:
+                self.season = None
+
+        # Return
+        elif selection == 9:
+            self.season = None
+            return MENU_ADMIN
+
+        return MENU_STATISTICS
+
+    def show_report(self, report: str, format_row: Callable[[tuple], str], params: tuple = ()):
+        # The rows stay in the storage, only the page on screen is fetched, so any report size is fine
+        with self.db.open_report(report, params, STATISTICS_PAGE_SIZE, self.season) as pager:
+            page: int = 0
+            while True:
+                self.io.print(CLEAR, end='')
+                for row in pager.page(page):
+                    self.io.print(format_row(row))
+                self.io.print(f"\nPage {page + 1}/{pager.pages} ({pager.total} rows)")
+                selection = self.io.input("N. Next page | P. Previous page | J. Jump to page | Press ENTER to return... ").lower()
+                if selection == 'n':
+                    page = min(page + 1, pager.pages - 1)
+                elif selection == 'p':
+                    page = max(page - 1, 0)
+                elif selection == 'j':
+                    number = self.io.input(f"Page (1-{pager.pages}): ")
+                    if number.isnumeric():
+                        page = min(max(int(number), 1), pager.pages) - 1
+                else:
+                    break
 
-            # Admin Menu -> View Game Statistics
-            elif selection == 2:
-                while True:
-                    selection = input("\n" * 100 +
-                        "Please select which of the following statistics would you like to display:\n" +
-                        "1. Count of users who have played\n" +
-                        "2. Easiest Question(s)\n" +
-                        "3. Hardest Question(s)\n" +
-                        "4. Users who have answered the most questions correctly\n" +
-                        "5. Users who have answered the least questions\n" +
-                        "6. View user answers\n" +
-                        "7. Question-specific statistics\n" +
-                        "8. Return\n" +
-                        "Insert your choice: ")
-                    if not selection.isnumeric():
-                        input("Invalid input! please press ENTER and try again...")
-                        continue
-                    selection = int(selection)
-
-                    # Count of users who have played
-                    if selection == 1:
-                        result = db.query("SELECT COUNT(*) FROM users WHERE questions_solved <> 0", 1)
-                        input("\n" * 100 + f"Users who have played: {result[0]}\nPress ENTER to return...")
-
-                    # Easiest Question(s)
-                    elif selection == 2:
-                        result = db.query("""
-                            SELECT q.question, COUNT(*) as solved_correctly
-                            FROM user_answers ua
-                            JOIN questions q ON ua.question_id = q.id
-                            WHERE ua.is_correct = TRUE
-                            GROUP BY q.question
-                            HAVING COUNT(*) = (
-                                SELECT MAX(cnt)
-                                FROM (
-                                    SELECT COUNT(*) cnt
-                                    FROM user_answers
-                                    WHERE is_correct = TRUE
-                                    GROUP BY question_id
-                                )
-                            )
-                        """, 2)
-                        print("\n" * 100)
-                        for row in result:
-                            print(f"{row[0]} ({row[1]} solved correctly)")
-                        input("Press ENTER to return...")
-
-                    # Easiest Question(s)
-                    elif selection == 3:
-                        result = db.query("""
-                            SELECT q.question, COUNT(*) as solved_correctly
-                            FROM user_answers ua
-                            JOIN questions q ON ua.question_id = q.id
-                            WHERE ua.is_correct = TRUE
-                            GROUP BY q.question
-                            HAVING COUNT(*) = (
-                                SELECT MIN(cnt)
-                                FROM (
-                                    SELECT COUNT(*) cnt
-                                    FROM user_answers
-                                    WHERE is_correct = TRUE
-                                    GROUP BY question_id
-                                )
-                            )
-                        """, 2)
-                        print("\n" * 100)
-                        for row in result:
-                            print(f"{row[0]} ({row[1]} solved correctly)")
-                        input("Press ENTER to return...")
-
-                    # Users who have answered the most questions correctly
-                    elif selection == 4:
-                        result = db.query("""
-                            SELECT u.username, COUNT(*) solved_correctly
-                            FROM user_answers ua
-                            JOIN users u ON ua.user_id = u.id
-                            WHERE ua.is_correct = TRUE
-                            GROUP BY u.username
-                            ORDER BY solved_correctly DESC
-                            LIMIT 100 -- For safety
-                        """, 2)
-                        print("\n" * 100)
-                        for row in result:
-                            print(f"{row[0]} ({row[1]} questions solved correctly)")
-                        input("Press ENTER to return...")
-
-                    # Users who have answered the most questions (regardless whether they're correct or not)
-                    elif selection == 5:
-                        result = db.query("""
-                            SELECT u.username, COUNT(*) solved
-                            FROM user_answers ua
-                            JOIN users u ON ua.user_id = u.id
-                            GROUP BY u.username
-                            ORDER BY solved DESC
-                            LIMIT 100 -- For safety
-                        """, 2)
-                        print("\n" * 100)
-                        for row in result:
-                            print(f"{row[0]} ({row[1]} questions solved)")
-                        input("Press ENTER to return...")
-
-                    # View user answers
-                    elif selection == 6:
-                        while True:
-                            target_id = input("\n" * 100 + "Please enter the User ID of the targeted user:\nUser ID: ")
-                            if target_id.isnumeric():
-                                target_id = int(target_id)
-                                break
-                        user_answers = db.get_user_answers(target_id)
-                        for row in user_answers:
-                            print(f"{row[0]} ({row[1]})")
-                        input("Press ENTER to return...")
-
-                    # Question Statistics (Bonus)
-                    elif selection == 7:
-                        result = db.query("""
-                            SELECT 
-                              q.question,
-                              COUNT(ua.*) AS total_answers,
-                              COUNT(CASE WHEN ua.is_correct = TRUE THEN 1 END) AS correct_answers,
-                              COUNT(CASE WHEN ua.is_correct = FALSE THEN 1 END) AS incorrect_answers
-                            FROM questions q
-                            LEFT JOIN user_answers ua ON ua.question_id = q.id
-                            GROUP BY q.id, q.question
-                        """, 2)
-                        print("\n" * 100)
-                        for row in result:
-                            print(f"{row[0]} [Answers: {row[1]}] [Correct Answers: {row[2]}] [Incorrect Answers: {row[3]}]")
-                        input("Press ENTER to return...")
-
-                    # Return
-                    elif selection == 8:
-                        display_menu(MENU_ADMIN)
-                        return
-
-            # Admin Menu -> Log out
-            elif selection == 3:
-                user_id = None
-                display_menu(MENU_START)
-                return
+    # ========================================= [USER MENU] ============================================
 
+    def user_menu(self) -> int:
+        selection = self.io.input(CLEAR + "Please select an option from the menu:\n1. Play\n2. My Statistics\n3. Hall of Fame\n4. Log out\nInsert your choice: ")
+        if not selection.isnumeric():
+            self.io.input("Invalid input! Press ENTER to continue...")
+            return MENU_USER
+        selection = int(selection)
 
+        # Player Menu -> Play
+        if selection == 1:
 
-    # ========================================= [USER MENU] ============================================
+            # If user stopped mid-game last time
+            questions_solved = self.db.get_user_questions_solved(self.user_id)
+            while questions_solved != 0:
+                selection = self.io.input(
+                    CLEAR + f"Would you like to continue the game from where you left?\n1. Continue\n2. Start Over\nInsert your choice: ")
+                if not selection.isnumeric():
+                    self.io.input("Invalid input! Press ENTER to continue...")
+                    continue
+                selection = int(selection)
+                if selection == 1:
+                    break
+                elif selection == 2:
+                    self.db.reset_user_answers(self.user_id)
+                    break
+
+            self.question = None
+            return MENU_QUESTION
+
+        # Player Menu -> My Statistics
+        elif selection == 2:
+            us = self.db.get_user_statistics(self.user_id)
+            self.io.input(CLEAR + f"Unique ID: {us[0]}\nUsername: {us[1]}\nE-mail: {us[3]}\nD.O.B: {us[4]}\nQuestions Solved: {us[5]} ({us[7]}/{us[5]} are correct)\nLast Played: {us[6]}\nPress ENTER to return...")
+
+        # Hall of Fame
+        elif selection == 3:
+            rank: int | None = self.db.get_user_rank(self.user_id)
+            current: int = self.db.get_season()
+            season: int = current
+            page: int = 0
+            while True:
+                result = self.db.get_hall_of_fame(HALL_OF_FAME_PAGE_SIZE, page * HALL_OF_FAME_PAGE_SIZE, season)
+                self.io.print(CLEAR, end='')
+                if not result and page == 0 and season == current == 1:
+                    self.io.input("Looks like no player has played yet...\nPress ENTER to return...")
+                    break
+                self.io.print(f"Season {season}" + (" (current)" if season == current else "") + "\n")
+                for row in result:
+                    self.io.print(f"#{row[0]} {row[1]}: {row[2]} correct answers (Time: {row[3]})")
+                if season == current:
+                    self.io.print(f"\nYour rank: #{rank}" if rank is not None else "\nYou are not ranked yet, answer a question correctly to join the Hall of Fame!")
+                selection = self.io.input("N. Next page | P. Previous page | S. Other season | Press ENTER to return... ").lower()
+                if selection == 'n':
+                    if len(result) == HALL_OF_FAME_PAGE_SIZE:
+                        page += 1
+                elif selection == 'p':
+                    page = max(page - 1, 0)
+                elif selection == 's':
+                    number = self.io.input(f"Season (1-{current}): ")
+                    if number.isnumeric() and 1 <= int(number) <= current:
+                        season, page = int(number), 0
+                else:
+                    break
+
+        # Player Menu -> Log out
+        elif selection == 4:
+            self.user_id = None
+            return MENU_START
+
+        return MENU_USER
+
+    def play(self) -> int:
+        # Entering the game -> Stamp the play timestamp if needed & fetch the first question
+        if self.question is None:
+            _, self.question = self.db.play_step(self.user_id)
+            if self.order is not None:
+                # The storage goes by id, the player's own order takes over (it skips what they answered already)
+                self.sequence = self.order.sequence(self.user_id, self.db.get_user_question_ids(self.user_id))
+                self.question = self.sequence.next_question()
+
+        question_data: tuple[int, str, str, str, str, str, int] | None = self.question
+        if question_data is None:
+            reset = self.io.input(CLEAR + "Congratulations, you've answered all of the questions!\nIf you're interested to start all over again type 'RESET', otherwise press ENTER... ")
+            if reset.lower() == 'reset':
+                self.db.reset_user_answers(self.user_id)
+            return MENU_USER
 
-    # Players (non-admin) menu
-    elif menu_id == MENU_USER:
         while True:
-            selection = input("\n" * 100 + "Please select an option from the menu:\n1. Play\n2. My Statistics\n3. Hall of Fame\n4. Log out\nInsert your choice: ")
+            selection = self.io.input(CLEAR + f"{question_data[1]}\n1. {question_data[2]}\n2. {question_data[3]}\n3. {question_data[4]}\n4. {question_data[5]}\n5. Exit\nInsert your answer: ")
             if not selection.isnumeric():
-                input("Invalid input! Press ENTER to continue...")
+                self.io.input("Invalid input! Press ENTER to continue...")
                 continue
             selection = int(selection)
 
-            # Player Menu -> Play
-            if selection == 1:
-
-                # If user stopped mid-game last time
-                questions_solved = db.get_user_questions_solved(user_id)
-                while questions_solved != 0:
-                    selection = input(
-                        "\n" * 100 + f"Would you like to continue the game from where you left?\n1. Continue\n2. Start Over\nInsert your choice: ")
-                    if not selection.isnumeric():
-                        input("Invalid input! Press ENTER to continue...")
-                        continue
-                    selection = int(selection)
-                    if selection == 1:
-                        break
-                    elif selection == 2:
-                        db.reset_user_answers(user_id)
-                        break
-
-                play()
-
-
-            # Player Menu -> My Statistics
-            elif selection == 2:
-                us = db.get_user_statistics(user_id)
-                input("\n" * 100 + f"Unique ID: {us[0]}\nUsername: {us[1]}\nE-mail: {us[3]}\nD.O.B: {us[4]}\nQuestions Solved: {us[5]} ({us[7]}/{us[5]} are correct)\nLast Played: {us[6]}\nPress ENTER to return...")
-                display_menu(MENU_USER)
-                return
-
-            # Hall of Fame
-            elif selection == 3:
-                result = db.query("""
-                    SELECT u.username, COUNT(*) correct_answers, to_char(MAX(ua.answer_timestamp) - u.play_timestamp, 'HH24:MI:SS.MS') AS playtime
-                    FROM user_answers ua
-                    JOIN users u ON ua.user_id = u.id
-                    WHERE ua.is_correct = TRUE
-                    GROUP BY u.username, u.play_timestamp
-                    ORDER BY correct_answers DESC, playtime ASC
-                """, 2)
-                print("\n" * 100)
-                if result is None:
-                    input("Looks like no player has played yet...\nPress ENTER to return...")
+            # Exit
+            if selection == 5:
+                self.question = self.sequence = None
+                return MENU_USER
+            if selection in (1, 2, 3, 4):
+                if self.sequence is not None:
+                    # Record the answer, the verdict decides the next question (adaptive order)
+                    is_correct = self.db.handle_user_answer(self.user_id, question_data[0], selection)
+                    self.question = self.sequence.next_question(is_correct)
+                elif self.questions is not None:
+                    # Record the answer, the next question comes from memory
+                    is_correct = self.db.handle_user_answer(self.user_id, question_data[0], selection)
+                    self.question = self.questions.next_question(question_data[0])
                 else:
-                    for row in result:
-                        print(f"{row[0]}: {row[1]} correct answers (Time: {row[2]})")
-                    input("Press ENTER to return...")
-
-            # Player Menu -> Log out
-            elif selection == 4:
-                user_id = None
-                display_menu(MENU_START)
-                return
-
-def play():
-    # If player play timestamp is NULL -> Set it to current timestamp
-    play_timestamp: datetime.datetime | None = db.get_user_play_timestamp(user_id)
-    if play_timestamp is None:
-        db.update_user_play_timestamp(user_id)
-
-    question_data: tuple[int, str, str, str, str, str, int] | None = db.get_user_question(user_id)
-    if question_data[0] is None:
-        reset = input("\n" * 100 + "Congratulations, you've answered all of the questions!\nIf you're interested to start all over again type 'RESET', otherwise press ENTER... ")
-        if reset.lower() == 'reset':
-            db.reset_user_answers(user_id)
-        display_menu(MENU_USER)
-        return
-
-    while True:
-        selection = input("\n" * 100 + f"{question_data[1]}\n1. {question_data[2]}\n2. {question_data[3]}\n3. {question_data[4]}\n4. {question_data[5]}\n5. Exit\nInsert your answer: ")
-        if not selection.isnumeric():
-            input("Invalid input! Press ENTER to continue...")
-            continue
-        selection = int(selection)
-
-        # Exit
-        if selection == 5:
-            display_menu(MENU_USER)
-            return
-        if selection in (1, 2, 3, 4):
-            db.handle_user_answer(user_id, question_data[0], selection)
-            input(f"You are {'correct' if selection == question_data[6] else 'wrong'}! The right answer is #{question_data[6]}.")
-            play()
-            return
\ No newline at end of file
+                    # Record the answer & fetch the next question in a single round trip
+                    is_correct, self.question = self.db.play_step(self.user_id, question_data[0], selection)
+                self.io.input(f"You are {'correct' if is_correct else 'wrong'}! The right answer is #{question_data[6]}.")
+                # Next question
+                return MENU_QUESTION
\ No newline at end of file
@@ -0,0 +1,77 @@
+import os
+import threading
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor
+
+import bcrypt
+
+BCRYPT_ROUNDS: int = 12
+BCRYPT_WORKERS: int = os.cpu_count() or 1
+BCRYPT_MAX_PENDING: int = 256
+BCRYPT_TIMEOUT: float = 30.0
+
+
+class PasswordHasherBusy(Exception):
+    pass
+
+
+# Module-level so they can be pickled over to the worker processes.
+# bcrypt only ever looked at the first 72 bytes of a password, newer releases refuse longer ones instead.
+def _hash(password: bytes, rounds: int) -> bytes:
+    return bcrypt.hashpw(password[:72], bcrypt.gensalt(rounds))
+
+
+def _check(password: bytes, hashed: bytes) -> bool:
+    return bcrypt.checkpw(password[:72], hashed)
+
+
+class PasswordHasher:
+    """Runs bcrypt on a pool of worker processes so a burst of logins can't hog the game's own process.
+
+    At most `max_pending` hashes may be queued or running at once. Past that, callers wait up to `timeout` seconds for
+    a slot and then get `PasswordHasherBusy`. With `workers=0` hashing runs inline on the calling thread.
+    """
+
+    def __init__(self, rounds: int = BCRYPT_ROUNDS, workers: int = BCRYPT_WORKERS, max_pending: int = BCRYPT_MAX_PENDING, timeout: float = BCRYPT_TIMEOUT):
+        self.rounds = rounds
+        self.workers = workers
+        self.timeout = timeout
+        self.max_pending = max_pending
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._executor: Executor | None = None
+        self._lock = threading.Lock()
+
+    def hash(self, password: str) -> str:
+        return self._run(_hash, password.encode('utf-8'), self.rounds).decode('utf-8')
+
+    def check(self, password: str, hashed: str) -> bool:
+        return self._run(_check, password.encode('utf-8'), hashed.encode('utf-8'))
+
+    def needs_rehash(self, hashed: str) -> bool:
+        # Hashes look like $2b$<cost>$<salt+digest>, rehash whenever the cost differs from the configured one
+        parts = hashed.split('$')
+        return len(parts) < 4 or not parts[2].isdigit() or int(parts[2]) != self.rounds
+
+    def close(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def _run(self, function, *args):
+        if self.workers <= 0:
+            return function(*args)
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PasswordHasherBusy(f"more than {self.max_pending} password hashes are pending")
+        try:
+            return self._get_executor().submit(function, *args).result()
+        finally:
+            self._slots.release()
+
+    def _get_executor(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                # forkserver: forking the (multi-threaded) game process itself is unsafe
+                method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context(method))
+            return self._executor
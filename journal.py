@@ -0,0 +1,383 @@
+import os
+import zlib
+import sqlite3
+import struct
+import threading
+from datetime import date, datetime, timezone
+from typing import Iterator
+
+import psycopg2
+
+from pool import PoolTimeout
+from question_store import QuestionStore
+from questionpack import QuestionPack
+from storage import REPORT_BATCH_SIZE, REPORT_PAGE_SIZE, Pager, Storage
+
+JOURNAL_PATH: str = 'trivia.journal'
+# One fixed-size record per answer: user_id, question_id, is_correct, answer timestamp (epoch seconds), CRC32 of the rest
+JOURNAL_RECORD = struct.Struct('<ii?dI')
+# Group commit window: answers arriving within it go to the storage in the same transaction
+JOURNAL_FLUSH_INTERVAL: float = 0.05
+JOURNAL_BATCH_SIZE: int = 5_000
+# A fully flushed journal is truncated once it grows past this
+JOURNAL_MAX_BYTES: int = 16 * 2 ** 20
+JOURNAL_RETRY_DELAY: float = 1.0
+# Failures a batch is retried on: the server, the connection or the disk went away, the pool ran dry, the SQLite file was
+# locked. Any other error is the batch's own and retrying it would block the journal for good
+JOURNAL_TRANSIENT_ERRORS: tuple[type[Exception], ...] = (psycopg2.OperationalError, sqlite3.OperationalError, PoolTimeout, OSError)
+# How long a read waits for the flusher before going ahead with what the storage has
+JOURNAL_SYNC_TIMEOUT: float = 30.0
+
+
+class AnswerJournal:
+    """Append-only file of answers that aren't in the storage yet, drained by a background flusher in batches.
+
+    An append is a single `write` (no fsync), so acknowledged answers survive the process crashing. With `fsync` the
+    flusher also syncs the file before every batch, so a machine crash loses at most one flush interval.
+    `<path>.checkpoint` holds the offset up to which the storage has every answer: `open` replays the records after it,
+    and the storage skips the ones it already has (a crash between the commit and the checkpoint).
+
+    A batch is retried while it fails with one of `JOURNAL_TRANSIENT_ERRORS`. On any other error its answers are recorded
+    one at a time, and those that still fail are appended to `<path>.rejected` (in the journal's own format, so it can
+    be replayed as a journal once the cause is fixed) and passed over.
+    """
+
+    def __init__(self, storage: Storage, path: str = JOURNAL_PATH, flush_interval: float = JOURNAL_FLUSH_INTERVAL,
+                 batch_size: int = JOURNAL_BATCH_SIZE, fsync: bool = False, max_bytes: int = JOURNAL_MAX_BYTES):
+        self.storage = storage
+        self.path = path
+        self.checkpoint_path = f'{path}.checkpoint'
+        self.rejected_path = f'{path}.rejected'
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.fsync = fsync
+        self.max_bytes = max_bytes
+        self.condition = threading.Condition()
+        self.fd: int | None = None
+        self.thread: threading.Thread | None = None
+        self.running: bool = False
+        # (user_id, question_id, is_correct, timestamp) in file order, the last `len(pending)` records of the file
+        self.pending: list[tuple[int, int, bool, float]] = []
+        self.offset: int = 0
+        self.waiters: int = 0
+        self.appended: int = 0
+        self.flushed: int = 0
+        self.batches: int = 0
+        self.failures: int = 0
+        self.rejected: int = 0
+
+    def open(self) -> int:
+        """Replay what the last run left unflushed and start the flusher. Returns the number of replayed answers."""
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+        size = os.fstat(self.fd).st_size
+        checkpoint = self._read_checkpoint()
+        # The journal was truncated after its last checkpoint
+        if checkpoint > size:
+            checkpoint = 0
+        self.offset = checkpoint
+        with open(self.path, 'rb') as file:
+            file.seek(checkpoint)
+            while len(data := file.read(JOURNAL_RECORD.size)) == JOURNAL_RECORD.size:
+                *record, crc = JOURNAL_RECORD.unpack(data)
+                if zlib.crc32(data[:-4]) != crc:
+                    break
+                self.pending.append(tuple(record))
+                self.offset += JOURNAL_RECORD.size
+        # Drop a record torn by the crash, new appends must start on a record boundary
+        if self.offset < size:
+            os.ftruncate(self.fd, self.offset)
+        replayed = self.appended = len(self.pending)
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name='journal-flusher', daemon=True)
+        self.thread.start()
+        return replayed
+
+    def close(self):
+        # Drains what is left (unless the storage keeps failing, then the journal keeps it for the next start)
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def append(self, user_id: int, question_id: int, is_correct: bool, timestamp: float):
+        data = self._pack(user_id, question_id, is_correct, timestamp)
+        with self.condition:
+            os.write(self.fd, data)
+            self.offset += len(data)
+            self.pending.append((user_id, question_id, is_correct, timestamp))
+            self.appended += 1
+            if len(self.pending) >= self.batch_size:
+                self.condition.notify_all()
+
+    def sync(self, timeout: float | None = JOURNAL_SYNC_TIMEOUT) -> bool:
+        """Wait until every answer appended so far is in the storage. Returns False on timeout."""
+        with self.condition:
+            target = self.appended
+            self.waiters += 1
+            self.condition.notify_all()
+            try:
+                return self.condition.wait_for(lambda: self.flushed >= target, timeout)
+            finally:
+                self.waiters -= 1
+
+    def stats(self) -> dict[str, int]:
+        with self.condition:
+            return {'pending': len(self.pending), 'appended': self.appended, 'flushed': self.flushed, 'batches': self.batches,
+                    'failures': self.failures, 'rejected': self.rejected, 'bytes': self.offset}
+
+    def _run(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: not self.running or self.waiters or len(self.pending) >= self.batch_size, self.flush_interval)
+                if not self.pending:
+                    if not self.running:
+                        return
+                    continue
+                batch = self.pending[:self.batch_size]
+                del self.pending[:len(batch)]
+                end = self.offset - len(self.pending) * JOURNAL_RECORD.size
+            try:
+                if self.fsync:
+                    os.fsync(self.fd)
+                rejected = self._record(batch)
+            except JOURNAL_TRANSIENT_ERRORS as e:
+                print(f"[JOURNAL-ERROR: FAILED TO FLUSH {len(batch)} ANSWERS, RETRYING IN {JOURNAL_RETRY_DELAY}s]:\n{e}")
+                with self.condition:
+                    self.failures += 1
+                    self.pending[:0] = batch
+                    if not self.running:
+                        return
+                    self.condition.wait(JOURNAL_RETRY_DELAY)
+                continue
+            with self.condition:
+                self.flushed += len(batch)
+                self.rejected += rejected
+                self.batches += 1
+                self._write_checkpoint(end)
+                if not self.pending and self.offset > self.max_bytes:
+                    # Truncate first: a crash in between leaves a checkpoint past the end, which `open` reads as 0
+                    os.ftruncate(self.fd, 0)
+                    self.offset = 0
+                    self._write_checkpoint(0)
+                self.condition.notify_all()
+
+    def _record(self, batch: list[tuple[int, int, bool, float]]) -> int:
+        """Record `batch` in the storage, or the answers of it that can be. Returns how many were rejected."""
+        try:
+            self.storage.record_answers(self._answers(batch))
+            return 0
+        except JOURNAL_TRANSIENT_ERRORS:
+            raise
+        except Exception as e:
+            print(f"[JOURNAL-ERROR: FAILED TO FLUSH {len(batch)} ANSWERS, RECORDING THEM ONE AT A TIME]:\n{e}")
+        # Answers recorded before a transient error are skipped by the storage when the batch is retried
+        rejected: list[tuple[int, int, bool, float]] = []
+        for record in batch:
+            try:
+                self.storage.record_answers(self._answers([record]))
+            except JOURNAL_TRANSIENT_ERRORS:
+                raise
+            except Exception as e:
+                print(f"[JOURNAL-ERROR: REJECTED THE ANSWER OF USER #{record[0]} TO QUESTION #{record[1]}]:\n{e}")
+                rejected.append(record)
+        if rejected:
+            with open(self.rejected_path, 'ab') as file:
+                file.write(b''.join(self._pack(*record) for record in rejected))
+        return len(rejected)
+
+    @staticmethod
+    def _answers(batch: list[tuple[int, int, bool, float]]) -> list[tuple[int, int, bool, datetime]]:
+        return [(user_id, question_id, is_correct, datetime.fromtimestamp(timestamp, timezone.utc))
+                for user_id, question_id, is_correct, timestamp in batch]
+
+    @staticmethod
+    def _pack(user_id: int, question_id: int, is_correct: bool, timestamp: float) -> bytes:
+        data = JOURNAL_RECORD.pack(user_id, question_id, is_correct, timestamp, 0)
+        return data[:-4] + struct.pack('<I', zlib.crc32(data[:-4]))
+
+    def _read_checkpoint(self) -> int:
+        try:
+            with open(self.checkpoint_path) as file:
+                return int(file.read() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def _write_checkpoint(self, offset: int):
+        temporary = f'{self.checkpoint_path}.tmp'
+        with open(temporary, 'w') as file:
+            file.write(str(offset))
+        os.replace(temporary, self.checkpoint_path)
+
+
+class _UserAnswers:
+    """What a `JournaledStorage` knows of one user's answers in the current season."""
+
+    __slots__ = ('lock', 'verdicts')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # question_id -> verdict, None when only the storage knows it. Loaded on the user's first answer
+        self.verdicts: dict[int, bool | None] | None = None
+
+
+class JournaledStorage(Storage):
+    """Write-behind answers on top of `storage`.
+
+    `handle_user_answer` judges the answer against `questions` (the in-process copy of the bank), appends it to an
+    `AnswerJournal` and returns right away, the journal's flusher records the answers in batches with
+    `Storage.record_answers`. Reads of a user's own progress first wait for the journal to drain, so players always
+    see their own answers; the Hall of Fame and statistics may lag by a flush interval. Answers to questions the
+    copy doesn't know about go to the storage synchronously. Only the first answer to a question is recorded, so a
+    repeated one gets the first one's verdict: each user's answers of the season are loaded from the storage on their
+    first answer through this object, and kept up to date by the answers that follow (journaled or not).
+    """
+
+    def __init__(self, storage: Storage, questions: QuestionStore | QuestionPack, journal: AnswerJournal | None = None):
+        self.storage = storage
+        self.questions = questions
+        self.journal = journal or AnswerJournal(storage)
+        self.lock = threading.Lock()
+        self.users: dict[int, _UserAnswers] = {}
+
+    def __getattr__(self, name: str):
+        return getattr(self.storage, name)
+
+    @property
+    def hasher(self):
+        return self.storage.hasher
+
+    @hasher.setter
+    def hasher(self, hasher):
+        self.storage.hasher = hasher
+
+    def connect(self):
+        self.storage.connect()
+        replayed = self.journal.open()
+        if replayed:
+            print(f"[JOURNAL: REPLAYING {replayed} ANSWERS]")
+
+    def disconnect(self):
+        self.journal.close()
+        self.storage.disconnect()
+
+    # ===== [WRITE-BEHIND] =====
+
+    def handle_user_answer(self, user_id: int, question_id: int, answer: int) -> bool:
+        user = self._user(user_id)
+        # Held until the answer is journaled, so a repeat (another session, a client retry) sees it
+        with user.lock:
+            if user.verdicts is None:
+                self.journal.sync()
+                user.verdicts = dict.fromkeys(self.storage.get_user_question_ids(user_id))
+            if question_id in user.verdicts:
+                is_correct = user.verdicts[question_id]
+                return is_correct if is_correct is not None else self.storage.handle_user_answer(user_id, question_id, answer)
+            question = self.questions.get(question_id)
+            if question is None:
+                self.journal.sync()
+                is_correct = self.storage.handle_user_answer(user_id, question_id, answer)
+            else:
+                is_correct = answer == question[6]
+                self.journal.append(user_id, question_id, is_correct, datetime.now(timezone.utc).timestamp())
+            user.verdicts[question_id] = is_correct
+            return is_correct
+
+    def play_step(self, user_id: int, question_id: int | None = None, answer: int | None = None) -> tuple[bool | None, tuple | None]:
+        if question_id is None:
+            # Entering the game reads the user's cursor
+            self.journal.sync()
+            return self.storage.play_step(user_id)
+        return self.handle_user_answer(user_id, question_id, answer), self.questions.next_question(question_id)
+
+    def record_answers(self, answers: list[tuple[int, int, bool, datetime]]) -> int:
+        return self.storage.record_answers(answers)
+
+    # ===== [READ-YOUR-WRITES] =====
+
+    def get_user_questions_solved(self, user_id: int) -> int:
+        self.journal.sync()
+        return self.storage.get_user_questions_solved(user_id)
+
+    def get_user_statistics(self, user_id: int) -> tuple | None:
+        self.journal.sync()
+        return self.storage.get_user_statistics(user_id)
+
+    def get_user_answers(self, user_id: int) -> list[tuple]:
+        self.journal.sync()
+        return self.storage.get_user_answers(user_id)
+
+    def get_user_question_ids(self, user_id: int) -> list[int]:
+        self.journal.sync()
+        return self.storage.get_user_question_ids(user_id)
+
+    def get_user_question(self, user_id: int) -> tuple | None:
+        self.journal.sync()
+        return self.storage.get_user_question(user_id)
+
+    def get_user_rank(self, user_id: int) -> int | None:
+        self.journal.sync()
+        return self.storage.get_user_rank(user_id)
+
+    def reset_user_answers(self, user_id: int):
+        # Synced first, otherwise a later flush would bring the answers back, and under the user's lock so no answer is
+        # journaled between the sync and the reset
+        user = self._user(user_id)
+        with user.lock:
+            self.journal.sync()
+            self.storage.reset_user_answers(user_id)
+            user.verdicts = None
+
+    def start_season(self) -> int:
+        # Answers given before the rollover belong to the season that is ending
+        self.journal.sync()
+        season = self.storage.start_season()
+        with self.lock:
+            self.users.clear()
+        return season
+
+    def _user(self, user_id: int) -> _UserAnswers:
+        with self.lock:
+            user = self.users.get(user_id)
+            if user is None:
+                user = self.users[user_id] = _UserAnswers()
+            return user
+
+    # ===== [PASS-THROUGH] =====
+
+    def is_password_matching(self, username: str, password: str) -> bool:
+        return self.storage.is_password_matching(username, password)
+
+    def get_user_id(self, username: str) -> int | None:
+        return self.storage.get_user_id(username)
+
+    def create_user(self, username: str, password: str, email: str, dob: date) -> int | None:
+        return self.storage.create_user(username, password, email, dob)
+
+    def create_question(self, question: str, answer_1: str, answer_2: str, answer_3: str, answer_4: str, correct_answer: int) -> int | None:
+        return self.storage.create_question(question, answer_1, answer_2, answer_3, answer_4, correct_answer)
+
+    def get_questions(self, after_id: int = 0, limit: int = 10_000) -> list[tuple]:
+        return self.storage.get_questions(after_id, limit)
+
+    def get_question_bank_version(self) -> tuple[int, int, int]:
+        return self.storage.get_question_bank_version()
+
+    def get_season(self) -> int:
+        return self.storage.get_season()
+
+    def get_hall_of_fame(self, limit: int = 10, offset: int = 0, season: int | None = None) -> list[tuple]:
+        return self.storage.get_hall_of_fame(limit, offset, season)
+
+    def count_players(self) -> int:
+        return self.storage.count_players()
+
+    def open_report(self, report: str, params: tuple = (), page_size: int = REPORT_PAGE_SIZE, season: int | None = None) -> Pager:
+        return self.storage.open_report(report, params, page_size, season)
+
+    def stream_report(self, report: str, params: tuple = (), batch_size: int = REPORT_BATCH_SIZE, season: int | None = None) -> Iterator[tuple]:
+        return self.storage.stream_report(report, params, batch_size, season)
\ No newline at end of file
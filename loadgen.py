@@ -0,0 +1,120 @@
+import re
+import time
+import uuid
+import asyncio
+import argparse
+
+from server import SERVER_PORT
+
+PROMPT_CHOICE = re.compile(rb"Insert your choice: $")
+PROMPT_ANSWER = re.compile(rb"Insert your answer: $")
+PROMPT_VERDICT = re.compile(rb"The right answer is #\d\.$")
+PROMPT_FINISHED = re.compile(rb"otherwise press ENTER\.\.\. $")
+
+
+class Player:
+    """A scripted client: registers a fresh account, answers `questions` questions and logs out."""
+
+    def __init__(self, host: str, port: int, username: str, questions: int):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.questions = questions
+        self.buffer = b''
+        self.answer_latencies: list[float] = []
+
+    async def expect(self, *patterns: re.Pattern) -> int:
+        # Read until the screen ends with one of the prompts, return which one
+        while True:
+            for index, pattern in enumerate(patterns):
+                if pattern.search(self.buffer):
+                    self.buffer = b''
+                    return index
+            chunk = await self.reader.read(65536)
+            if not chunk:
+                raise ConnectionError(f"server closed the connection, last output: {self.buffer[-200:]!r}")
+            self.buffer += chunk
+
+    async def send(self, line: str):
+        self.writer.write(line.encode('utf-8') + b'\r\n')
+        await self.writer.drain()
+
+    async def run(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            # Register
+            await self.expect(PROMPT_CHOICE)
+            await self.send('2')
+            for prompt, value in ((rb"Username: $", self.username), (rb"Password: $", 'Load-test1'), (rb"E-mail: $", f'{self.username}@example.com'), (rb"D.O.B: $", '2000-01-01')):
+                await self.expect(re.compile(prompt))
+                await self.send(value)
+
+            # Play
+            await self.expect(PROMPT_CHOICE)
+            await self.send('1')
+            for _ in range(self.questions):
+                if await self.expect(PROMPT_ANSWER, PROMPT_FINISHED) == 1:
+                    await self.send('')
+                    break
+                start = time.perf_counter()
+                await self.send('1')
+                await self.expect(PROMPT_VERDICT)
+                self.answer_latencies.append(time.perf_counter() - start)
+                await self.send('')
+            else:
+                await self.expect(PROMPT_ANSWER, PROMPT_FINISHED)
+                await self.send('5')
+
+            # Log out
+            await self.expect(PROMPT_CHOICE)
+            await self.send('4')
+            await self.expect(PROMPT_CHOICE)
+        finally:
+            self.writer.close()
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def generate_load(host: str, port: int, sessions: int, concurrency: int, questions: int):
+    run_id = uuid.uuid4().hex[:8]
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    failures: list[BaseException] = []
+
+    async def session(number: int):
+        async with semaphore:
+            player = Player(host, port, f'load_{run_id}_{number}', questions)
+            try:
+                await player.run()
+            except (ConnectionError, OSError) as e:
+                failures.append(e)
+            latencies.extend(player.answer_latencies)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(session(number) for number in range(sessions)))
+    elapsed = time.perf_counter() - start
+
+    print(f"sessions: {sessions - len(failures)}/{sessions} completed in {elapsed:.2f}s ({(sessions - len(failures)) / elapsed:.1f} sessions/s)")
+    print(f"answers: {len(latencies)} | latency p50 {percentile(latencies, 0.50) * 1000:.1f}ms, p99 {percentile(latencies, 0.99) * 1000:.1f}ms")
+    for e in failures[:5]:
+        print(f"  {type(e).__name__}: {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load generator for the trivia game server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=SERVER_PORT)
+    parser.add_argument('--sessions', type=int, default=200, help="total number of player sessions to run")
+    parser.add_argument('--concurrency', type=int, default=50, help="number of sessions connected at the same time")
+    parser.add_argument('--questions', type=int, default=10, help="questions answered per session")
+    args = parser.parse_args()
+    asyncio.run(generate_load(args.host, args.port, args.sessions, args.concurrency, args.questions))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,292 @@
+import uuid
+import argparse
+import threading
+from typing import Callable
+
+import bulk
+import cache
+import hashing
+import journal
+import metrics
+import database
+import dedupe
+import driver
 import functions
+import server
+import storage
+import ordering
+import profiling
+import render
+import question_store
+import questionpack
+import replicas
+
+STORAGE_ENGINES: tuple[str, ...] = ('postgres', 'sqlite', 'memory')
+# Admin commands outside the `Storage` interface: COPY and the summary table checks and rebuilds of `Database`
+POSTGRES_COMMANDS: tuple[str, ...] = ('import_questions', 'export_questions', 'check_leaderboard', 'rebuild_leaderboard', 'rebuild_question_stats')
+# One-off admin commands, which run on the bare storage and exit instead of starting the game
+ADMIN_COMMANDS: tuple[str, ...] = (*POSTGRES_COMMANDS, 'start_season', 'build_pack', 'find_duplicates', 'export_report')
+
+
+def open_storage(engine: str, hasher: hashing.PasswordHasher, pool_size: int = database.DB_POOL_SIZE, sqlite_path: str = storage.SQLITE_PATH,
+                 game_metrics: metrics.Metrics | None = None, prepare_statements: bool = True, dsn: str | None = database.DB_DSN,
+                 replica_dsns: tuple[str, ...] = database.DB_REPLICAS, max_staleness: float = replicas.REPLICA_MAX_STALENESS) -> storage.Storage:
+    if engine == 'sqlite':
+        return storage.SQLiteStorage(sqlite_path, hasher)
+    if engine == 'memory':
+        return storage.MemoryStorage(hasher)
+    db = database.Database(pool_size, hasher=hasher, metrics=game_metrics, prepare_statements=prepare_statements, dsn=dsn, replicas=replica_dsns,
+                           max_staleness=max_staleness)
+    if game_metrics and replica_dsns:
+        game_metrics.register('replicas', db.replica_stats)
+    return db
+
+
+def add_cache(game_storage: storage.Storage, args, game_metrics: metrics.Metrics | None) -> storage.Storage:
+    if args.cache_ttl <= 0:
+        return game_storage
+    # Reads from replicas can be up to --max-staleness behind the writes that invalidated them
+    cached = cache.CachedStorage(game_storage, cache.QueryCache(args.cache_size, args.cache_ttl, args.max_staleness if args.replica else 0.0))
+    if game_metrics:
+        game_metrics.register('cache', cached.cache.stats)
+    return cached
+
+
+def add_journal(game_storage: storage.Storage, args, questions, game_metrics: metrics.Metrics | None) -> storage.Storage:
+    # Write-behind answers are judged against the in-process bank
+    if not args.journal:
+        return game_storage
+    if questions is None:
+        raise SystemExit("--journal needs the in-process question store or a --question-pack")
+    journaled = journal.JournaledStorage(game_storage, questions, journal.AnswerJournal(game_storage, args.journal, args.journal_interval, fsync=args.journal_fsync))
+    if game_metrics:
+        game_metrics.register('journal', journaled.journal.stats)
+    return journaled
+
+
+def open_questions(args, game_storage: storage.Storage) -> question_store.QuestionStore | questionpack.QuestionPack | None:
+    # Where sessions take their questions from: a pack file, an in-process copy of the bank or (None) the storage itself
+    if args.question_pack:
+        return questionpack.QuestionPack(args.question_pack)
+    if args.no_question_store:
+        return None
+    return question_store.QuestionStore(game_storage)
+
+
+def open_game_storage(args, hasher: hashing.PasswordHasher, game_metrics: metrics.Metrics | None) -> tuple[storage.Storage, question_store.QuestionStore | questionpack.QuestionPack | None]:
+    # The storage stack sessions play on (not connected yet) and the questions they are served from
+    game_storage = open_storage(args.storage, hasher, args.pool_size, args.sqlite_path, game_metrics, not args.no_prepared_statements,
+                                args.dsn, tuple(args.replica), args.max_staleness)
+    questions = open_questions(args, game_storage)
+    return add_cache(add_journal(game_storage, args, questions, game_metrics), args, game_metrics), questions
+
+
+def open_order(args, questions) -> ordering.QuestionOrder | None:
+    # Built once the questions are loaded, by `initialize_game`/`server.serve`
+    if args.question_order == 'id':
+        return None
+    if questions is None:
+        raise SystemExit("--question-order needs the in-process question store or a --question-pack")
+    return ordering.QuestionOrder(questions, args.question_order == 'adaptive', args.order_seed, args.order_bands)
+
+
+def start_metrics(args) -> tuple[metrics.Metrics | None, Callable[[], None]]:
+    # Returns the metrics to hand to the Database (None when no export was asked for) and a function stopping the exports
+    if not (args.metrics_file or args.metrics_json or args.metrics_port):
+        return None, lambda: None
+    game_metrics = metrics.Metrics()
+    exporter = None
+    if args.metrics_file or args.metrics_json:
+        exporter = metrics.MetricsExporter(game_metrics, args.metrics_file, args.metrics_json, args.metrics_interval)
+        exporter.start()
+    http_server = metrics.serve_metrics(game_metrics, args.host, args.metrics_port) if args.metrics_port else None
+
+    def stop():
+        if exporter:
+            exporter.stop()
+        if http_server:
+            http_server.shutdown()
+    return game_metrics, stop
+
+
+def drive(args, hasher: hashing.PasswordHasher, profiler: profiling.Profiler) -> list[BaseException]:
+    # Random headless sessions through the same storage stack as the game, returns the sessions that failed
+    game_metrics, stop_metrics = start_metrics(args)
+    game_storage, questions = open_game_storage(args, hasher, game_metrics)
+    game_storage.connect()
+    try:
+        if questions is not None:
+            questions.refresh()
+        order = open_order(args, questions)
+        if order is not None:
+            order.build(game_storage)
+        bots = driver.random_bots(args.drive, args.drive_seed, f'driver_{uuid.uuid4().hex[:8]}', args.drive_questions)
+        sessions, prompts, elapsed, errors = driver.drive(game_storage, bots, questions, order, profiler.timers, profiler, args.drive_concurrency)
+    finally:
+        game_storage.disconnect()
+        stop_metrics()
+    print(f"Drove {sessions} sessions ({prompts} prompts) in {elapsed:.2f}s: {sessions / elapsed:.1f} sessions/s, {prompts / elapsed:.0f} prompts/s")
+    return errors
+
 
 def main():
-    functions.initialize_game()
+    parser = argparse.ArgumentParser(description="Trivia Game")
+    parser.add_argument('--serve', action='store_true', help="host the game for many players over TCP instead of playing on this terminal")
+    parser.add_argument('--host', default=server.SERVER_HOST, help="address to listen on in server mode")
+    parser.add_argument('--port', type=int, default=server.SERVER_PORT, help="port to listen on in server mode")
+    parser.add_argument('--max-sessions', type=int, default=server.SERVER_MAX_SESSIONS, help="maximum number of concurrent players in server mode")
+    parser.add_argument('--idle-timeout', type=float, default=server.SESSION_IDLE_TIMEOUT, help="seconds a player can leave a prompt unanswered before the server hangs up")
+    parser.add_argument('--render', choices=render.RENDER_MODES, default='auto', help="how screens are cleared: ANSI escape codes, the terminal's alternate screen, or a blank line for non-TTY clients (auto: ansi on a terminal and over TCP, plain when piped)")
+    parser.add_argument('--storage', choices=STORAGE_ENGINES, default='postgres', help="where the game keeps its data (sqlite and memory need no server)")
+    parser.add_argument('--sqlite-path', default=storage.SQLITE_PATH, help="database file of the sqlite storage")
+    parser.add_argument('--pool-size', type=int, default=database.DB_POOL_SIZE, help="number of database connections shared by all players in server mode")
+    parser.add_argument('--dsn', default=database.DB_DSN, help="libpq connection string of the primary database server (default: the built-in local settings)")
+    parser.add_argument('--replica', action='append', default=list(database.DB_REPLICAS), metavar='DSN', help="connection string of a streaming replica the statistics, Hall of Fame and report reads can go to (repeatable)")
+    parser.add_argument('--max-staleness', type=float, default=replicas.REPLICA_MAX_STALENESS, help="seconds a read sent to a --replica may lag behind the primary, and a player's reads stay on the primary after they write")
+    parser.add_argument('--no-prepared-statements', action='store_true', help="send the hot queries as plain SQL instead of PREPAREd statements (for poolers like PgBouncer in transaction mode)")
+    parser.add_argument('--bcrypt-rounds', type=int, default=hashing.BCRYPT_ROUNDS, help="bcrypt work factor, stored hashes with another cost are upgraded on login")
+    parser.add_argument('--bcrypt-workers', type=int, default=hashing.BCRYPT_WORKERS, help="processes verifying passwords (0 to hash inline)")
+    parser.add_argument('--cache-ttl', type=float, default=cache.CACHE_TTL, help="seconds the Hall of Fame and statistics views may be served from cache (0 disables the cache)")
+    parser.add_argument('--cache-size', type=int, default=cache.CACHE_MAX_ENTRIES, help="maximum number of cached query results")
+    parser.add_argument('--journal', metavar='PATH', help="acknowledge answers once written to this local journal and record them in the storage in batches")
+    parser.add_argument('--journal-interval', type=float, default=journal.JOURNAL_FLUSH_INTERVAL, help="seconds the --journal flusher gathers answers into one transaction")
+    parser.add_argument('--journal-fsync', action='store_true', help="fsync the --journal before every batch, so a machine crash loses at most one interval")
+    parser.add_argument('--no-question-store', action='store_true', help="fetch every question from the database instead of an in-process copy of the bank")
+    parser.add_argument('--question-pack', metavar='PATH', help="serve questions from a pack file made with --build-pack (its question ids must match the storage's)")
+    parser.add_argument('--question-order', choices=ordering.ORDER_MODES, default='id', help="order players get the questions in: by id, shuffled per player, or shuffled within difficulty bands that follow their answers")
+    parser.add_argument('--order-seed', type=int, help="seed of the per-player orders (random for every run by default)")
+    parser.add_argument('--order-bands', type=int, default=ordering.ORDER_BANDS, help="number of difficulty bands of --question-order adaptive")
+    parser.add_argument('--build-pack', metavar='PATH', help="write the question bank to a memory-mappable pack file and exit")
+    parser.add_argument('--pack-from-csv', metavar='PATH', help="build the --build-pack file from a CSV file instead of the storage")
+    parser.add_argument('--metrics-file', metavar='PATH', help="periodically write per-method and per-statement query metrics to PATH in the Prometheus text format")
+    parser.add_argument('--metrics-json', metavar='PATH', help="periodically write the query metrics (with p50/p95/p99) to PATH as JSON")
+    parser.add_argument('--metrics-interval', type=float, default=metrics.METRICS_INTERVAL, help="seconds between two writes of --metrics-file/--metrics-json")
+    parser.add_argument('--metrics-port', type=int, help="serve the query metrics over HTTP at /metrics on this port")
+    parser.add_argument('--drive', type=int, metavar='SESSIONS', help="play that many random headless player and admin sessions against --storage and exit (they register accounts and create questions, use a scratch database)")
+    parser.add_argument('--drive-seed', type=int, default=1, help="seed of the --drive sessions, the same seed plays the same sessions")
+    parser.add_argument('--drive-questions', type=int, default=driver.DRIVER_QUESTIONS, help="questions a --drive player answers each time they play")
+    parser.add_argument('--drive-concurrency', type=int, default=1, help="--drive sessions running at the same time")
+    parser.add_argument('--profile', metavar='PATH', help="profile the sessions with cProfile, write the report to PATH (and the raw stats to PATH.pstats) on exit")
+    parser.add_argument('--trace-memory', metavar='PATH', help="trace allocations with tracemalloc, write the top allocation sites to PATH on exit")
+    parser.add_argument('--menu-timers', metavar='PATH', help="time every menu action (less the time spent waiting for input), write the percentiles to PATH as JSON on exit")
+    parser.add_argument('--check-leaderboard', action='store_true', help="compare the Hall of Fame summary against the raw answers and exit")
+    parser.add_argument('--rebuild-leaderboard', action='store_true', help="recompute the Hall of Fame summary from the raw answers and exit")
+    parser.add_argument('--rebuild-question-stats', action='store_true', help="recompute the per-question answer counters from the raw answers and exit")
+    parser.add_argument('--import-questions', metavar='PATH', help="bulk load questions from a CSV or JSONL file and exit")
+    parser.add_argument('--export-questions', metavar='PATH', help="write all questions to a CSV or JSONL file and exit")
+    parser.add_argument('--export-report', choices=list(storage.REPORT_COLUMNS), help="stream one of the admin statistics reports to a CSV file and exit")
+    parser.add_argument('--report-path', metavar='PATH', help="where --export-report writes (default: <report>.csv)")
+    parser.add_argument('--report-user', type=int, metavar='ID', help="user whose answers --export-report user_answers exports")
+    parser.add_argument('--season', type=int, metavar='NUMBER', help="season --export-report reads (default: the current one)")
+    parser.add_argument('--start-season', action='store_true', help="end the current season (its answers stay readable with --season) and start everyone over, then exit")
+    parser.add_argument('--allow-duplicates', action='store_true', help="let --import-questions load questions that are near-duplicates of the bank or of each other")
+    parser.add_argument('--find-duplicates', metavar='PATH', help="write the groups of near-duplicate questions of the whole bank to a CSV file and exit")
+    parser.add_argument('--duplicate-threshold', type=float, default=dedupe.DEDUPE_THRESHOLD, help="share of 3-grams two questions need in common to count as near-duplicates")
+    parser.add_argument('--reject-file', metavar='PATH', help="where --import-questions writes the rows it rejected")
+    parser.add_argument('--batch-size', type=int, default=bulk.BULK_BATCH_SIZE, help="rows per COPY batch for --import-questions/--export-questions")
+    args = parser.parse_args()
+    if args.storage != 'postgres':
+        for command in POSTGRES_COMMANDS:
+            if getattr(args, command):
+                parser.error(f"--{command.replace('_', '-')} needs --storage postgres")
+    hasher = hashing.PasswordHasher(args.bcrypt_rounds, args.bcrypt_workers)
+    profiler = profiling.Profiler(args.profile, args.trace_memory, args.menu_timers)
+
+    if args.drive:
+        profiler.start()
+        try:
+            errors = drive(args, hasher, profiler)
+        finally:
+            profiler.stop()
+        for error in errors[:10]:
+            print(f"{type(error).__name__}: {error}")
+        print(f"Sessions failed: {len(errors)}")
+        if errors:
+            raise SystemExit(1)
+        return
+
+    if args.serve:
+        game_metrics, stop_metrics = start_metrics(args)
+        profiler.start()
+        try:
+            game_storage, questions = open_game_storage(args, hasher, game_metrics)
+            # Process-wide, so set here rather than by the server: the session threads (and whatever else starts from
+            # now on) don't need the default stack
+            threading.stack_size(server.SESSION_STACK_SIZE)
+            server.serve(game_storage, args.host, args.port, args.max_sessions, questions, open_order(args, questions), args.render, profiler,
+                         dedupe.SharedDuplicateIndex(game_storage, args.duplicate_threshold), args.idle_timeout)
+        finally:
+            stop_metrics()
+            profiler.stop()
+        return
+
+    if not any(getattr(args, command) for command in ADMIN_COMMANDS):
+        # The game on this terminal
+        game_metrics, stop_metrics = start_metrics(args)
+        functions.db, questions = open_game_storage(args, hasher, game_metrics)
+        profiler.start()
+        try:
+            functions.initialize_game(questions, open_order(args, questions), args.render, profiler,
+                                      dedupe.SharedDuplicateIndex(functions.db, args.duplicate_threshold))
+        finally:
+            # Drains the answer journal too
+            functions.db.disconnect()
+            stop_metrics()
+            profiler.stop()
+        return
+
+    functions.db = open_storage(args.storage, hasher, args.pool_size, args.sqlite_path, None, not args.no_prepared_statements, args.dsn,
+                                tuple(args.replica), args.max_staleness)
+    if args.check_leaderboard or args.rebuild_leaderboard:
+        functions.db.connect()
+        if args.rebuild_leaderboard:
+            functions.db.rebuild_leaderboard()
+        mismatches = functions.db.check_leaderboard()
+        for season, user_id, expected, actual in mismatches:
+            print(f"Season {season}, user #{user_id}: expected {expected}, found {actual}")
+        print(f"Leaderboard entries out of sync: {len(mismatches)}")
+        functions.db.disconnect()
+    elif args.start_season:
+        functions.db.connect()
+        print(f"Season {functions.db.start_season()} has started!")
+        functions.db.disconnect()
+    elif args.rebuild_question_stats:
+        functions.db.connect()
+        functions.db.rebuild_question_stats()
+        print("Question statistics have been rebuilt!")
+        functions.db.disconnect()
+    elif args.build_pack:
+        if args.pack_from_csv:
+            count = questionpack.build_pack(questionpack.rows_from_csv(args.pack_from_csv), args.build_pack)
+        else:
+            functions.db.connect()
+            count = questionpack.build_pack(storage.rows_from_storage(functions.db), args.build_pack)
+            functions.db.disconnect()
+        print(f"Packed {count} questions into {args.build_pack}.")
+    elif args.find_duplicates:
+        functions.db.connect()
+        clusters, questions = dedupe.export_clusters(functions.db, args.find_duplicates, args.duplicate_threshold)
+        print(f"Found {clusters} groups of near-duplicates ({questions} questions) in {args.find_duplicates}.")
+        functions.db.disconnect()
+    elif args.import_questions:
+        functions.db.connect()
+        duplicates = None if args.allow_duplicates else dedupe.index_storage(functions.db, args.duplicate_threshold)
+        imported, rejected = bulk.import_questions(functions.db, args.import_questions, batch_size=args.batch_size, reject_path=args.reject_file, duplicates=duplicates)
+        print(f"Imported {imported} questions, rejected {rejected}.")
+        functions.db.disconnect()
+    elif args.export_report:
+        if args.export_report == storage.REPORT_USER_ANSWERS and args.report_user is None:
+            parser.error("--export-report user_answers needs --report-user")
+        params = (args.report_user,) if args.export_report == storage.REPORT_USER_ANSWERS else ()
+        functions.db.connect()
+        exported = bulk.export_report(functions.db, args.export_report, args.report_path or f'{args.export_report}.csv', params, season=args.season)
+        print(f"Exported {exported} rows.")
+        functions.db.disconnect()
+    elif args.export_questions:
+        functions.db.connect()
+        exported = bulk.export_questions(functions.db, args.export_questions, batch_size=args.batch_size)
+        print(f"Exported {exported} questions.")
+        functions.db.disconnect()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,261 @@
+import os
+import json
+import time
+import bisect
+import threading
+from typing import Callable
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import psycopg2.extensions
+
+# Latency bucket upper bounds in seconds, from 10µs to ~30s in steps of sqrt(2)
+METRICS_BUCKETS: tuple[float, ...] = tuple(0.00001 * 2 ** (n / 2) for n in range(44))
+METRICS_QUANTILES: tuple[float, ...] = (0.5, 0.95, 0.99)
+METRICS_INTERVAL: float = 15.0
+# Statements built with f-strings would otherwise grow one series per distinct text
+METRICS_MAX_STATEMENTS: int = 500
+METRICS_STATEMENT_LENGTH: int = 120
+METRICS_OTHER_STATEMENT: str = '<other>'
+
+
+class Histogram:
+    """Fixed log-spaced buckets: O(log buckets) per observation, quantiles are interpolated within a bucket."""
+
+    __slots__ = ('counts', 'count', 'total')
+
+    def __init__(self):
+        self.counts: list[int] = [0] * (len(METRICS_BUCKETS) + 1)
+        self.count: int = 0
+        self.total: float = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(METRICS_BUCKETS, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = METRICS_BUCKETS[index - 1] if index else 0.0
+                upper = METRICS_BUCKETS[index] if index < len(METRICS_BUCKETS) else lower
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return METRICS_BUCKETS[-1]
+
+
+class Series:
+    """Counters of a single method or statement."""
+
+    __slots__ = ('calls', 'errors', 'rows', 'latency', 'commit')
+
+    def __init__(self):
+        self.calls: int = 0
+        self.errors: int = 0
+        self.rows: int = 0
+        self.latency = Histogram()
+        self.commit = Histogram()
+
+    def snapshot(self) -> dict:
+        result = {
+            'calls': self.calls,
+            'errors': self.errors,
+            'rows': self.rows,
+            'seconds': self.latency.total,
+            **{f'p{round(q * 100)}': self.latency.quantile(q) for q in METRICS_QUANTILES},
+        }
+        if self.commit.count:
+            result['commit_seconds'] = self.commit.total
+            result['commit_p99'] = self.commit.quantile(0.99)
+        return result
+
+
+class Metrics:
+    """Latency, error and row counters per `Database` method and per SQL statement.
+
+    `Database.cursor` records the methods (including their commit), `InstrumentedCursor` the statements run on them.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.methods: dict[str, Series] = {}
+        self.statements: dict[str, Series] = {}
+        # Raw query text -> its label, so every statement is normalized only once
+        self._labels: dict[str, str] = {}
+        # Other components' counters (e.g. the query cache's hits and misses), read at export time
+        self.sources: dict[str, Callable[[], dict[str, int]]] = {}
+
+    def register(self, name: str, source: Callable[[], dict[str, int]]):
+        self.sources[name] = source
+
+    def observe_method(self, method: str, seconds: float, rows: int, error: bool, commit_seconds: float | None = None):
+        with self.lock:
+            series = self.methods.get(method)
+            if series is None:
+                series = self.methods[method] = Series()
+            series.calls += 1
+            series.errors += error
+            series.rows += rows
+            series.latency.observe(seconds)
+            if commit_seconds is not None:
+                series.commit.observe(commit_seconds)
+
+    def observe_statement(self, query, seconds: float, rows: int, error: bool):
+        with self.lock:
+            label = self._labels.get(query)
+            if label is None:
+                label = self._label(query)
+            series = self.statements.get(label)
+            if series is None:
+                series = self.statements[label] = Series()
+            series.calls += 1
+            series.errors += error
+            series.rows += rows
+            series.latency.observe(seconds)
+
+    def _label(self, query) -> str:
+        # Expects `self.lock` to be held
+        if len(self._labels) >= METRICS_MAX_STATEMENTS:
+            return METRICS_OTHER_STATEMENT
+        text = query.decode('utf-8', errors='replace') if isinstance(query, bytes) else str(query)
+        label = ' '.join(text.split())[:METRICS_STATEMENT_LENGTH]
+        if isinstance(query, (str, bytes)):
+            self._labels[query] = label
+        return label
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                'timestamp': time.time(),
+                'uptime': time.time() - self.started,
+                'methods': {name: series.snapshot() for name, series in sorted(self.methods.items())},
+                'statements': {label: series.snapshot() for label, series in sorted(self.statements.items())},
+                **{name: source() for name, source in self.sources.items()},
+            }
+
+    def to_prometheus(self) -> str:
+        """The counters in the Prometheus text exposition format."""
+        lines: list[str] = []
+        with self.lock:
+            for kind, label, table in (('method', 'method', self.methods), ('statement', 'statement', self.statements)):
+                prefix = f'trivia_db_{kind}'
+                lines.append(f'# TYPE {prefix}_calls_total counter')
+                lines.extend(f'{prefix}_calls_total{{{label}="{_escape(name)}"}} {series.calls}' for name, series in sorted(table.items()))
+                lines.append(f'# TYPE {prefix}_errors_total counter')
+                lines.extend(f'{prefix}_errors_total{{{label}="{_escape(name)}"}} {series.errors}' for name, series in sorted(table.items()))
+                lines.append(f'# TYPE {prefix}_rows_total counter')
+                lines.extend(f'{prefix}_rows_total{{{label}="{_escape(name)}"}} {series.rows}' for name, series in sorted(table.items()))
+                histograms = [('seconds', lambda series: series.latency)]
+                if kind == 'method':
+                    histograms.append(('commit_seconds', lambda series: series.commit))
+                for metric, histogram_of in histograms:
+                    lines.append(f'# TYPE {prefix}_{metric} histogram')
+                    for name, series in sorted(table.items()):
+                        _histogram_lines(lines, f'{prefix}_{metric}', f'{label}="{_escape(name)}"', histogram_of(series))
+                lines.append(f'# TYPE {prefix}_seconds_quantile gauge')
+                for name, series in sorted(table.items()):
+                    lines.extend(f'{prefix}_seconds_quantile{{{label}="{_escape(name)}",quantile="{q}"}} {series.latency.quantile(q):.6f}' for q in METRICS_QUANTILES)
+        for name, source in self.sources.items():
+            for key, value in source().items():
+                lines.append(f'# TYPE trivia_{name}_{key} untyped')
+                lines.append(f'trivia_{name}_{key} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, prometheus_path: str | None = None, json_path: str | None = None):
+        # Written next to the target and renamed, so readers never see a half-written file
+        for path, render in ((prometheus_path, self.to_prometheus), (json_path, lambda: json.dumps(self.snapshot(), indent=2))):
+            if path:
+                temporary = f'{path}.tmp'
+                with open(temporary, 'w', encoding='utf-8') as file:
+                    file.write(render())
+                os.replace(temporary, path)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _histogram_lines(lines: list[str], name: str, labels: str, histogram: Histogram):
+    cumulative = 0
+    for bound, count in zip(METRICS_BUCKETS, histogram.counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{{{labels},le="{bound:.6g}"}} {cumulative}')
+    lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+    lines.append(f'{name}_sum{{{labels}}} {histogram.total:.6f}')
+    lines.append(f'{name}_count{{{labels}}} {histogram.count}')
+
+
+class InstrumentedCursor(psycopg2.extensions.cursor):
+    """Times every `execute` into `metrics` and keeps the total of returned rows in `rows`."""
+
+    metrics: Metrics | None = None
+    rows: int = 0
+
+    def execute(self, query, vars=None):
+        start = time.perf_counter()
+        error = True
+        try:
+            result = super().execute(query, vars)
+            error = False
+            return result
+        finally:
+            rows = self.rowcount if not error and self.description is not None else 0
+            self.rows += max(rows, 0)
+            if self.metrics is not None:
+                self.metrics.observe_statement(query, time.perf_counter() - start, max(rows, 0), error)
+
+
+class MetricsExporter:
+    """Rewrites the Prometheus text file and/or the JSON snapshot every `interval` seconds on a daemon thread."""
+
+    def __init__(self, metrics: Metrics, prometheus_path: str | None = None, json_path: str | None = None, interval: float = METRICS_INTERVAL):
+        self.metrics = metrics
+        self.prometheus_path = prometheus_path
+        self.json_path = json_path
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='metrics-exporter', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+        # Final snapshot with everything up to the shutdown
+        self.metrics.write(self.prometheus_path, self.json_path)
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.metrics.write(self.prometheus_path, self.json_path)
+            except OSError as e:
+                print(f"[METRICS-ERROR: FAILED TO WRITE METRICS]:\n{e}")
+
+
+def serve_metrics(metrics: Metrics, host: str, port: int) -> ThreadingHTTPServer:
+    """Serve `GET /metrics` (Prometheus text format) on a daemon thread, returns the server to shut it down."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = metrics.to_prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    print(f"[METRICS: LISTENING ON {host}:{port}]")
+    return server
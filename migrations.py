@@ -0,0 +1,254 @@
+# Per-season, per-user Hall of Fame entries recomputed from the raw answers, used to check and rebuild the `leaderboard` table
+LEADERBOARD_SOURCE: str = """
+    SELECT ua.season, ua.user_id, COUNT(*) AS correct_answers, p.play_timestamp, MAX(ua.answer_timestamp) AS last_answer_timestamp
+    FROM user_answers ua
+    JOIN players p ON p.season = ua.season AND p.user_id = ua.user_id
+    WHERE ua.is_correct = TRUE
+    GROUP BY ua.season, ua.user_id, p.play_timestamp
+"""
+
+# Per-season, per-question answer counters recomputed from the raw answers, used to rebuild the `question_stats` table
+QUESTION_STATS_SOURCE: str = """
+    SELECT season, question_id, COUNT(*) FILTER (WHERE is_correct) AS correct_answers, COUNT(*) FILTER (WHERE NOT is_correct) AS incorrect_answers
+    FROM user_answers
+    GROUP BY season, question_id
+"""
+
+# Serializes concurrent startups (several servers pointed at one database) while they migrate
+MIGRATION_LOCK_ID: int = 0x7472697669610000
+
+# Every schema change is a numbered step, applied once and recorded in `schema_version`.
+# Steps use IF NOT EXISTS so that databases created before the migration runner are adopted in place.
+MIGRATIONS: list[tuple[int, str, list[str]]] = [
+    (1, "Base tables", [
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id SERIAL PRIMARY KEY,
+            username TEXT NOT NULL,
+            password TEXT NOT NULL,
+            email TEXT NOT NULL,
+            dob DATE NOT NULL,
+            questions_solved INT NOT NULL DEFAULT 0,
+            play_timestamp TIMESTAMPTZ
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS questions (
+            id SERIAL PRIMARY KEY,
+            question TEXT NOT NULL,
+            answer_1 TEXT NOT NULL,
+            answer_2 TEXT NOT NULL,
+            answer_3 TEXT NOT NULL,
+            answer_4 TEXT NOT NULL,
+            correct_answer SMALLINT NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS user_answers (
+            user_id INT NOT NULL,
+            question_id INT NOT NULL,
+            is_correct BOOLEAN NOT NULL,
+            answer_timestamp TIMESTAMPTZ,
+            PRIMARY KEY (user_id, question_id),
+            FOREIGN KEY (user_id) REFERENCES users (id),
+            FOREIGN KEY (question_id) REFERENCES questions (id)
+        )
+        """,
+    ]),
+    (2, "Per-user cursor of the last served question", [
+        "ALTER TABLE users ADD COLUMN IF NOT EXISTS last_question_id INT NOT NULL DEFAULT 0",
+        """
+        UPDATE users u SET last_question_id = ua.question_id
+        FROM (SELECT user_id, MAX(question_id) AS question_id FROM user_answers GROUP BY user_id) ua
+        WHERE u.id = ua.user_id AND u.last_question_id = 0
+        """,
+    ]),
+    (3, "Hall of Fame leaderboard", [
+        """
+        CREATE TABLE IF NOT EXISTS leaderboard (
+            user_id INT PRIMARY KEY,
+            correct_answers INT NOT NULL DEFAULT 0,
+            play_timestamp TIMESTAMPTZ,
+            last_answer_timestamp TIMESTAMPTZ,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+        """,
+        # Hall of Fame order: most correct answers first, then fastest
+        "CREATE INDEX IF NOT EXISTS leaderboard_rank ON leaderboard ((-correct_answers), (last_answer_timestamp - play_timestamp), user_id)",
+        """
+        INSERT INTO leaderboard (user_id, correct_answers, play_timestamp, last_answer_timestamp)
+        SELECT ua.user_id, COUNT(*), u.play_timestamp, MAX(ua.answer_timestamp)
+        FROM user_answers ua
+        JOIN users u ON ua.user_id = u.id
+        WHERE ua.is_correct = TRUE
+        GROUP BY ua.user_id, u.play_timestamp
+        ON CONFLICT (user_id) DO NOTHING
+        """,
+    ]),
+    (4, "Per-question answer counters", [
+        """
+        CREATE TABLE IF NOT EXISTS question_stats (
+            question_id INT PRIMARY KEY,
+            correct_answers INT NOT NULL DEFAULT 0,
+            incorrect_answers INT NOT NULL DEFAULT 0,
+            FOREIGN KEY (question_id) REFERENCES questions (id) ON DELETE CASCADE
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS question_stats_correct ON question_stats (correct_answers)",
+        """
+        INSERT INTO question_stats (question_id, correct_answers, incorrect_answers)
+        SELECT question_id, COUNT(*) FILTER (WHERE is_correct), COUNT(*) FILTER (WHERE NOT is_correct)
+        FROM user_answers
+        GROUP BY question_id
+        ON CONFLICT (question_id) DO NOTHING
+        """,
+    ]),
+    (5, "Indexes for logins and statistics", [
+        # Fails if duplicate usernames already exist, they have to be resolved by hand first
+        """
+        DO $$
+        BEGIN
+            IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conrelid = 'users'::regclass AND conname = 'users_username_key') THEN
+                ALTER TABLE users ADD CONSTRAINT users_username_key UNIQUE (username);
+            END IF;
+        END $$
+        """,
+        "CREATE INDEX IF NOT EXISTS user_answers_question_id ON user_answers (question_id)",
+        "CREATE INDEX IF NOT EXISTS user_answers_correct ON user_answers (user_id, question_id) WHERE is_correct",
+    ]),
+    (6, "Question bank change counters", [
+        # Single row bumped by statement triggers: `version` on any change, `generation` when existing rows change or go
+        # away (so in-process copies know an incremental reload isn't enough), `questions` is the row count
+        """
+        CREATE TABLE IF NOT EXISTS question_bank (
+            id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+            version BIGINT NOT NULL,
+            generation BIGINT NOT NULL,
+            questions BIGINT NOT NULL
+        )
+        """,
+        "INSERT INTO question_bank (version, generation, questions) SELECT 1, 1, COUNT(*) FROM questions ON CONFLICT (id) DO NOTHING",
+        """
+        CREATE OR REPLACE FUNCTION question_bank_inserted () RETURNS TRIGGER AS $$
+            BEGIN
+                UPDATE question_bank SET version = version + 1, questions = questions + (SELECT COUNT(*) FROM inserted);
+                RETURN NULL;
+            END;
+        $$ LANGUAGE plpgsql
+        """,
+        """
+        CREATE OR REPLACE FUNCTION question_bank_deleted () RETURNS TRIGGER AS $$
+            BEGIN
+                UPDATE question_bank SET version = version + 1, generation = generation + 1, questions = questions - (SELECT COUNT(*) FROM deleted);
+                RETURN NULL;
+            END;
+        $$ LANGUAGE plpgsql
+        """,
+        """
+        CREATE OR REPLACE FUNCTION question_bank_changed () RETURNS TRIGGER AS $$
+            BEGIN
+                UPDATE question_bank SET version = version + 1, generation = generation + 1,
+                    questions = CASE WHEN TG_OP = 'TRUNCATE' THEN 0 ELSE questions END;
+                RETURN NULL;
+            END;
+        $$ LANGUAGE plpgsql
+        """,
+        "CREATE TRIGGER question_bank_inserted AFTER INSERT ON questions REFERENCING NEW TABLE AS inserted FOR EACH STATEMENT EXECUTE FUNCTION question_bank_inserted ()",
+        "CREATE TRIGGER question_bank_deleted AFTER DELETE ON questions REFERENCING OLD TABLE AS deleted FOR EACH STATEMENT EXECUTE FUNCTION question_bank_deleted ()",
+        "CREATE TRIGGER question_bank_updated AFTER UPDATE ON questions FOR EACH STATEMENT EXECUTE FUNCTION question_bank_changed ()",
+        "CREATE TRIGGER question_bank_truncated AFTER TRUNCATE ON questions FOR EACH STATEMENT EXECUTE FUNCTION question_bank_changed ()",
+    ]),
+    (7, "Seasons", [
+        # The latest season is the one being played. `current_season()` is the default of every season column
+        """
+        CREATE TABLE IF NOT EXISTS seasons (
+            id INT PRIMARY KEY,
+            started_timestamp TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        "INSERT INTO seasons (id) VALUES (1) ON CONFLICT (id) DO NOTHING",
+        "CREATE OR REPLACE FUNCTION current_season () RETURNS INT AS $$ SELECT MAX(id) FROM seasons $$ LANGUAGE sql STABLE",
+        # A user's progress moves out of `users` into one row per season they play, a new season simply has none yet
+        """
+        CREATE TABLE IF NOT EXISTS players (
+            season INT NOT NULL DEFAULT current_season() REFERENCES seasons (id),
+            user_id INT NOT NULL REFERENCES users (id),
+            questions_solved INT NOT NULL DEFAULT 0,
+            last_question_id INT NOT NULL DEFAULT 0,
+            play_timestamp TIMESTAMPTZ,
+            PRIMARY KEY (season, user_id)
+        )
+        """,
+        """
+        INSERT INTO players (season, user_id, questions_solved, last_question_id, play_timestamp)
+        SELECT 1, id, questions_solved, last_question_id, play_timestamp FROM users
+        WHERE questions_solved <> 0 OR last_question_id <> 0 OR play_timestamp IS NOT NULL
+        ON CONFLICT (season, user_id) DO NOTHING
+        """,
+        "ALTER TABLE users DROP COLUMN questions_solved, DROP COLUMN last_question_id, DROP COLUMN play_timestamp",
+        # Answers are list-partitioned by season: the existing table becomes season 1's partition as it is (no rows are
+        # copied) and starting a season attaches an empty one, so nothing is ever mass-deleted
+        "ALTER TABLE user_answers RENAME TO user_answers_1",
+        "ALTER TABLE user_answers_1 DROP CONSTRAINT user_answers_pkey",
+        "ALTER INDEX user_answers_question_id RENAME TO user_answers_1_question_id",
+        "ALTER INDEX user_answers_correct RENAME TO user_answers_1_correct",
+        "ALTER TABLE user_answers_1 ADD COLUMN season INT NOT NULL DEFAULT 1",
+        """
+        CREATE TABLE user_answers (
+            season INT NOT NULL DEFAULT current_season(),
+            user_id INT NOT NULL REFERENCES users (id),
+            question_id INT NOT NULL REFERENCES questions (id),
+            is_correct BOOLEAN NOT NULL,
+            answer_timestamp TIMESTAMPTZ,
+            PRIMARY KEY (season, user_id, question_id)
+        ) PARTITION BY LIST (season)
+        """,
+        # The partition's own indexes match these and are adopted, only its primary key is built
+        "CREATE INDEX user_answers_question_id ON user_answers (question_id)",
+        "CREATE INDEX user_answers_correct ON user_answers (user_id, question_id) WHERE is_correct",
+        "ALTER TABLE user_answers ATTACH PARTITION user_answers_1 FOR VALUES IN (1)",
+        # The Hall of Fame and the question counters are kept per season
+        "ALTER TABLE leaderboard ADD COLUMN season INT NOT NULL DEFAULT 1 REFERENCES seasons (id)",
+        "ALTER TABLE leaderboard ALTER COLUMN season SET DEFAULT current_season()",
+        "ALTER TABLE leaderboard DROP CONSTRAINT leaderboard_pkey, ADD PRIMARY KEY (season, user_id)",
+        "DROP INDEX leaderboard_rank",
+        "CREATE INDEX leaderboard_rank ON leaderboard (season, (-correct_answers), (last_answer_timestamp - play_timestamp), user_id)",
+        "ALTER TABLE question_stats ADD COLUMN season INT NOT NULL DEFAULT 1 REFERENCES seasons (id)",
+        "ALTER TABLE question_stats ALTER COLUMN season SET DEFAULT current_season()",
+        "ALTER TABLE question_stats DROP CONSTRAINT question_stats_pkey, ADD PRIMARY KEY (season, question_id)",
+        "DROP INDEX question_stats_correct",
+        "CREATE INDEX question_stats_correct ON question_stats (season, correct_answers)",
+        # Autovacuum never analyzes a partitioned table itself, without statistics the planner misjudges the new indexes
+        "ANALYZE user_answers",
+    ]),
+]
+
+def migrate(db) -> list[int]:
+    """Apply the pending MIGRATIONS in order, each in its own transaction. Returns the versions that were applied."""
+    with db.cursor('migrate', "FAILED TO PREPARE SCHEMA MIGRATIONS") as cursor:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INT PRIMARY KEY,
+                description TEXT NOT NULL,
+                applied_timestamp TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version;")
+        current: int = cursor.fetchone()[0]
+
+    applied: list[int] = []
+    for version, description, statements in MIGRATIONS:
+        if version <= current:
+            continue
+        with db.cursor('migrate', f"FAILED TO APPLY SCHEMA MIGRATION #{version} ({description})") as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(%s);", (MIGRATION_LOCK_ID,))
+            # Another process may have applied it while we were waiting for the lock
+            cursor.execute("SELECT 1 FROM schema_version WHERE version = %s;", (version,))
+            if cursor.fetchone() is not None:
+                continue
+            for statement in statements:
+                cursor.execute(statement)
+            cursor.execute("INSERT INTO schema_version (version, description) VALUES (%s, %s);", (version, description))
+        print(f"[PG-MIGRATION: APPLIED #{version} ({description})]")
+        applied.append(version)
+    return applied
\ No newline at end of file
@@ -0,0 +1,149 @@
+import bisect
+import random
+from array import array
+from typing import Sequence
+
+from question_store import QuestionStore
+from questionpack import QuestionPack
+from storage import REPORT_QUESTION_DIFFICULTY, Storage
+
+ORDER_MODES: tuple[str, ...] = ('id', 'random', 'adaptive')
+FEISTEL_ROUNDS: int = 4
+# Adaptive mode: band 0 holds the questions answered right most often, the last band the least often
+ORDER_BANDS: int = 5
+# Questions answered fewer times than this are put in the middle band
+ORDER_MIN_ANSWERS: int = 5
+ORDER_BATCH_SIZE: int = 10_000
+
+_MASK_64: int = (1 << 64) - 1
+
+
+def _mix(value: int) -> int:
+    # splitmix64 finalizer: every input bit flips about half of the output bits
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & _MASK_64
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & _MASK_64
+    return value ^ (value >> 31)
+
+
+class FeistelPermutation:
+    """Keyed bijection of `range(size)`, evaluated one position at a time without building a table.
+
+    An unbalanced Feistel network permutes the fewest bits that cover `size` (the two halves differ by a bit when that
+    number is odd, and swap widths every round). Values that land outside of `size` are fed through again (cycle
+    walking). That domain is less than twice `size`, so a lookup takes under two passes on average whatever the size.
+    """
+
+    __slots__ = ('size', 'widths', 'keys')
+
+    def __init__(self, size: int, key: int, rounds: int = FEISTEL_ROUNDS):
+        self.size = size
+        bits = max((size - 1).bit_length(), 2)
+        # (left, right) widths before each round
+        self.widths = tuple((bits - bits // 2, bits // 2) if n % 2 == 0 else (bits // 2, bits - bits // 2) for n in range(rounds + 1))
+        self.keys = tuple(_mix(key + n) for n in range(rounds))
+
+    def __getitem__(self, position: int) -> int:
+        if not 0 <= position < self.size:
+            raise IndexError(position)
+        widths, value = self.widths, position
+        while True:
+            right_width = widths[0][1]
+            left, right = value >> right_width, value & ((1 << right_width) - 1)
+            for (left_width, right_width), key in zip(widths, self.keys):
+                # Round function: the top `left_width` bits of a 64-bit multiply of the keyed right half
+                left, right = right, left ^ (((right ^ key) * 0x9E3779B97F4A7C15 & _MASK_64) >> (64 - left_width))
+            value = (left << widths[-1][1]) | right
+            if value < self.size:
+                return value
+
+    def __len__(self) -> int:
+        return self.size
+
+
+class QuestionOrder:
+    """Per-user question orders over a snapshot of the question bank, instead of everyone playing in id order.
+
+    `build` snapshots the ids of `questions` (a `QuestionStore` or `QuestionPack`, refreshed already). Each user plays
+    the snapshot in the order of a `FeistelPermutation` keyed by the run's `seed` and their id, so the next question is
+    O(1) to find and nothing is sorted or stored per user. In adaptive mode the snapshot is split into difficulty bands
+    (by the share of right answers in the question_difficulty report) with a permutation each, and a player moves up a
+    band after a right answer and down after a wrong one. Questions added after the snapshot come last, in id order.
+    """
+
+    def __init__(self, questions: QuestionStore | QuestionPack, adaptive: bool = False, seed: int | None = None,
+                 bands: int = ORDER_BANDS, min_answers: int = ORDER_MIN_ANSWERS):
+        self.questions = questions
+        self.adaptive = adaptive
+        self.seed = random.getrandbits(64) if seed is None else seed
+        self.band_count = bands if adaptive else 1
+        self.min_answers = min_answers
+        self.ids = array('i')
+        # Snapshot indexes of each band, a plain range when there is a single band
+        self.bands: list[Sequence[int]] = [range(0)]
+
+    def build(self, storage: Storage | None = None):
+        """Take the snapshot, and in adaptive mode rank it by difficulty from the answers kept in `storage`."""
+        ids = array('i', self.questions.ids)
+        self.bands = self._difficulty_bands(ids, storage) if self.adaptive else [range(len(ids))]
+        self.ids = ids
+
+    def sequence(self, user_id: int, answered: list[int]) -> 'QuestionSequence':
+        """Where `user_id` goes next, skipping the `answered` question ids (`Storage.get_user_question_ids`)."""
+        return QuestionSequence(self, _mix(self.seed ^ _mix(user_id)), answered)
+
+    def _difficulty_bands(self, ids: array, storage: Storage) -> list[Sequence[int]]:
+        middle = self.band_count // 2
+        assigned = array('b', [middle]) * len(ids)
+        # Both come in id order, so each lookup starts where the previous one ended
+        index: int = 0
+        for question_id, answers, correct_answers in storage.stream_report(REPORT_QUESTION_DIFFICULTY, batch_size=ORDER_BATCH_SIZE):
+            index = bisect.bisect_left(ids, question_id, index)
+            if index < len(ids) and ids[index] == question_id and answers >= self.min_answers:
+                assigned[index] = min(int((1 - correct_answers / answers) * self.band_count), self.band_count - 1)
+        bands = [array('i') for _ in range(self.band_count)]
+        for index, band in enumerate(assigned):
+            bands[band].append(index)
+        return bands
+
+
+class QuestionSequence:
+    """One player's way through a `QuestionOrder`. Every question is served at most once, and not at all if the player
+    had answered it already. Sessions keep one while the player is in the game."""
+
+    __slots__ = ('order', 'answered', 'permutations', 'positions', 'band', 'last_id')
+
+    def __init__(self, order: QuestionOrder, key: int, answered: list[int]):
+        self.order = order
+        self.answered = set(answered)
+        self.permutations = [FeistelPermutation(len(band), key ^ _mix(number + 1)) for number, band in enumerate(order.bands)]
+        self.positions = [0] * len(order.bands)
+        self.band: int = len(order.bands) // 2
+        # Past the snapshot, questions are taken in id order from here
+        self.last_id: int = order.ids[-1] if order.ids else 0
+
+    def next_question(self, is_correct: bool | None = None) -> tuple | None:
+        """The next question, `is_correct` being the verdict of the previous one. None once every question was served."""
+        if is_correct is not None:
+            self.band = min(max(self.band + (1 if is_correct else -1), 0), len(self.positions) - 1)
+        # The closest band that still has questions, easier ones first on a tie
+        for band in sorted(range(len(self.positions)), key=lambda band: abs(band - self.band)):
+            question = self._take(band)
+            if question is not None:
+                return question
+        while (question := self.order.questions.next_question(self.last_id)) is not None:
+            self.last_id = question[0]
+            if question[0] not in self.answered:
+                return question
+        return None
+
+    def _take(self, band: int) -> tuple | None:
+        indexes, permutation, ids = self.order.bands[band], self.permutations[band], self.order.ids
+        while self.positions[band] < len(indexes):
+            question_id = ids[indexes[permutation[self.positions[band]]]]
+            self.positions[band] += 1
+            if question_id not in self.answered:
+                # None when the question was deleted since the snapshot
+                question = self.order.questions.get(question_id)
+                if question is not None:
+                    return question
+        return None
\ No newline at end of file
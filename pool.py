@@ -0,0 +1,104 @@
+import time
+import threading
+from typing import Callable
+
+import psycopg2
+import psycopg2.extensions
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """Bounded pool of psycopg2 connections.
+
+    Connections are opened lazily up to `size`. `checkout` blocks until one is free (or `timeout` passes),
+    and connections that sat idle longer than `health_check_interval` are pinged before being handed out,
+    so a restarted server is noticed (and the connection reopened) before a query fails on it.
+    """
+
+    def __init__(self, connect: Callable[[], psycopg2.extensions.connection], size: int, timeout: float = 30.0, health_check_interval: float = 30.0):
+        self._connect = connect
+        self.size = size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self._idle: list[tuple[psycopg2.extensions.connection, float]] = []
+        self._opened: int = 0
+        self._closed: bool = False
+        self._condition = threading.Condition()
+
+    def checkout(self) -> psycopg2.extensions.connection:
+        deadline = time.monotonic() + self.timeout
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise psycopg2.InterfaceError("connection pool is closed")
+                # Most recently used connection first, it's the least likely to have gone stale
+                if self._idle:
+                    connection, last_used = self._idle.pop()
+                    break
+                # Reserve a slot and open a new connection outside of the lock
+                if self._opened < self.size:
+                    self._opened += 1
+                    connection, last_used = None, None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeout(f"no database connection became available within {self.timeout} seconds")
+                self._condition.wait(remaining)
+
+        if connection is not None:
+            if not connection.closed and (time.monotonic() - last_used < self.health_check_interval or self._is_healthy(connection)):
+                return connection
+            self._close(connection)
+
+        try:
+            return self._connect()
+        except BaseException:
+            self._release_slot()
+            raise
+
+    def checkin(self, connection: psycopg2.extensions.connection, broken: bool = False):
+        if broken or connection.closed:
+            self._close(connection)
+            self._release_slot()
+            return
+        with self._condition:
+            if self._closed:
+                self._close(connection)
+                self._opened -= 1
+                return
+            self._idle.append((connection, time.monotonic()))
+            self._condition.notify()
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            for connection, _ in self._idle:
+                self._close(connection)
+            self._opened -= len(self._idle)
+            self._idle.clear()
+            self._condition.notify_all()
+
+    def _release_slot(self):
+        with self._condition:
+            self._opened -= 1
+            self._condition.notify()
+
+    @staticmethod
+    def _is_healthy(connection: psycopg2.extensions.connection) -> bool:
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            connection.rollback()
+            return True
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            return False
+
+    @staticmethod
+    def _close(connection: psycopg2.extensions.connection):
+        try:
+            connection.close()
+        except psycopg2.Error:
+            pass
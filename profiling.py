@@ -0,0 +1,131 @@
+import io
+import json
+import time
+import pstats
+import cProfile
+import threading
+import tracemalloc
+from array import array
+from typing import Callable
+
+PROFILE_TOP: int = 40
+MEMORY_TOP: int = 30
+MEMORY_FRAMES: int = 5
+
+
+class TimedIO:
+    """Passes a session's I/O through, adding up the time spent waiting in `input` (on the player, not the game)."""
+
+    def __init__(self, io):
+        self.io = io
+        self.waiting: float = 0.0
+
+    def input(self, prompt: str = '') -> str:
+        start = time.perf_counter()
+        try:
+            return self.io.input(prompt)
+        finally:
+            self.waiting += time.perf_counter() - start
+
+    def print(self, *values, sep: str = ' ', end: str = '\n'):
+        self.io.print(*values, sep=sep, end=end)
+
+    def close(self):
+        self.io.close()
+
+    def __getattr__(self, name: str):
+        return getattr(self.io, name)
+
+
+class MenuTimers:
+    """Wall-clock time of every menu action (one run of a menu handler), less the time it waited for input, shared
+    by all the sessions of a process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples: dict[str, array] = {}
+
+    def record(self, name: str, seconds: float):
+        with self.lock:
+            self.samples.setdefault(name, array('d')).append(seconds)
+
+    def run(self, name: str, io: TimedIO, handler: Callable[[], int]) -> int:
+        start, waiting = time.perf_counter(), io.waiting
+        try:
+            return handler()
+        finally:
+            self.record(name, time.perf_counter() - start - (io.waiting - waiting))
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        """Per action: count, total and mean/p50/p95/p99/max in milliseconds."""
+        with self.lock:
+            samples = {name: sorted(values) for name, values in self.samples.items()}
+        summary = {}
+        for name, values in sorted(samples.items()):
+            summary[name] = {
+                'count': len(values),
+                'total_ms': sum(values) * 1000,
+                'mean_ms': sum(values) * 1000 / len(values),
+                **{f'p{percent}_ms': values[min(len(values) - 1, len(values) * percent // 100)] * 1000 for percent in (50, 95, 99)},
+                'max_ms': values[-1] * 1000,
+            }
+        return summary
+
+
+class Profiler:
+    """The opt-in profiling switches of a run, each writing its report to its path when the run stops.
+
+    `profile_path` gets the cProfile report of the calls made through `run` (every session thread is profiled on its
+    own and the stats are merged), with the raw stats next to it in `<path>.pstats`. `memory_path` gets the top
+    allocation sites traced by tracemalloc. `timers_path` gets the `MenuTimers` summary as JSON.
+    """
+
+    def __init__(self, profile_path: str | None = None, memory_path: str | None = None, timers_path: str | None = None):
+        self.profile_path = profile_path
+        self.memory_path = memory_path
+        self.timers_path = timers_path
+        self.timers: MenuTimers | None = MenuTimers() if timers_path else None
+        self.stats: pstats.Stats | None = None
+        self.lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.profile_path or self.memory_path or self.timers_path)
+
+    def start(self):
+        if self.memory_path:
+            tracemalloc.start(MEMORY_FRAMES)
+
+    def run(self, function: Callable, *args):
+        if not self.profile_path:
+            return function(*args)
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(function, *args)
+        finally:
+            with self.lock:
+                if self.stats is None:
+                    self.stats = pstats.Stats(profile)
+                else:
+                    self.stats.add(profile)
+
+    def stop(self):
+        if self.profile_path and self.stats is not None:
+            self.stats.dump_stats(f'{self.profile_path}.pstats')
+            report = io.StringIO()
+            self.stats.stream = report
+            self.stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(PROFILE_TOP)
+            with open(self.profile_path, 'w', encoding='utf-8') as file:
+                file.write(report.getvalue())
+        if self.memory_path and tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            with open(self.memory_path, 'w', encoding='utf-8') as file:
+                file.write(f"Traced memory: {current / 1024:.1f} KiB now, {peak / 1024:.1f} KiB at peak\n\n")
+                for statistic in snapshot.statistics('traceback')[:MEMORY_TOP]:
+                    file.write(f"{statistic.size / 1024:.1f} KiB in {statistic.count} blocks\n")
+                    file.write('\n'.join(f"  {line}" for line in statistic.traceback.format()) + '\n')
+        if self.timers_path and self.timers is not None:
+            with open(self.timers_path, 'w', encoding='utf-8') as file:
+                json.dump(self.timers.summary(), file, indent=2)
\ No newline at end of file
@@ -0,0 +1,117 @@
+import sys
+import time
+import bisect
+import threading
+from array import array
+
+from storage import Storage
+
+QUESTION_STORE_BATCH: int = 10_000
+# How often (at most) a lookup checks the bank's version in the database
+QUESTION_STORE_CHECK_INTERVAL: float = 5.0
+
+
+class _Bank:
+    """Columnar copy of the question bank: one array/list per column, sorted by id. Only ever appended to."""
+
+    __slots__ = ('ids', 'questions', 'answers', 'correct_answers')
+
+    def __init__(self):
+        self.ids = array('i')
+        self.questions: list[str] = []
+        self.answers: tuple[list[str], ...] = ([], [], [], [])
+        self.correct_answers = array('B')
+
+    def append(self, rows: list[tuple]):
+        for question_id, question, answer_1, answer_2, answer_3, answer_4, correct_answer in rows:
+            self.questions.append(question)
+            # Answers repeat a lot ("True", "False", "1990"...), interning keeps a single copy of each
+            for column, answer in zip(self.answers, (answer_1, answer_2, answer_3, answer_4)):
+                column.append(sys.intern(answer))
+            self.correct_answers.append(correct_answer)
+            # Id last: readers bisect `ids`, so every other column is already in place once an id shows up
+            self.ids.append(question_id)
+
+    def row(self, index: int) -> tuple:
+        return (self.ids[index], self.questions[index], *(column[index] for column in self.answers), self.correct_answers[index])
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+class QuestionStore:
+    """In-process copy of the question bank, so sessions can serve the next question without a database round trip.
+
+    Loaded once by `refresh`, then kept current by checking `Storage.get_question_bank_version` at most every
+    `check_interval` seconds: new questions are fetched incrementally, changed or deleted ones trigger a full reload
+    into a fresh bank that replaces the old one atomically. Lookups never block on a reload.
+    """
+
+    def __init__(self, storage: Storage, check_interval: float = QUESTION_STORE_CHECK_INTERVAL, batch_size: int = QUESTION_STORE_BATCH):
+        self.storage = storage
+        self.check_interval = check_interval
+        self.batch_size = batch_size
+        self.bank = _Bank()
+        self.version: tuple[int, int, int] | None = None
+        self.next_check: float = 0.0
+        self.lock = threading.Lock()
+
+    def refresh(self):
+        with self.lock:
+            self.next_check = time.monotonic() + self.check_interval
+            version = tuple(self.storage.get_question_bank_version())
+            if version == self.version:
+                return
+            if self.version is None or version[1] != self.version[1]:
+                self.bank = self._load(_Bank())
+            else:
+                self._load(self.bank)
+                # A question committed out of id order was skipped by the incremental fetch
+                if len(self.bank) != version[2]:
+                    self.bank = self._load(_Bank())
+            self.version = version
+
+    def _load(self, bank: _Bank) -> _Bank:
+        while True:
+            rows = self.storage.get_questions(bank.ids[-1] if bank.ids else 0, self.batch_size)
+            bank.append(rows)
+            if len(rows) < self.batch_size:
+                return bank
+
+    def _maybe_refresh(self):
+        # Only one thread checks, the others keep reading the current bank
+        if time.monotonic() >= self.next_check and not self.lock.locked():
+            self.refresh()
+
+    def next_question(self, after_id: int) -> tuple | None:
+        """The first question with an id above `after_id` (like `get_user_question` for a user whose cursor is `after_id`)."""
+        self._maybe_refresh()
+        bank = self.bank
+        index = bisect.bisect_right(bank.ids, after_id)
+        if index < len(bank):
+            return bank.row(index)
+        # Before telling a player they answered everything, make sure no question was added since the last check
+        self.refresh()
+        bank = self.bank
+        index = bisect.bisect_right(bank.ids, after_id)
+        return bank.row(index) if index < len(bank) else None
+
+    def get(self, question_id: int) -> tuple | None:
+        bank = self.bank
+        index = bisect.bisect_left(bank.ids, question_id)
+        return bank.row(index) if index < len(bank) and bank.ids[index] == question_id else None
+
+    @property
+    def ids(self) -> array:
+        """Ids of the current bank, ascending (like `QuestionPack.ids`)."""
+        return self.bank.ids
+
+    def __len__(self) -> int:
+        return len(self.bank)
+
+    def memory_usage(self) -> int:
+        """Bytes held by the bank: the columns plus every distinct string they point to."""
+        bank = self.bank
+        strings = {id(text): text for column in (bank.questions, *bank.answers) for text in column}
+        return (sys.getsizeof(bank.ids) + sys.getsizeof(bank.correct_answers) + sum(sys.getsizeof(column) for column in (bank.questions, *bank.answers))
+                + sum(sys.getsizeof(text) for text in strings.values()))
\ No newline at end of file
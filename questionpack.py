@@ -0,0 +1,144 @@
+import os
+import sys
+import mmap
+import bisect
+import struct
+from array import array
+from typing import Iterable, Iterator
+
+import bulk
+from storage import Storage
+
+# Layout of a question pack (all integers little-endian):
+#   header   magic, format version, flags, question count and the offsets of the four sections below
+#   blob     UTF-8 text of every question followed by its 4 answers, back to back
+#   ids      uint32 per question, ascending
+#   correct  uint8 per question (1-4)
+#   offsets  uint32 per text (5 per question) + 1 end marker: text k spans blob[offsets[k]:offsets[k + 1]]
+PACK_MAGIC: bytes = b'TRIVPACK'
+PACK_VERSION: int = 1
+PACK_HEADER = struct.Struct('<8sHHI4I')
+PACK_TEXTS: int = 5
+
+
+class QuestionPackError(Exception):
+    pass
+
+
+def build_pack(rows: Iterable[tuple], path: str) -> int:
+    """Write `rows` (id, question, answer_1..4, correct_answer, in ascending id order) to a pack, returns the count."""
+    ids = array('I')
+    correct_answers = array('B')
+    offsets = array('I')
+    temporary = f'{path}.tmp'
+    with open(temporary, 'wb') as file:
+        file.write(bytes(PACK_HEADER.size))
+        blob_offset = position = PACK_HEADER.size
+        for question_id, *texts, correct_answer in rows:
+            if ids and question_id <= ids[-1]:
+                raise QuestionPackError(f"question ids must be ascending, #{question_id} came after #{ids[-1]}")
+            ids.append(question_id)
+            correct_answers.append(correct_answer)
+            for text in texts:
+                offsets.append(position - blob_offset)
+                data = text.encode('utf-8')
+                file.write(data)
+                position += len(data)
+        if position - blob_offset >= 2 ** 32:
+            raise QuestionPackError("question texts exceed the 4 GiB a pack can address")
+        offsets.append(position - blob_offset)
+        # Keep the uint32 sections aligned
+        file.write(bytes(-position % 4))
+        position += -position % 4
+
+        sections = []
+        for section in (ids, correct_answers, offsets):
+            if sys.byteorder != 'little':
+                section.byteswap()
+            sections.append(position)
+            file.write(section.tobytes())
+            position += len(section) * section.itemsize
+            file.write(bytes(-position % 4))
+            position += -position % 4
+        file.seek(0)
+        file.write(PACK_HEADER.pack(PACK_MAGIC, PACK_VERSION, 0, len(ids), blob_offset, *sections))
+    os.replace(temporary, path)
+    return len(ids)
+
+
+def rows_from_csv(path: str) -> Iterator[tuple]:
+    # Takes the ids from an `id` column (as written by `bulk.export_questions`), numbers the rows from 1 otherwise
+    for number, (line_number, record, _) in enumerate(bulk.read_rows(path, 'csv'), 1):
+        try:
+            row = bulk.validate(record)
+            question_id = int(record.get('id') or number)
+        except ValueError as e:
+            raise QuestionPackError(f"line {line_number}: {e}") from None
+        yield (question_id, *row)
+
+
+class QuestionPack:
+    """Read-only question source backed by a memory-mapped pack file.
+
+    Opening only maps the file, pages are read in by the OS as questions are looked up, so cold start is independent
+    of the bank's size and the memory is shared between processes. Same lookups as `QuestionStore`, so a `Session`
+    can play from it. Its ids must match the questions in the storage the answers are recorded in.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, 'rb')
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self.file.close()
+            raise QuestionPackError(f"{path} is empty") from None
+        if len(self.map) < PACK_HEADER.size:
+            self.close()
+            raise QuestionPackError(f"{path} is not a question pack")
+        magic, version, _, count, blob_offset, ids_offset, correct_offset, offsets_offset = PACK_HEADER.unpack_from(self.map)
+        if magic != PACK_MAGIC or version != PACK_VERSION:
+            self.close()
+            raise QuestionPackError(f"{path} is not a version {PACK_VERSION} question pack")
+        if sys.byteorder != 'little':
+            self.close()
+            raise QuestionPackError("question packs can only be mapped on little-endian machines")
+        self.count = count
+        self.view = memoryview(self.map)
+        self.blob = self.view[blob_offset:]
+        self.ids = self.view[ids_offset:ids_offset + 4 * count].cast('I')
+        self.correct_answers = self.view[correct_offset:correct_offset + count]
+        self.offsets = self.view[offsets_offset:offsets_offset + 4 * (PACK_TEXTS * count + 1)].cast('I')
+
+    def row(self, index: int) -> tuple:
+        offsets = self.offsets[PACK_TEXTS * index:PACK_TEXTS * index + PACK_TEXTS + 1]
+        texts = [str(self.blob[offsets[n]:offsets[n + 1]], 'utf-8') for n in range(PACK_TEXTS)]
+        return (self.ids[index], *texts, self.correct_answers[index])
+
+    def next_question(self, after_id: int) -> tuple | None:
+        index = bisect.bisect_right(self.ids, after_id)
+        return self.row(index) if index < self.count else None
+
+    def get(self, question_id: int) -> tuple | None:
+        index = bisect.bisect_left(self.ids, question_id)
+        return self.row(index) if index < self.count and self.ids[index] == question_id else None
+
+    def refresh(self):
+        # A pack is immutable, ship a new file to change the bank
+        pass
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __iter__(self) -> Iterator[tuple]:
+        return (self.row(index) for index in range(self.count))
+
+    def close(self):
+        # The views have to go before the map can be closed
+        for name in ('offsets', 'correct_answers', 'ids', 'blob', 'view'):
+            view = self.__dict__.pop(name, None)
+            if view is not None:
+                view.release()
+        if hasattr(self, 'map'):
+            self.map.close()
+        self.file.close()
\ No newline at end of file
@@ -0,0 +1,60 @@
+RENDER_MODES: tuple[str, ...] = ('auto', 'ansi', 'alternate', 'plain')
+
+# Put at the start of a screen by the menus, each front-end turns it into its own way of clearing (form feed: new page)
+CLEAR: str = '\f'
+
+ANSI_CLEAR: str = '\x1b[H\x1b[2J'
+ANSI_ALTERNATE_ON: str = '\x1b[?1049h'
+ANSI_ALTERNATE_OFF: str = '\x1b[?1049l'
+# Non-TTY clients (pipes, logs, screen readers) get a blank line between screens instead of escape codes
+PLAIN_CLEAR: str = '\n'
+
+
+class Renderer:
+    """How one front-end draws screens.
+
+    `ansi` clears with an escape code, `alternate` also switches to the terminal's alternate screen for the length of
+    the session (so the game doesn't scroll the shell's history away), `plain` only separates screens with a blank
+    line. `auto` is `ansi` on a TTY and `plain` otherwise. Front-ends keep the text of a screen in a `Frame` and send it
+    together with the prompt that ends it, in a single write.
+    """
+
+    def __init__(self, mode: str = 'auto', tty: bool = True):
+        if mode not in RENDER_MODES:
+            raise ValueError(f"unknown render mode: {mode}")
+        self.mode = ('ansi' if tty else 'plain') if mode == 'auto' else mode
+        self.clear = PLAIN_CLEAR if self.mode == 'plain' else ANSI_CLEAR
+        self.opened: bool = False
+
+    def render(self, text: str) -> str:
+        text = text.replace(CLEAR, self.clear)
+        if self.mode == 'alternate' and not self.opened:
+            self.opened = True
+            text = ANSI_ALTERNATE_ON + text
+        return text
+
+    def close(self) -> str:
+        # Back to the normal screen, the last screen of the session is lost with the alternate one
+        if self.opened:
+            self.opened = False
+            return ANSI_ALTERNATE_OFF
+        return ''
+
+
+class Frame:
+    """Output of a front-end waiting for the next prompt (or the end of the session) to be sent in one piece."""
+
+    __slots__ = ('renderer', 'parts')
+
+    def __init__(self, renderer: Renderer):
+        self.renderer = renderer
+        self.parts: list[str] = []
+
+    def add(self, text: str):
+        self.parts.append(text)
+
+    def take(self, text: str = '') -> str:
+        self.parts.append(text)
+        output = self.renderer.render(''.join(self.parts))
+        self.parts.clear()
+        return output
\ No newline at end of file
@@ -0,0 +1,194 @@
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Iterable
+
+import psycopg2
+import psycopg2.extensions
+
+from pool import ConnectionPool, PoolTimeout
+
+# Reads go to a replica only when it is known to have replayed everything the primary committed this long ago, and a
+# writer's reads stay on the primary for as long
+REPLICA_MAX_STALENESS: float = 1.0
+# How often the replay positions are compared (at most, and only while reads are coming in)
+REPLICA_PROBE_INTERVAL: float = 0.1
+# A replica that failed is left alone this long before it is tried again
+REPLICA_RETRY_INTERVAL: float = 5.0
+# Past this many pinned users the expired pins are swept
+REPLICA_MAX_PINS: int = 10_000
+
+
+class ReplicaFailed(psycopg2.OperationalError):
+    """A read failed because the replica it was sent to went away, it can be run again on the primary."""
+
+
+class Replica:
+    __slots__ = ('dsn', 'pool', 'caught_up_to', 'down_until')
+
+    def __init__(self, dsn: str, pool: ConnectionPool):
+        self.dsn = dsn
+        self.pool = pool
+        # Monotonic time up to which everything committed on the primary is known to be replayed here
+        self.caught_up_to: float = float('-inf')
+        self.down_until: float = 0.0
+
+
+class ReplicaRouter:
+    """Picks the replica a read can go to, or None for the primary.
+
+    Every `probe_interval` the primary's WAL position is sampled, then each replica's replay position: a replica that
+    replayed past a sample taken at time t has every transaction committed before t. A read is routed to a replica
+    only if that t is at most `max_staleness` old, so no read is staler than that, whatever the replication lag (a
+    lagging replica just stops getting reads). Writers are pinned to the primary for `max_staleness` after their
+    write, both the thread that wrote and the users it wrote for, which makes their own writes visible to them (any
+    replica they are sent to afterwards has caught up past the write). A replica that can't be reached is skipped for
+    `retry_interval`. When the primary can't be sampled, the read goes to the primary.
+    """
+
+    def __init__(self, primary: ConnectionPool, dsns: Iterable[str], connect: Callable[[str], psycopg2.extensions.connection],
+                 pool_size: int, pool_timeout: float, max_staleness: float = REPLICA_MAX_STALENESS,
+                 probe_interval: float = REPLICA_PROBE_INTERVAL, retry_interval: float = REPLICA_RETRY_INTERVAL):
+        self.primary = primary
+        self.connect = connect
+        self.pool_size = pool_size
+        self.pool_timeout = pool_timeout
+        self.max_staleness = max_staleness
+        self.probe_interval = probe_interval
+        self.retry_interval = retry_interval
+        self.replicas = [Replica(dsn, self.open_pool(dsn)) for dsn in dsns]
+        # (monotonic time, primary WAL position) samples, oldest first
+        self.samples: deque[tuple[float, int]] = deque()
+        self.last_probe: float = float('-inf')
+        self.probe_lock = threading.Lock()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.user_writes: dict[int, float] = {}
+        self.next: int = 0
+        self.replica_reads: int = 0
+        self.pinned_reads: int = 0
+        self.primary_reads: int = 0
+        self.failures: int = 0
+        self.probe_failures: int = 0
+
+    def open_pool(self, dsn: str) -> ConnectionPool:
+        # Connections idle since the last probe are pinged on checkout, a replica that went away is noticed there and the
+        # read goes to the primary instead of failing
+        return ConnectionPool(lambda: self.connect(dsn), self.pool_size, self.pool_timeout, self.probe_interval)
+
+    def wrote(self, user_ids: Iterable[int] = ()):
+        # Called once the write is committed
+        now = time.monotonic()
+        self.local.last_write = now
+        with self.lock:
+            for user_id in user_ids:
+                self.user_writes[user_id] = now
+            if len(self.user_writes) > REPLICA_MAX_PINS:
+                self.user_writes = {user_id: written for user_id, written in self.user_writes.items() if now - written <= self.max_staleness}
+
+    @contextmanager
+    def on_primary(self):
+        # The reads of this thread go to the primary for the duration (reads run again after their replica failed)
+        previous = getattr(self.local, 'on_primary', False)
+        self.local.on_primary = True
+        try:
+            yield
+        finally:
+            self.local.on_primary = previous
+
+    def choose(self, user_id: int | None = None) -> Replica | None:
+        now = time.monotonic()
+        if getattr(self.local, 'on_primary', False):
+            with self.lock:
+                self.primary_reads += 1
+            return None
+        if now - getattr(self.local, 'last_write', float('-inf')) <= self.max_staleness or \
+                (user_id is not None and now - self.user_writes.get(user_id, float('-inf')) <= self.max_staleness):
+            with self.lock:
+                self.pinned_reads += 1
+            return None
+        if now - self.last_probe >= self.probe_interval and self.probe_lock.acquire(blocking=False):
+            try:
+                self.probe()
+            except (psycopg2.Error, PoolTimeout):
+                # No fresh sample of the primary (pool exhausted, server restarting): the read goes there too, and fails
+                # there if the primary is really gone
+                with self.lock:
+                    self.probe_failures += 1
+                    self.primary_reads += 1
+                return None
+            finally:
+                self.probe_lock.release()
+            now = time.monotonic()
+        fresh = [replica for replica in self.replicas if replica.down_until <= now and now - replica.caught_up_to <= self.max_staleness]
+        with self.lock:
+            if not fresh:
+                self.primary_reads += 1
+                return None
+            self.next += 1
+            self.replica_reads += 1
+            return fresh[self.next % len(fresh)]
+
+    def probe(self):
+        self.last_probe = now = time.monotonic()
+        connection = self.primary.checkout()
+        broken = True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_wal_lsn_diff(pg_current_wal_lsn(), '0/0')::BIGINT;")
+                self.samples.append((now, cursor.fetchone()[0]))
+            connection.rollback()
+            broken = False
+        finally:
+            self.primary.checkin(connection, broken)
+        # Keep one sample old enough to judge a replica lagging by about the bound
+        while len(self.samples) > 1 and now - self.samples[1][0] > self.max_staleness:
+            self.samples.popleft()
+
+        for replica in self.replicas:
+            if replica.down_until > now:
+                continue
+            try:
+                connection = replica.pool.checkout()
+            except (psycopg2.OperationalError, PoolTimeout):
+                self.failed(replica)
+                continue
+            broken = True
+            try:
+                with connection.cursor() as cursor:
+                    # NULL on a server that isn't in recovery, i.e. not a replica
+                    cursor.execute("SELECT pg_wal_lsn_diff(pg_last_wal_replay_lsn(), '0/0')::BIGINT;")
+                    replayed = cursor.fetchone()[0]
+                connection.rollback()
+                broken = False
+            except psycopg2.Error:
+                replayed = None
+            finally:
+                replica.pool.checkin(connection, broken)
+            if replayed is None:
+                self.failed(replica)
+                continue
+            for sampled, position in reversed(self.samples):
+                if position <= replayed:
+                    replica.caught_up_to = max(replica.caught_up_to, sampled)
+                    break
+
+    def failed(self, replica: Replica):
+        replica.down_until = time.monotonic() + self.retry_interval
+        replica.caught_up_to = float('-inf')
+        # Its other connections are most likely dead too, start over with new ones when it is tried again (connections
+        # still checked out are closed when they come back to the old pool)
+        stale, replica.pool = replica.pool, self.open_pool(replica.dsn)
+        stale.close()
+        with self.lock:
+            self.failures += 1
+
+    def close(self):
+        for replica in self.replicas:
+            replica.pool.close()
+
+    def stats(self) -> dict[str, int]:
+        with self.lock:
+            return {'replica_reads': self.replica_reads, 'pinned_reads': self.pinned_reads, 'primary_reads': self.primary_reads,
+                    'failures': self.failures, 'probe_failures': self.probe_failures, 'replicas_up': sum(replica.down_until <= time.monotonic() for replica in self.replicas)}
\ No newline at end of file
@@ -0,0 +1,125 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from dedupe import SharedDuplicateIndex
+from functions import Session
+from ordering import QuestionOrder
+from profiling import Profiler
+from question_store import QuestionStore
+from questionpack import QuestionPack
+from render import Frame, Renderer
+from storage import Storage
+
+SERVER_HOST: str = '0.0.0.0'
+SERVER_PORT: int = 4000
+SERVER_MAX_SESSIONS: int = 2000
+# Seconds a session waits for the player's next line before hanging up, None waits forever
+SESSION_IDLE_TIMEOUT: float | None = 15 * 60
+# Session threads spend their life waiting on a socket or a query, they don't need the default 8MB stack
+SESSION_STACK_SIZE: int = 256 * 1024
+
+
+class StreamIO:
+    """Line-based (telnet-style) front-end of a session running on a worker thread.
+
+    `input` hands the read over to the event loop and blocks the worker until a line arrives, so the session code and
+    its database calls never run on the event loop itself. `print` only adds to the screen being built, which goes out
+    with the next prompt as a single write (one packet on the wire instead of one per line). A client that goes away,
+    or sends nothing for `idle_timeout` seconds, ends the input like a closed stream.
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, loop: asyncio.AbstractEventLoop,
+                 renderer: Renderer | None = None, idle_timeout: float | None = SESSION_IDLE_TIMEOUT):
+        self.reader = reader
+        self.writer = writer
+        self.loop = loop
+        self.frame = Frame(renderer or Renderer())
+        self.idle_timeout = idle_timeout
+
+    def input(self, prompt: str = '') -> str:
+        self.write(self.frame.take(prompt))
+        line = asyncio.run_coroutine_threadsafe(self._readline(), self.loop).result()
+        if not line:
+            raise EOFError
+        return line.decode('utf-8', errors='replace').rstrip('\r\n')
+
+    def print(self, *values, sep: str = ' ', end: str = '\n'):
+        self.frame.add(sep.join(str(value) for value in values) + end)
+
+    def close(self):
+        self.write(self.frame.take() + self.frame.renderer.close())
+
+    def write(self, text: str):
+        if text:
+            self.loop.call_soon_threadsafe(self.writer.write, text.replace('\n', '\r\n').encode('utf-8'))
+
+    async def _readline(self) -> bytes:
+        try:
+            await self.writer.drain()
+            return await asyncio.wait_for(self.reader.readline(), self.idle_timeout)
+        except (ConnectionError, ValueError, asyncio.TimeoutError):
+            return b''
+
+
+class GameServer:
+    def __init__(self, db: Storage, max_sessions: int = SERVER_MAX_SESSIONS, questions: QuestionStore | QuestionPack | None = None,
+                 order: QuestionOrder | None = None, render_mode: str = 'auto', profiler: Profiler | None = None,
+                 duplicates: SharedDuplicateIndex | None = None, idle_timeout: float | None = SESSION_IDLE_TIMEOUT):
+        self.db = db
+        self.questions = questions
+        self.order = order
+        self.duplicates = duplicates if duplicates is not None else SharedDuplicateIndex(db)
+        self.max_sessions = max_sessions
+        # Clients can't be told apart from a TTY over the socket, `auto` means `ansi`
+        self.render_mode = render_mode
+        self.profiler = profiler or Profiler()
+        self.idle_timeout = idle_timeout
+        self.sessions: int = 0
+        self.executor = ThreadPoolExecutor(max_workers=max_sessions, thread_name_prefix='session')
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        loop = asyncio.get_running_loop()
+        if self.sessions >= self.max_sessions:
+            writer.write(b"The server is full, please try again later.\r\n")
+            await writer.drain()
+            writer.close()
+            return
+
+        self.sessions += 1
+        session = Session(self.db, StreamIO(reader, writer, loop, Renderer(self.render_mode), self.idle_timeout), self.questions, self.order, self.profiler.timers, self.duplicates)
+        try:
+            await loop.run_in_executor(self.executor, self.profiler.run, session.run)
+        except Exception as e:
+            print(f"[SERVER-ERROR: SESSION FAILED]:\n{e}")
+        finally:
+            self.sessions -= 1
+            try:
+                await writer.drain()
+                writer.close()
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def serve(self, host: str, port: int):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        print(f"[SERVER: LISTENING ON {host}:{port}]")
+        async with server:
+            await server.serve_forever()
+
+
+def serve(db: Storage, host: str = SERVER_HOST, port: int = SERVER_PORT, max_sessions: int = SERVER_MAX_SESSIONS, questions: QuestionStore | QuestionPack | None = None,
+          order: QuestionOrder | None = None, render_mode: str = 'auto', profiler: Profiler | None = None, duplicates: SharedDuplicateIndex | None = None,
+          idle_timeout: float | None = SESSION_IDLE_TIMEOUT):
+    db.connect()
+    if questions is not None:
+        questions.refresh()
+    if order is not None:
+        order.build(db)
+    game_server = GameServer(db, max_sessions, questions, order, render_mode, profiler, duplicates, idle_timeout)
+    try:
+        asyncio.run(game_server.serve(host, port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        game_server.executor.shutdown(wait=False, cancel_futures=True)
+        db.disconnect()
\ No newline at end of file
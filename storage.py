@@ -0,0 +1,987 @@
+import time
+import bisect
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from array import array
+from contextlib import contextmanager
+from typing import Callable, Iterator
+from datetime import date, datetime, timedelta, timezone
+
+from hashing import PasswordHasher
+
+SQLITE_PATH: str = 'trivia.sqlite3'
+# Every question has four answers, `correct_answer` is the number of the right one
+CORRECT_ANSWERS: tuple[int, ...] = (1, 2, 3, 4)
+
+# Admin views that can be paged through (`open_report`) or streamed (`stream_report`) whatever their size
+REPORT_EASIEST_QUESTIONS: str = 'easiest_questions'
+REPORT_HARDEST_QUESTIONS: str = 'hardest_questions'
+REPORT_MOST_CORRECT_USERS: str = 'most_correct_users'
+REPORT_MOST_ACTIVE_USERS: str = 'most_active_users'
+REPORT_USER_ANSWERS: str = 'user_answers'
+REPORT_QUESTION_STATISTICS: str = 'question_statistics'
+REPORT_QUESTION_DIFFICULTY: str = 'question_difficulty'
+REPORT_COLUMNS: dict[str, tuple[str, ...]] = {
+    REPORT_EASIEST_QUESTIONS: ('question', 'correct_answers'),
+    REPORT_HARDEST_QUESTIONS: ('question', 'correct_answers'),
+    REPORT_MOST_CORRECT_USERS: ('username', 'correct_answers'),
+    REPORT_MOST_ACTIVE_USERS: ('username', 'answers'),
+    REPORT_USER_ANSWERS: ('question', 'is_correct'),
+    REPORT_QUESTION_STATISTICS: ('question', 'answers', 'correct_answers', 'incorrect_answers'),
+    REPORT_QUESTION_DIFFICULTY: ('question_id', 'answers', 'correct_answers'),
+}
+REPORT_PAGE_SIZE: int = 20
+REPORT_BATCH_SIZE: int = 1_000
+# Questions fetched per `get_questions` call when going through the whole bank
+QUESTIONS_BATCH_SIZE: int = 10_000
+
+
+class Pager:
+    """An open report, read a page at a time so only `page_size` rows are ever held.
+
+    `fetch(limit, offset)` returns a slice of the rows, read when the page is asked for, `count()` the number of rows,
+    only run the first time `total` (or `pages`) is asked for. `on_close` releases whatever the fetches share. Use it as
+    a context manager.
+    """
+
+    def __init__(self, fetch: Callable[[int, int], list[tuple]], count: Callable[[], int], page_size: int = REPORT_PAGE_SIZE, on_close: Callable[[], None] | None = None):
+        self.fetch = fetch
+        self.count = count
+        self._total: int | None = None
+        self.page_size = page_size
+        self.on_close = on_close
+
+    @property
+    def total(self) -> int:
+        if self._total is None:
+            self._total = self.count()
+        return self._total
+
+    @property
+    def pages(self) -> int:
+        # An empty report still has its (empty) first page
+        return max(1, -(-self.total // self.page_size))
+
+    def page(self, number: int) -> list[tuple]:
+        return self.fetch(self.page_size, number * self.page_size)
+
+    def close(self):
+        on_close, self.on_close = self.on_close, None
+        if on_close:
+            on_close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class Storage(ABC):
+    """Everything a `Session` needs from the game's storage.
+
+    Rows are plain tuples shaped like the PostgreSQL ones: a question is (id, question, answer_1..4, correct_answer),
+    timestamps are timezone-aware datetimes. `Database` is the PostgreSQL engine, `MemoryStorage` and `SQLiteStorage`
+    run without a server. All engines must pass the tests of `tests/test_storage.py`.
+
+    The game is played in seasons: answers, progress, the Hall of Fame and the statistics all belong to one, and the
+    per-user methods are about the current season (`get_season`).
+    """
+
+    hasher: PasswordHasher
+
+    @abstractmethod
+    def connect(self):
+        ...
+
+    @abstractmethod
+    def disconnect(self):
+        ...
+
+    # ===== [USERS] =====
+
+    @abstractmethod
+    def is_password_matching(self, username: str, password: str) -> bool:
+        ...
+
+    @abstractmethod
+    def get_user_id(self, username: str) -> int | None:
+        ...
+
+    @abstractmethod
+    def create_user(self, username: str, password: str, email: str, dob: date) -> int | None:
+        """Returns the id of the new user, or None when the username is taken."""
+
+    @abstractmethod
+    def get_user_questions_solved(self, user_id: int) -> int:
+        ...
+
+    @abstractmethod
+    def get_user_statistics(self, user_id: int) -> tuple | None:
+        """(id, username, password, email, dob, questions_solved, play_timestamp, correct_answers)"""
+
+    @abstractmethod
+    def get_user_answers(self, user_id: int) -> list[tuple]:
+        """(question, is_correct) of every question the user answered"""
+
+    @abstractmethod
+    def get_user_question_ids(self, user_id: int) -> list[int]:
+        """Ids of the questions the user answered in the current season, in id order."""
+
+    # ===== [GAME] =====
+
+    @abstractmethod
+    def create_question(self, question: str, answer_1: str, answer_2: str, answer_3: str, answer_4: str, correct_answer: int) -> int | None:
+        """Raises ValueError when `correct_answer` isn't one of CORRECT_ANSWERS."""
+
+    @abstractmethod
+    def get_questions(self, after_id: int = 0, limit: int = 10_000) -> list[tuple]:
+        """Up to `limit` questions with an id above `after_id`, in id order."""
+
+    @abstractmethod
+    def get_question_bank_version(self) -> tuple[int, int, int]:
+        """(version, generation, questions): `version` moves on any change to the bank, `generation` only when existing
+        questions are changed or deleted, and `questions` is how many there are."""
+
+    @abstractmethod
+    def get_user_question(self, user_id: int) -> tuple | None:
+        """The next question the user hasn't answered yet, None once they answered all of them."""
+
+    @abstractmethod
+    def handle_user_answer(self, user_id: int, question_id: int, answer: int) -> bool:
+        """Record the answer and update the user, leaderboard and question counters, returns whether it was correct.
+
+        Idempotent: if the user already answered the question (another session, a retry) nothing changes and the verdict
+        of the recorded answer is returned."""
+
+    @abstractmethod
+    def play_step(self, user_id: int, question_id: int | None = None, answer: int | None = None) -> tuple[bool | None, tuple | None]:
+        """Stamp the play timestamp if unset, answer `question_id` (if given) and return (verdict, next question)."""
+
+    @abstractmethod
+    def record_answers(self, answers: list[tuple[int, int, bool, datetime]]) -> int:
+        """Record already judged (user_id, question_id, is_correct, answer_timestamp) answers in a single transaction, with
+        the same counter updates as `handle_user_answer`. Answers the user already has (the first one of a batch wins) or
+        whose user or question no longer exists are skipped. Returns how many were recorded."""
+
+    @abstractmethod
+    def reset_user_answers(self, user_id: int):
+        """Start the user over in the current season."""
+
+    # ===== [SEASONS] =====
+
+    @abstractmethod
+    def get_season(self) -> int:
+        """The season being played, seasons are numbered from 1."""
+
+    @abstractmethod
+    def start_season(self) -> int:
+        """End the current season and start the next one, returns its number.
+
+        Every player starts over with no answers, and the Hall of Fame and statistics start empty. Finished seasons are
+        kept as they were, `get_hall_of_fame` and the reports read them by number."""
+
+    # ===== [HALL OF FAME] =====
+
+    @abstractmethod
+    def get_hall_of_fame(self, limit: int = 10, offset: int = 0, season: int | None = None) -> list[tuple]:
+        """A page of (rank, username, correct_answers, playtime) of `season` (the current one by default), ordered by
+        correct answers, then playtime."""
+
+    @abstractmethod
+    def get_user_rank(self, user_id: int) -> int | None:
+        ...
+
+    # ===== [STATISTICS] =====
+
+    @abstractmethod
+    def count_players(self) -> int:
+        """Number of users who have answered at least one question."""
+
+    # ===== [REPORTS] =====
+
+    @abstractmethod
+    def open_report(self, report: str, params: tuple = (), page_size: int = REPORT_PAGE_SIZE, season: int | None = None) -> Pager:
+        """Open one of the REPORT_COLUMNS views of `season` (the current one by default) for paging."""
+
+    def stream_report(self, report: str, params: tuple = (), batch_size: int = REPORT_BATCH_SIZE, season: int | None = None) -> Iterator[tuple]:
+        """Every row of a report, fetched `batch_size` rows at a time."""
+        with self.open_report(report, params, batch_size, season) as pager:
+            for number in range(pager.pages):
+                yield from pager.page(number)
+
+
+def check_correct_answer(correct_answer: int):
+    if correct_answer not in CORRECT_ANSWERS:
+        raise ValueError(f"correct_answer must be between 1 and 4, got {correct_answer!r}")
+
+
+def rows_from_storage(storage: Storage, batch_size: int = QUESTIONS_BATCH_SIZE) -> Iterator[tuple]:
+    """Every question of the bank in id order, `batch_size` at a time."""
+    last_id: int = 0
+    while rows := storage.get_questions(last_id, batch_size):
+        yield from rows
+        last_id = rows[-1][0]
+
+
+def format_playtime(playtime: timedelta | None) -> str | None:
+    # Same text as PostgreSQL's to_char(interval, 'HH24:MI:SS.MS')
+    if playtime is None:
+        return None
+    milliseconds = int(playtime / timedelta(milliseconds=1))
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:02}:{minutes:02}:{seconds:02}.{milliseconds:03}"
+
+
+class _Season:
+    """One season of a `MemoryStorage`: the players' progress and answers, the Hall of Fame and the question counters."""
+
+    __slots__ = ('players', 'answers', 'leaderboard', 'correct_answers', 'incorrect_answers')
+
+    def __init__(self, questions: int):
+        # user_id -> [questions_solved, play_timestamp, last_question_id]
+        self.players: dict[int, list] = {}
+        # user_id -> {question_id: (is_correct, answer_timestamp)}
+        self.answers: dict[int, dict[int, tuple[bool, datetime]]] = {}
+        # user_id -> [correct_answers, play_timestamp, last_answer_timestamp]
+        self.leaderboard: dict[int, list] = {}
+        # Parallel to the question bank
+        self.correct_answers = array('i', [0]) * questions
+        self.incorrect_answers = array('i', [0]) * questions
+
+
+class MemoryStorage(Storage):
+    """Keeps the whole game in process memory, for tests, load tests and throwaway deployments.
+
+    The question bank is a set of parallel arrays sorted by id (ids only grow), so the next question is a bisect and the
+    per-question counters are flat `array('i')`s. Users are dicts, everything played is kept per `_Season`. A single
+    lock makes every call atomic.
+    """
+
+    def __init__(self, hasher: PasswordHasher | None = None):
+        self.hasher = hasher or PasswordHasher()
+        self.lock = threading.Lock()
+        # id -> [username, password, email, dob]
+        self.users: dict[int, list] = {}
+        self.user_ids: dict[str, int] = {}
+        self.question_ids = array('i')
+        self.questions: list[tuple] = []
+        # Season n is seasons[n - 1], the last one is being played
+        self.seasons: list[_Season] = [_Season(0)]
+        # Questions are only ever added here, so the generation never moves
+        self.question_bank_version: int = 1
+
+    def connect(self):
+        pass
+
+    def disconnect(self):
+        self.hasher.close()
+
+    def is_password_matching(self, username: str, password: str) -> bool:
+        with self.lock:
+            user_id = self.user_ids.get(username)
+            db_password = self.users[user_id][1] if user_id is not None else None
+        if db_password is None or not self.hasher.check(password, db_password):
+            return False
+        if self.hasher.needs_rehash(db_password):
+            new_password = self.hasher.hash(password)
+            with self.lock:
+                if self.users[user_id][1] == db_password:
+                    self.users[user_id][1] = new_password
+        return True
+
+    def get_user_id(self, username: str) -> int | None:
+        return self.user_ids.get(username)
+
+    def create_user(self, username: str, password: str, email: str, dob: date) -> int | None:
+        hashed_password = self.hasher.hash(password)
+        with self.lock:
+            if username in self.user_ids:
+                return None
+            user_id = len(self.users) + 1
+            self.users[user_id] = [username, hashed_password, email, dob]
+            self.user_ids[username] = user_id
+            return user_id
+
+    def get_user_questions_solved(self, user_id: int) -> int:
+        player = self.seasons[-1].players.get(user_id)
+        return player[0] if player else 0
+
+    def get_user_statistics(self, user_id: int) -> tuple | None:
+        with self.lock:
+            user = self.users.get(user_id)
+            if user is None:
+                return None
+            season = self.seasons[-1]
+            player = season.players.get(user_id, [0, None, 0])
+            entry = season.leaderboard.get(user_id)
+            return (user_id, *user, player[0], player[1], entry[0] if entry else 0)
+
+    def get_user_answers(self, user_id: int) -> list[tuple]:
+        with self.lock:
+            return self._user_answers(self.seasons[-1], user_id)
+
+    def get_user_question_ids(self, user_id: int) -> list[int]:
+        with self.lock:
+            return sorted(self.seasons[-1].answers.get(user_id, {}))
+
+    def create_question(self, question: str, answer_1: str, answer_2: str, answer_3: str, answer_4: str, correct_answer: int) -> int | None:
+        check_correct_answer(correct_answer)
+        with self.lock:
+            question_id = self.question_ids[-1] + 1 if self.question_ids else 1
+            self.question_ids.append(question_id)
+            self.questions.append((question_id, question, answer_1, answer_2, answer_3, answer_4, correct_answer))
+            for season in self.seasons:
+                season.correct_answers.append(0)
+                season.incorrect_answers.append(0)
+            self.question_bank_version += 1
+            return question_id
+
+    def get_questions(self, after_id: int = 0, limit: int = 10_000) -> list[tuple]:
+        with self.lock:
+            index = bisect.bisect_right(self.question_ids, after_id)
+            return self.questions[index:index + limit]
+
+    def get_question_bank_version(self) -> tuple[int, int, int]:
+        with self.lock:
+            return self.question_bank_version, 1, len(self.questions)
+
+    def get_user_question(self, user_id: int) -> tuple | None:
+        with self.lock:
+            return self._next_question(user_id)
+
+    def handle_user_answer(self, user_id: int, question_id: int, answer: int) -> bool:
+        with self.lock:
+            return self._answer(user_id, question_id, answer, datetime.now(timezone.utc))
+
+    def play_step(self, user_id: int, question_id: int | None = None, answer: int | None = None) -> tuple[bool | None, tuple | None]:
+        with self.lock:
+            now = datetime.now(timezone.utc)
+            player = self._player(user_id)
+            if player[1] is None:
+                player[1] = now
+            is_correct = self._answer(user_id, question_id, answer, now) if question_id is not None else None
+            return is_correct, self._next_question(user_id)
+
+    def record_answers(self, answers: list[tuple[int, int, bool, datetime]]) -> int:
+        with self.lock:
+            recorded: int = 0
+            season = self.seasons[-1]
+            for user_id, question_id, is_correct, answer_timestamp in answers:
+                index = bisect.bisect_left(self.question_ids, question_id)
+                if (user_id not in self.users or question_id in season.answers.get(user_id, {})
+                        or index == len(self.question_ids) or self.question_ids[index] != question_id):
+                    continue
+                self._record(user_id, index, is_correct, answer_timestamp)
+                recorded += 1
+            return recorded
+
+    def reset_user_answers(self, user_id: int):
+        with self.lock:
+            season = self.seasons[-1]
+            for question_id, (is_correct, _) in season.answers.pop(user_id, {}).items():
+                index = self._index(question_id)
+                if is_correct:
+                    season.correct_answers[index] -= 1
+                else:
+                    season.incorrect_answers[index] -= 1
+            season.leaderboard.pop(user_id, None)
+            season.players.pop(user_id, None)
+
+    def get_hall_of_fame(self, limit: int = 10, offset: int = 0, season: int | None = None) -> list[tuple]:
+        with self.lock:
+            ranking = sorted(self._season(season).leaderboard.items(), key=self._rank_key)[offset:offset + limit]
+            return [(offset + position, self.users[user_id][0], entry[0], format_playtime(self._playtime(entry)))
+                    for position, (user_id, entry) in enumerate(ranking, 1)]
+
+    def get_user_rank(self, user_id: int) -> int | None:
+        with self.lock:
+            leaderboard = self.seasons[-1].leaderboard
+            if user_id not in leaderboard:
+                return None
+            key = self._rank_key((user_id, leaderboard[user_id]))
+            return 1 + sum(1 for item in leaderboard.items() if self._rank_key(item) < key)
+
+    def count_players(self) -> int:
+        with self.lock:
+            return sum(1 for player in self.seasons[-1].players.values() if player[0] != 0)
+
+    def get_season(self) -> int:
+        return len(self.seasons)
+
+    def start_season(self) -> int:
+        # The finished season is kept as it is, the new one starts empty
+        with self.lock:
+            self.seasons.append(_Season(len(self.questions)))
+            return len(self.seasons)
+
+    def open_report(self, report: str, params: tuple = (), page_size: int = REPORT_PAGE_SIZE, season: int | None = None) -> Pager:
+        # Everything is in memory already, pages are slices of a snapshot
+        loaders: dict[str, Callable[[_Season], list[tuple]]] = {
+            REPORT_EASIEST_QUESTIONS: self._easiest_questions,
+            REPORT_HARDEST_QUESTIONS: self._hardest_questions,
+            REPORT_MOST_CORRECT_USERS: self._most_correct_users,
+            REPORT_MOST_ACTIVE_USERS: self._most_active_users,
+            REPORT_USER_ANSWERS: lambda state: self._user_answers(state, *params),
+            REPORT_QUESTION_STATISTICS: self._question_statistics,
+            REPORT_QUESTION_DIFFICULTY: lambda state: self._question_difficulty(season),
+        }
+        with self.lock:
+            rows = loaders[report](self._season(season))
+        return Pager(lambda limit, offset: rows[offset:offset + limit], lambda: len(rows), page_size)
+
+    # Helpers below expect `self.lock` to be held
+
+    def _season(self, number: int | None) -> _Season:
+        if number is None:
+            return self.seasons[-1]
+        # Like in the SQL engines, a season that doesn't exist has no rows
+        return self.seasons[number - 1] if 1 <= number <= len(self.seasons) else _Season(len(self.questions))
+
+    def _player(self, user_id: int) -> list:
+        # The user's first step in the current season creates their progress
+        if user_id not in self.users:
+            raise KeyError(f"user #{user_id} does not exist")
+        return self.seasons[-1].players.setdefault(user_id, [0, None, 0])
+
+    def _index(self, question_id: int) -> int:
+        index = bisect.bisect_left(self.question_ids, question_id)
+        if index == len(self.question_ids) or self.question_ids[index] != question_id:
+            raise KeyError(f"question #{question_id} does not exist")
+        return index
+
+    def _next_question(self, user_id: int) -> tuple | None:
+        player = self.seasons[-1].players.get(user_id)
+        index = bisect.bisect_right(self.question_ids, player[2] if player else 0)
+        return self.questions[index] if index < len(self.questions) else None
+
+    def _answer(self, user_id: int, question_id: int, answer: int, now: datetime) -> bool:
+        index = self._index(question_id)
+        recorded = self.seasons[-1].answers.get(user_id, {}).get(question_id)
+        if recorded is not None:
+            return recorded[0]
+        is_correct = answer == self.questions[index][6]
+        self._record(user_id, index, is_correct, now)
+        return is_correct
+
+    def _record(self, user_id: int, index: int, is_correct: bool, now: datetime):
+        season = self.seasons[-1]
+        question_id = self.question_ids[index]
+        player = self._player(user_id)
+        season.answers.setdefault(user_id, {})[question_id] = (is_correct, now)
+        player[0] += 1
+        player[2] = max(player[2], question_id)
+        if is_correct:
+            entry = season.leaderboard.setdefault(user_id, [0, None, None])
+            entry[0] += 1
+            entry[1], entry[2] = player[1], now
+            season.correct_answers[index] += 1
+        else:
+            season.incorrect_answers[index] += 1
+
+    def _user_answers(self, season: _Season, user_id: int) -> list[tuple]:
+        # In question order, the same question text answered the same way only once (like the SQL GROUP BY)
+        return list(dict.fromkeys((self.questions[self._index(question_id)][1], is_correct)
+                                  for question_id, (is_correct, _) in sorted(season.answers.get(user_id, {}).items())))
+
+    def _most_correct_users(self, season: _Season) -> list[tuple]:
+        ranking = sorted(season.leaderboard.items(), key=lambda item: (-item[1][0], item[0]))
+        return [(self.users[user_id][0], entry[0]) for user_id, entry in ranking]
+
+    def _most_active_users(self, season: _Season) -> list[tuple]:
+        ranking = sorted((item for item in season.players.items() if item[1][0] > 0), key=lambda item: (-item[1][0], item[0]))
+        return [(self.users[user_id][0], player[0]) for user_id, player in ranking]
+
+    def _easiest_questions(self, season: _Season) -> list[tuple]:
+        most = max(season.correct_answers, default=0)
+        return [(row[1], most) for row, correct in zip(self.questions, season.correct_answers) if most > 0 and correct == most]
+
+    def _hardest_questions(self, season: _Season) -> list[tuple]:
+        least = min((correct for correct in season.correct_answers if correct > 0), default=0)
+        return [(row[1], least) for row, correct in zip(self.questions, season.correct_answers) if least > 0 and correct == least]
+
+    def _question_statistics(self, season: _Season) -> list[tuple]:
+        return [(row[1], correct + incorrect, correct, incorrect)
+                for row, correct, incorrect in zip(self.questions, season.correct_answers, season.incorrect_answers)]
+
+    def _question_difficulty(self, number: int | None) -> list[tuple]:
+        seasons = self.seasons[:len(self.seasons) if number is None else max(number, 0)]
+        rows = []
+        for index, question_id in enumerate(self.question_ids):
+            correct = sum(season.correct_answers[index] for season in seasons)
+            answers = correct + sum(season.incorrect_answers[index] for season in seasons)
+            if answers:
+                rows.append((question_id, answers, correct))
+        return rows
+
+    @staticmethod
+    def _playtime(entry: list) -> timedelta | None:
+        return entry[2] - entry[1] if entry[1] is not None and entry[2] is not None else None
+
+    @classmethod
+    def _rank_key(cls, item: tuple[int, list]) -> tuple:
+        playtime = cls._playtime(item[1])
+        # Entries without a playtime go last, like NULLs in PostgreSQL
+        return -item[1][0], playtime is None, playtime or timedelta(0), item[0]
+
+
+# The season being played, like PostgreSQL's `current_season()`
+SQLITE_CURRENT_SEASON: str = "(SELECT MAX(id) FROM seasons)"
+
+# Queries behind the reports. The first parameter of each is the season, NULL for the current one
+SQLITE_REPORTS: dict[str, str] = {
+    REPORT_EASIEST_QUESTIONS: f"""
+        SELECT q.question, qs.correct_answers
+        FROM (SELECT COALESCE(?, {SQLITE_CURRENT_SEASON}) AS season) s
+        JOIN question_stats qs ON qs.season = s.season
+        JOIN questions q ON qs.question_id = q.id
+        WHERE qs.correct_answers = (SELECT MAX(correct_answers) FROM question_stats WHERE season = s.season) AND qs.correct_answers > 0
+        ORDER BY q.id
+    """,
+    REPORT_HARDEST_QUESTIONS: f"""
+        SELECT q.question, qs.correct_answers
+        FROM (SELECT COALESCE(?, {SQLITE_CURRENT_SEASON}) AS season) s
+        JOIN question_stats qs ON qs.season = s.season
+        JOIN questions q ON qs.question_id = q.id
+        WHERE qs.correct_answers = (SELECT MIN(correct_answers) FROM question_stats WHERE season = s.season AND correct_answers > 0)
+        ORDER BY q.id
+    """,
+    REPORT_MOST_CORRECT_USERS: f"""
+        SELECT u.username, l.correct_answers
+        FROM (SELECT COALESCE(?, {SQLITE_CURRENT_SEASON}) AS season) s
+        JOIN leaderboard l ON l.season = s.season
+        JOIN users u ON l.user_id = u.id
+        ORDER BY l.correct_answers DESC, l.user_id
+    """,
+    REPORT_MOST_ACTIVE_USERS: f"""
+        SELECT u.username, p.questions_solved
+        FROM (SELECT COALESCE(?, {SQLITE_CURRENT_SEASON}) AS season) s
+        JOIN players p ON p.season = s.season
+        JOIN users u ON p.user_id = u.id
+        WHERE p.questions_solved > 0
+        ORDER BY p.questions_solved DESC, p.user_id
+    """,
+    REPORT_USER_ANSWERS: f"""
+        SELECT q.question, ua.is_correct
+        FROM (SELECT COALESCE(?, {SQLITE_CURRENT_SEASON}) AS season) s
+        JOIN user_answers ua ON ua.season = s.season
+        JOIN questions q ON ua.question_id = q.id
+        WHERE ua.user_id = ?
+        GROUP BY q.question, ua.is_correct
+        ORDER BY MIN(ua.question_id)
+    """,
+    REPORT_QUESTION_STATISTICS: f"""
+        SELECT q.question,
+               COALESCE(qs.correct_answers + qs.incorrect_answers, 0),
+               COALESCE(qs.correct_answers, 0),
+               COALESCE(qs.incorrect_answers, 0)
+        FROM (SELECT COALESCE(?, {SQLITE_CURRENT_SEASON}) AS season) s
+        CROSS JOIN questions q
+        LEFT JOIN question_stats qs ON qs.season = s.season AND qs.question_id = q.id
+        ORDER BY q.id
+    """,
+    REPORT_QUESTION_DIFFICULTY: f"""
+        SELECT qs.question_id, SUM(qs.correct_answers + qs.incorrect_answers), SUM(qs.correct_answers)
+        FROM (SELECT COALESCE(?, {SQLITE_CURRENT_SEASON}) AS season) s
+        JOIN question_stats qs ON qs.season <= s.season
+        GROUP BY qs.question_id
+        HAVING SUM(qs.correct_answers + qs.incorrect_answers) > 0
+        ORDER BY qs.question_id
+    """,
+}
+
+
+class SQLiteStorage(Storage):
+    """Single-file engine for small deployments without a PostgreSQL server.
+
+    Same tables as PostgreSQL, with the stored routines' logic done in Python inside one transaction each. Timestamps
+    are stored as epoch seconds. SQLite allows a single writer anyway, so all threads share one connection behind a lock.
+    There are no partitions: the season leads every primary key instead, so a season's rows sit together and starting
+    one is a single insert.
+    """
+
+    def __init__(self, path: str = SQLITE_PATH, hasher: PasswordHasher | None = None):
+        self.path = path
+        self.hasher = hasher or PasswordHasher()
+        self.lock = threading.Lock()
+        self.connection: sqlite3.Connection | None = None
+
+    def connect(self):
+        self.connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA foreign_keys = ON;")
+        self.connection.execute("PRAGMA journal_mode = WAL;")
+        self.create_tables()
+
+    def disconnect(self):
+        if self.connection:
+            self.connection.close()
+            self.connection = None
+        self.hasher.close()
+
+    @contextmanager
+    def cursor(self, function: str, error: str | None = None, commit: bool = True):
+        # One transaction per call, like `Database.cursor`
+        with self.lock:
+            cursor = self.connection.cursor()
+            try:
+                cursor.execute("BEGIN IMMEDIATE;" if commit else "BEGIN;")
+                yield cursor
+                cursor.execute("COMMIT;" if commit else "ROLLBACK;")
+            except sqlite3.OperationalError as e:
+                self.connection.rollback()
+                print(f"[SQLITE-ERROR: {error or f'FAILED TO EXECUTE FUNCTION `{function}`'}]:\n{e}")
+                raise
+            except BaseException:
+                self.connection.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    def create_tables(self):
+        with self.cursor('create_tables', "FAILED TO CREATE TABLES") as cursor:
+            # Files from before seasons: their tables are set aside and their rows become season 1's below (SQLite can't
+            # change a primary key in place)
+            columns = {row[1] for row in cursor.execute("PRAGMA table_info(user_answers);").fetchall()}
+            unseasoned = bool(columns) and 'season' not in columns
+            if unseasoned:
+                for table in ('user_answers', 'leaderboard', 'question_stats'):
+                    cursor.execute(f"ALTER TABLE {table} RENAME TO {table}_unseasoned;")
+                for index in ('user_answers_question_id', 'leaderboard_rank', 'question_stats_correct'):
+                    cursor.execute(f"DROP INDEX IF EXISTS {index};")
+
+            # TABLE: users
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS users (
+                    id INTEGER PRIMARY KEY,
+                    username TEXT NOT NULL UNIQUE,
+                    password TEXT NOT NULL,
+                    email TEXT NOT NULL,
+                    dob TEXT NOT NULL
+                )
+            """)
+
+            # TABLE: seasons
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS seasons (
+                    id INTEGER PRIMARY KEY,
+                    started_timestamp REAL NOT NULL
+                )
+            """)
+            cursor.execute("INSERT OR IGNORE INTO seasons (id, started_timestamp) VALUES (1, ?);", (time.time(),))
+
+            # TABLE: players (a user's progress through a season)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS players (
+                    season INT NOT NULL REFERENCES seasons (id),
+                    user_id INT NOT NULL REFERENCES users (id),
+                    questions_solved INT NOT NULL DEFAULT 0,
+                    last_question_id INT NOT NULL DEFAULT 0,
+                    play_timestamp REAL,
+                    PRIMARY KEY (season, user_id)
+                )
+            """)
+
+            # TABLE: questions
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS questions (
+                    id INTEGER PRIMARY KEY,
+                    question TEXT NOT NULL,
+                    answer_1 TEXT NOT NULL,
+                    answer_2 TEXT NOT NULL,
+                    answer_3 TEXT NOT NULL,
+                    answer_4 TEXT NOT NULL,
+                    correct_answer INT NOT NULL
+                )
+            """)
+
+            # TABLE: user_answers
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS user_answers (
+                    season INT NOT NULL,
+                    user_id INT NOT NULL REFERENCES users (id),
+                    question_id INT NOT NULL REFERENCES questions (id),
+                    is_correct INT NOT NULL,
+                    answer_timestamp REAL,
+                    PRIMARY KEY (season, user_id, question_id)
+                )
+            """)
+            cursor.execute("CREATE INDEX IF NOT EXISTS user_answers_question_id ON user_answers (question_id);")
+
+            # TABLE: leaderboard
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS leaderboard (
+                    season INT NOT NULL REFERENCES seasons (id),
+                    user_id INT NOT NULL REFERENCES users (id),
+                    correct_answers INT NOT NULL DEFAULT 0,
+                    play_timestamp REAL,
+                    last_answer_timestamp REAL,
+                    PRIMARY KEY (season, user_id)
+                )
+            """)
+            cursor.execute("CREATE INDEX IF NOT EXISTS leaderboard_rank ON leaderboard (season, (-correct_answers), (last_answer_timestamp - play_timestamp), user_id);")
+
+            # TABLE: question_stats
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS question_stats (
+                    season INT NOT NULL REFERENCES seasons (id),
+                    question_id INT NOT NULL REFERENCES questions (id) ON DELETE CASCADE,
+                    correct_answers INT NOT NULL DEFAULT 0,
+                    incorrect_answers INT NOT NULL DEFAULT 0,
+                    PRIMARY KEY (season, question_id)
+                )
+            """)
+            cursor.execute("CREATE INDEX IF NOT EXISTS question_stats_correct ON question_stats (season, correct_answers);")
+
+            if unseasoned:
+                cursor.execute("INSERT INTO user_answers SELECT 1, user_id, question_id, is_correct, answer_timestamp FROM user_answers_unseasoned;")
+                cursor.execute("INSERT INTO leaderboard SELECT 1, user_id, correct_answers, play_timestamp, last_answer_timestamp FROM leaderboard_unseasoned;")
+                cursor.execute("INSERT INTO question_stats SELECT 1, question_id, correct_answers, incorrect_answers FROM question_stats_unseasoned;")
+                cursor.execute("""
+                    INSERT INTO players (season, user_id, questions_solved, last_question_id, play_timestamp)
+                    SELECT 1, id, questions_solved, last_question_id, play_timestamp FROM users
+                    WHERE questions_solved <> 0 OR last_question_id <> 0 OR play_timestamp IS NOT NULL
+                """)
+                for table in ('user_answers', 'leaderboard', 'question_stats'):
+                    cursor.execute(f"DROP TABLE {table}_unseasoned;")
+                for column in ('questions_solved', 'play_timestamp', 'last_question_id'):
+                    cursor.execute(f"ALTER TABLE users DROP COLUMN {column};")
+
+            # TABLE: question_bank (change counters, see migration #6 of the PostgreSQL schema)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS question_bank (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    version INT NOT NULL,
+                    generation INT NOT NULL,
+                    questions INT NOT NULL
+                )
+            """)
+            cursor.execute("INSERT OR IGNORE INTO question_bank (id, version, generation, questions) SELECT 1, 1, 1, COUNT(*) FROM questions;")
+            cursor.execute("CREATE TRIGGER IF NOT EXISTS question_bank_inserted AFTER INSERT ON questions BEGIN UPDATE question_bank SET version = version + 1, questions = questions + 1; END;")
+            cursor.execute("CREATE TRIGGER IF NOT EXISTS question_bank_deleted AFTER DELETE ON questions BEGIN UPDATE question_bank SET version = version + 1, generation = generation + 1, questions = questions - 1; END;")
+            cursor.execute("CREATE TRIGGER IF NOT EXISTS question_bank_updated AFTER UPDATE ON questions BEGIN UPDATE question_bank SET version = version + 1, generation = generation + 1; END;")
+
+    def is_password_matching(self, username: str, password: str) -> bool:
+        with self.cursor('is_password_matching', commit=False) as cursor:
+            result = cursor.execute("SELECT password FROM users WHERE username = ?;", (username,)).fetchone()
+        if result is None or not self.hasher.check(password, result[0]):
+            return False
+        if self.hasher.needs_rehash(result[0]):
+            new_password = self.hasher.hash(password)
+            with self.cursor('is_password_matching') as cursor:
+                cursor.execute("UPDATE users SET password = ? WHERE username = ? AND password = ?;", (new_password, username, result[0]))
+        return True
+
+    def get_user_id(self, username: str) -> int | None:
+        with self.cursor('get_user_id', commit=False) as cursor:
+            result = cursor.execute("SELECT id FROM users WHERE username = ?;", (username,)).fetchone()
+            return result[0] if result else None
+
+    def create_user(self, username: str, password: str, email: str, dob: date) -> int | None:
+        hashed_password = self.hasher.hash(password)
+        with self.cursor('create_user') as cursor:
+            result = cursor.execute("""
+                INSERT INTO users (username, password, email, dob) VALUES (?, ?, ?, ?)
+                ON CONFLICT (username) DO NOTHING
+                RETURNING id
+            """, (username, hashed_password, email, dob.isoformat())).fetchone()
+            return result[0] if result else None
+
+    def get_user_questions_solved(self, user_id: int) -> int:
+        with self.cursor('get_user_questions_solved', commit=False) as cursor:
+            return cursor.execute(f"SELECT COALESCE((SELECT questions_solved FROM players WHERE season = {SQLITE_CURRENT_SEASON} AND user_id = ?), 0);", (user_id,)).fetchone()[0]
+
+    def get_user_statistics(self, user_id: int) -> tuple | None:
+        with self.cursor('get_user_statistics', commit=False) as cursor:
+            result = cursor.execute(f"""
+                SELECT u.id, u.username, u.password, u.email, u.dob, COALESCE(p.questions_solved, 0), p.play_timestamp, COALESCE(l.correct_answers, 0)
+                FROM users u
+                LEFT JOIN players p ON p.season = {SQLITE_CURRENT_SEASON} AND p.user_id = u.id
+                LEFT JOIN leaderboard l ON l.season = {SQLITE_CURRENT_SEASON} AND l.user_id = u.id
+                WHERE u.id = ?
+            """, (user_id,)).fetchone()
+        if result is None:
+            return None
+        return (*result[:4], date.fromisoformat(result[4]), result[5], self._timestamp(result[6]), result[7])
+
+    def get_user_answers(self, user_id: int) -> list[tuple]:
+        with self.cursor('get_user_answers', commit=False) as cursor:
+            return self._report_rows(REPORT_USER_ANSWERS, cursor.execute(SQLITE_REPORTS[REPORT_USER_ANSWERS], (None, user_id)).fetchall())
+
+    def get_user_question_ids(self, user_id: int) -> list[int]:
+        with self.cursor('get_user_question_ids', commit=False) as cursor:
+            return [row[0] for row in cursor.execute(f"SELECT question_id FROM user_answers WHERE season = {SQLITE_CURRENT_SEASON} AND user_id = ? ORDER BY question_id;", (user_id,))]
+
+    def create_question(self, question: str, answer_1: str, answer_2: str, answer_3: str, answer_4: str, correct_answer: int) -> int | None:
+        check_correct_answer(correct_answer)
+        with self.cursor('create_question') as cursor:
+            cursor.execute("INSERT INTO questions (question, answer_1, answer_2, answer_3, answer_4, correct_answer) VALUES (?, ?, ?, ?, ?, ?);",
+                           (question, answer_1, answer_2, answer_3, answer_4, correct_answer))
+            return cursor.lastrowid
+
+    def get_questions(self, after_id: int = 0, limit: int = 10_000) -> list[tuple]:
+        with self.cursor('get_questions', commit=False) as cursor:
+            return cursor.execute("SELECT * FROM questions WHERE id > ? ORDER BY id LIMIT ?;", (after_id, limit)).fetchall()
+
+    def get_question_bank_version(self) -> tuple[int, int, int]:
+        with self.cursor('get_question_bank_version', commit=False) as cursor:
+            return cursor.execute("SELECT version, generation, questions FROM question_bank;").fetchone()
+
+    def get_user_question(self, user_id: int) -> tuple | None:
+        with self.cursor('get_user_question', commit=False) as cursor:
+            return self._next_question(cursor, user_id)
+
+    def handle_user_answer(self, user_id: int, question_id: int, answer: int) -> bool:
+        with self.cursor('handle_user_answer') as cursor:
+            return self._answer(cursor, user_id, question_id, answer, time.time())
+
+    def play_step(self, user_id: int, question_id: int | None = None, answer: int | None = None) -> tuple[bool | None, tuple | None]:
+        with self.cursor('play_step') as cursor:
+            now = time.time()
+            cursor.execute(f"""
+                INSERT INTO players (season, user_id, play_timestamp) VALUES ({SQLITE_CURRENT_SEASON}, ?, ?)
+                ON CONFLICT (season, user_id) DO UPDATE SET play_timestamp = excluded.play_timestamp WHERE play_timestamp IS NULL
+            """, (user_id, now))
+            is_correct = self._answer(cursor, user_id, question_id, answer, now) if question_id is not None else None
+            return is_correct, self._next_question(cursor, user_id)
+
+    def record_answers(self, answers: list[tuple[int, int, bool, datetime]]) -> int:
+        recorded: int = 0
+        with self.cursor('record_answers') as cursor:
+            season = self._season(cursor)
+            for user_id, question_id, is_correct, answer_timestamp in answers:
+                if cursor.execute("""
+                    SELECT EXISTS (SELECT 1 FROM user_answers WHERE season = ? AND user_id = ? AND question_id = ?)
+                        OR NOT EXISTS (SELECT 1 FROM users WHERE id = ?)
+                        OR NOT EXISTS (SELECT 1 FROM questions WHERE id = ?)
+                """, (season, user_id, question_id, user_id, question_id)).fetchone()[0]:
+                    continue
+                self._record(cursor, season, user_id, question_id, is_correct, answer_timestamp.timestamp())
+                recorded += 1
+        return recorded
+
+    def reset_user_answers(self, user_id: int):
+        with self.cursor('reset_user_answers') as cursor:
+            season = self._season(cursor)
+            cursor.execute("""
+                UPDATE question_stats SET
+                    correct_answers = correct_answers - (SELECT COUNT(*) FROM user_answers ua WHERE ua.season = ?1 AND ua.user_id = ?2 AND ua.question_id = question_stats.question_id AND ua.is_correct),
+                    incorrect_answers = incorrect_answers - (SELECT COUNT(*) FROM user_answers ua WHERE ua.season = ?1 AND ua.user_id = ?2 AND ua.question_id = question_stats.question_id AND NOT ua.is_correct)
+                WHERE season = ?1 AND question_id IN (SELECT question_id FROM user_answers WHERE season = ?1 AND user_id = ?2)
+            """, (season, user_id))
+            for table in ('user_answers', 'leaderboard', 'players'):
+                cursor.execute(f"DELETE FROM {table} WHERE season = ? AND user_id = ?;", (season, user_id))
+
+    def get_hall_of_fame(self, limit: int = 10, offset: int = 0, season: int | None = None) -> list[tuple]:
+        with self.cursor('get_hall_of_fame', commit=False) as cursor:
+            rows = cursor.execute(f"""
+                SELECT u.username, l.correct_answers, l.last_answer_timestamp - l.play_timestamp
+                FROM leaderboard l
+                JOIN users u ON l.user_id = u.id
+                WHERE l.season = COALESCE(?, {SQLITE_CURRENT_SEASON})
+                ORDER BY -l.correct_answers, l.last_answer_timestamp - l.play_timestamp NULLS LAST, l.user_id
+                LIMIT ? OFFSET ?
+            """, (season, limit, offset)).fetchall()
+        return [(offset + position, username, correct_answers, format_playtime(timedelta(seconds=playtime) if playtime is not None else None))
+                for position, (username, correct_answers, playtime) in enumerate(rows, 1)]
+
+    def get_user_rank(self, user_id: int) -> int | None:
+        with self.cursor('get_user_rank', commit=False) as cursor:
+            result = cursor.execute(f"""
+                SELECT 1 + (
+                    SELECT COUNT(*) FROM leaderboard l
+                    WHERE l.season = me.season
+                      AND (-l.correct_answers, l.last_answer_timestamp - l.play_timestamp, l.user_id)
+                        < (-me.correct_answers, me.last_answer_timestamp - me.play_timestamp, me.user_id)
+                )
+                FROM leaderboard me
+                WHERE me.season = {SQLITE_CURRENT_SEASON} AND me.user_id = ?
+            """, (user_id,)).fetchone()
+            return result[0] if result else None
+
+    def count_players(self) -> int:
+        with self.cursor('count_players', commit=False) as cursor:
+            return cursor.execute(f"SELECT COUNT(*) FROM players WHERE season = {SQLITE_CURRENT_SEASON} AND questions_solved <> 0;").fetchone()[0]
+
+    def get_season(self) -> int:
+        with self.cursor('get_season', commit=False) as cursor:
+            return self._season(cursor)
+
+    def start_season(self) -> int:
+        with self.cursor('start_season', "FAILED TO START A NEW SEASON") as cursor:
+            return cursor.execute("INSERT INTO seasons (id, started_timestamp) SELECT MAX(id) + 1, ? FROM seasons RETURNING id;", (time.time(),)).fetchone()[0]
+
+    def open_report(self, report: str, params: tuple = (), page_size: int = REPORT_PAGE_SIZE, season: int | None = None) -> Pager:
+        # Every page is its own LIMIT/OFFSET read, so the shared connection isn't held between pages
+        query = SQLITE_REPORTS[report]
+        params = (season, *params)
+
+        def count() -> int:
+            with self.cursor('open_report', commit=False) as cursor:
+                return cursor.execute(f"SELECT COUNT(*) FROM ({query})", params).fetchone()[0]
+
+        def fetch(limit: int, offset: int) -> list[tuple]:
+            with self.cursor('open_report', commit=False) as cursor:
+                return self._report_rows(report, cursor.execute(f"{query} LIMIT ? OFFSET ?", (*params, limit, offset)).fetchall())
+        return Pager(fetch, count, page_size)
+
+    @staticmethod
+    def _report_rows(report: str, rows: list[tuple]) -> list[tuple]:
+        # SQLite has no booleans
+        if report == REPORT_USER_ANSWERS:
+            return [(question, bool(is_correct)) for question, is_correct in rows]
+        return rows
+
+    @staticmethod
+    def _timestamp(value: float | None) -> datetime | None:
+        return datetime.fromtimestamp(value, timezone.utc) if value is not None else None
+
+    @staticmethod
+    def _season(cursor: sqlite3.Cursor) -> int:
+        return cursor.execute(f"SELECT {SQLITE_CURRENT_SEASON};").fetchone()[0]
+
+    @staticmethod
+    def _next_question(cursor: sqlite3.Cursor, user_id: int) -> tuple | None:
+        return cursor.execute(f"""
+            SELECT * FROM questions WHERE id > COALESCE((SELECT last_question_id FROM players WHERE season = {SQLITE_CURRENT_SEASON} AND user_id = ?), 0)
+            ORDER BY id LIMIT 1
+        """, (user_id,)).fetchone()
+
+    @staticmethod
+    def _answer(cursor: sqlite3.Cursor, user_id: int, question_id: int, answer: int, now: float) -> bool:
+        # Same steps as the `handle_user_answer` plpgsql function
+        season = SQLiteStorage._season(cursor)
+        result = cursor.execute("SELECT correct_answer FROM questions WHERE id = ?;", (question_id,)).fetchone()
+        is_correct = result is not None and answer == result[0]
+        recorded = cursor.execute("SELECT is_correct FROM user_answers WHERE season = ? AND user_id = ? AND question_id = ?;", (season, user_id, question_id)).fetchone()
+        if recorded is not None:
+            return bool(recorded[0])
+        SQLiteStorage._record(cursor, season, user_id, question_id, is_correct, now)
+        return is_correct
+
+    @staticmethod
+    def _record(cursor: sqlite3.Cursor, season: int, user_id: int, question_id: int, is_correct: bool, now: float):
+        cursor.execute("INSERT INTO user_answers (season, user_id, question_id, is_correct, answer_timestamp) VALUES (?, ?, ?, ?, ?);", (season, user_id, question_id, is_correct, now))
+        cursor.execute("""
+            INSERT INTO players (season, user_id, questions_solved, last_question_id) VALUES (?, ?, 1, ?)
+            ON CONFLICT (season, user_id) DO UPDATE SET
+                questions_solved = questions_solved + 1,
+                last_question_id = MAX(last_question_id, excluded.last_question_id)
+        """, (season, user_id, question_id))
+        if is_correct:
+            cursor.execute("""
+                INSERT INTO leaderboard (season, user_id, correct_answers, play_timestamp, last_answer_timestamp)
+                SELECT season, user_id, 1, play_timestamp, ? FROM players WHERE season = ? AND user_id = ?
+                ON CONFLICT (season, user_id) DO UPDATE SET
+                    correct_answers = correct_answers + 1,
+                    play_timestamp = excluded.play_timestamp,
+                    last_answer_timestamp = excluded.last_answer_timestamp
+            """, (now, season, user_id))
+        cursor.execute("""
+            INSERT INTO question_stats (season, question_id, correct_answers, incorrect_answers) VALUES (?, ?, ?, ?)
+            ON CONFLICT (season, question_id) DO UPDATE SET
+                correct_answers = correct_answers + excluded.correct_answers,
+                incorrect_answers = incorrect_answers + excluded.incorrect_answers
+        """, (season, question_id, int(is_correct), int(not is_correct)))
\ No newline at end of file
@@ -0,0 +1,62 @@
+import os
+import sys
+from typing import Callable
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import psycopg2
+
+import cache
+import database
+import hashing
+import storage
+
+ENGINES: tuple[str, ...] = ('memory', 'sqlite', 'postgres')
+# Dropped and created again by every test that uses it
+SCRATCH_DB: str = f"{database.DB_NAME}_conformance"
+# Connection string of the server the postgres tests run on (the DB_* settings when unset), and of a streaming replica of
+# it for the replica routing tests (skipped when unset)
+TEST_DSN: str | None = os.environ.get('TRIVIA_TEST_DSN')
+TEST_REPLICA_DSN: str | None = os.environ.get('TRIVIA_TEST_REPLICA_DSN')
+
+
+def scratch_database(**kwargs) -> database.Database:
+    """A `Database` on the empty scratch database, the test is skipped when no server is reachable."""
+    try:
+        database.Database(dbname=SCRATCH_DB, dsn=TEST_DSN).drop_database()
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"no PostgreSQL server: {e}")
+    return database.Database(hasher=hashing.PasswordHasher(4, 0), dbname=SCRATCH_DB, dsn=TEST_DSN, **kwargs)
+
+
+@pytest.fixture
+def open_scratch(tmp_path) -> Callable[[str], storage.Storage]:
+    """Opens a store of an engine (not connected): a fresh in-memory one, or the test's SQLite file or scratch database,
+    which every store opened again shares like another process would."""
+    def open_scratch(engine: str) -> storage.Storage:
+        if engine == 'postgres':
+            return database.Database(hasher=hashing.PasswordHasher(4, 0), dbname=SCRATCH_DB, dsn=TEST_DSN)
+        if engine == 'sqlite':
+            return storage.SQLiteStorage(str(tmp_path / 'trivia.sqlite3'), hashing.PasswordHasher(4, 0))
+        return storage.MemoryStorage(hashing.PasswordHasher(4, 0))
+    return open_scratch
+
+
+@pytest.fixture(params=ENGINES)
+def engine(request) -> str:
+    if request.param == 'postgres':
+        scratch_database()
+    return request.param
+
+
+@pytest.fixture(params=(False, True), ids=('bare', 'cached'))
+def scratch(request, engine, open_scratch) -> storage.Storage:
+    # Every engine bare and behind the query cache, which has to invalidate exactly like the engine changes
+    store = open_scratch(engine)
+    if request.param:
+        store = cache.CachedStorage(store, cache.QueryCache(ttl=3600))
+    store.connect()
+    yield store
+    store.disconnect()
\ No newline at end of file
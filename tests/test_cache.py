@@ -0,0 +1,30 @@
+from datetime import date
+
+from cache import CachedStorage, QueryCache
+from storage import REPORT_MOST_ACTIVE_USERS, Pager
+
+
+def test_report_pages_are_cached(open_scratch):
+    # The statistics menus page through reports, reading a page again must not go back to the storage until a write
+    bare = open_scratch('memory')
+    opened: list[str] = []
+    open_report = bare.open_report
+
+    def counted_open_report(report: str, *args) -> Pager:
+        opened.append(report)
+        return open_report(report, *args)
+    bare.open_report = counted_open_report
+    storage = CachedStorage(bare, QueryCache(ttl=3600))
+    storage.connect()
+    user_id = storage.create_user('pager', 'pager1!', 'pager@example.com', date(2000, 1, 1))
+    question_id = storage.create_question('Cached report question?', 'A', 'B', 'C', 'D', 1)
+    for _ in range(2):
+        with storage.open_report(REPORT_MOST_ACTIVE_USERS, page_size=1) as pager:
+            assert (pager.total, pager.page(0)) == (0, [])
+    assert len(opened) == 1, "second read served from the cache"
+
+    storage.handle_user_answer(user_id, question_id, 1)
+    with storage.open_report(REPORT_MOST_ACTIVE_USERS, page_size=1) as pager:
+        assert (pager.total, pager.page(0)) == (1, [('pager', 1)]), "an answer invalidates the report"
+    assert len(opened) == 2
+    storage.disconnect()
\ No newline at end of file
@@ -0,0 +1,97 @@
+import random
+import threading
+from datetime import date
+
+from conftest import scratch_database
+from storage import REPORT_USER_ANSWERS
+
+
+def test_open_report_holds_no_connection():
+    # An admin reading a report page must not keep one of the pooled connections (or a transaction) from the players
+    db = scratch_database(pool_size=1, pool_timeout=1.0)
+    db.connect()
+    try:
+        user_id = db.create_user('reader', 'reader1!', 'reader@example.com', date(2000, 1, 1))
+        question_ids = [db.create_question(f'Report question #{n}?', 'A', 'B', 'C', 'D', 1) for n in range(3)]
+        for question_id in question_ids:
+            db.handle_user_answer(user_id, question_id, 1)
+        with db.open_report(REPORT_USER_ANSWERS, (user_id,), page_size=2) as pager:
+            assert pager.page(0) == [('Report question #0?', True), ('Report question #1?', True)]
+            assert db.get_user_id('reader') == user_id
+            db.handle_user_answer(user_id, question_ids[0], 1)
+            assert pager.page(1) == [('Report question #2?', True)]
+    finally:
+        db.disconnect()
+
+
+def test_report_pages_jump_and_go_back():
+    # A page far ahead skips the rows after the last key seen on a cursor, going back starts from the keys remembered
+    db = scratch_database()
+    db.connect()
+    try:
+        user_id = db.create_user('pager', 'pager1!', 'pager@example.com', date(2000, 1, 1))
+        for n in range(7):
+            db.handle_user_answer(user_id, db.create_question(f'Paged question #{n}?', 'A', 'B', 'C', 'D', 1), n % 2 + 1)
+        rows = db.get_user_answers(user_id)
+        assert rows[:2] == [('Paged question #0?', True), ('Paged question #1?', False)]
+        with db.open_report(REPORT_USER_ANSWERS, (user_id,), page_size=2) as pager:
+            assert pager.page(2) == rows[4:6]
+            assert pager.page(3) == rows[6:]
+            assert pager.page(1) == rows[2:4]
+            assert pager.page(0) == rows[:2]
+            assert pager.page(4) == []
+            assert (pager.total, pager.pages) == (7, 4)
+    finally:
+        db.disconnect()
+
+
+def test_deallocated_statements_are_prepared_again():
+    # DISCARD ALL, a pooler or anything else may drop the PREPAREd statements of a connection without us knowing
+    db = scratch_database(pool_size=1)
+    db.connect()
+    try:
+        user_id = db.create_user('prepared', 'prepared1!', 'prepared@example.com', date(2000, 1, 1))
+        question_id = db.create_question('Prepared question?', 'A', 'B', 'C', 'D', 1)
+        assert db.get_user_id('prepared') == user_id
+        db.query("DEALLOCATE ALL;")
+        assert db.get_user_id('prepared') == user_id
+        db.query("DEALLOCATE ALL;")
+        assert db.handle_user_answer(user_id, question_id, 1)
+        assert db.get_user_questions_solved(user_id) == 1
+    finally:
+        db.disconnect()
+
+
+def test_reset_during_answers_does_not_deadlock():
+    # Resets take their locks in the order the answers do, anything else deadlocks (and gets rolled back) under load
+    db = scratch_database(pool_size=20)
+    db.connect()
+    errors: list[str] = []
+    try:
+        question_ids = [db.create_question(f'Lock question #{n}?', 'A', 'B', 'C', 'D', 1) for n in range(30)]
+        user_ids = [db.create_user(f'locker_{n}', 'locker1!', 'locker@example.com', date(2000, 1, 1)) for n in range(6)]
+
+        def answer(user_id: int, seed: int):
+            generator = random.Random(seed)
+            try:
+                for _ in range(200):
+                    db.handle_user_answer(user_id, generator.choice(question_ids), 1)
+            except Exception as e:
+                errors.append(f"answers of user #{user_id}: {e!r}")
+
+        def reset(user_id: int):
+            try:
+                for _ in range(100):
+                    db.reset_user_answers(user_id)
+            except Exception as e:
+                errors.append(f"resets of user #{user_id}: {e!r}")
+
+        workers = [threading.Thread(target=answer, args=(user_id, seed)) for seed, user_id in enumerate(user_ids * 2)]
+        workers += [threading.Thread(target=reset, args=(user_id,)) for user_id in user_ids]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+    finally:
+        db.disconnect()
+    assert errors == []
\ No newline at end of file
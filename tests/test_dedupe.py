@@ -0,0 +1,57 @@
+import threading
+
+from dedupe import SharedDuplicateIndex
+
+
+def test_shared_index_follows_the_bank(open_scratch):
+    storage = open_scratch('sqlite')
+    storage.connect()
+    try:
+        first = storage.create_question('What is the capital city of France?', 'Paris', 'Lyon', 'Nice', 'Lille', 1)
+        duplicates = SharedDuplicateIndex(storage)
+        assert not duplicates.built
+        assert [match[0] for match in duplicates.find('What is the capital city of France')] == [first]
+
+        # Created by a session of this process
+        added = storage.create_question('Which planet is known as the red planet?', 'Mars', 'Venus', 'Earth', 'Pluto', 1)
+        duplicates.add(added, 'Which planet is known as the red planet?')
+        index = duplicates.index
+        assert [match[0] for match in duplicates.find('Which planet is known as the red planet')] == [added]
+        assert duplicates.index is index, "added questions don't rebuild the index"
+
+        # Created by another process, only the bank version tells
+        elsewhere = storage.create_question('Who wrote the play Romeo and Juliet?', 'Shakespeare', 'Marlowe', 'Jonson', 'Kyd', 1)
+        assert [match[0] for match in duplicates.find('Who wrote the play Romeo and Juliet')] == [elsewhere]
+    finally:
+        storage.disconnect()
+
+
+def test_rebuild_does_not_hold_up_finds(open_scratch):
+    storage = open_scratch('sqlite')
+    storage.connect()
+    try:
+        first = storage.create_question('What is the capital city of France?', 'Paris', 'Lyon', 'Nice', 'Lille', 1)
+        duplicates = SharedDuplicateIndex(storage)
+        duplicates.find('What is the capital city of France')
+        elsewhere = storage.create_question('Who wrote the play Romeo and Juliet?', 'Shakespeare', 'Marlowe', 'Jonson', 'Kyd', 1)
+
+        # The next find rebuilds, reading the bank stalls until released
+        get_questions = storage.get_questions
+        reading, release = threading.Event(), threading.Event()
+
+        def stalled_get_questions(*args) -> list[tuple]:
+            reading.set()
+            release.wait(5)
+            return get_questions(*args)
+        storage.get_questions = stalled_get_questions
+        found: list[list[tuple[int, float]]] = []
+        rebuild = threading.Thread(target=lambda: found.append(duplicates.find('Who wrote the play Romeo and Juliet')))
+        rebuild.start()
+        assert reading.wait(5)
+        assert [match[0] for match in duplicates.find('What is the capital city of France')] == [first], "served by the old index"
+        assert rebuild.is_alive(), "didn't wait for the rebuild"
+        release.set()
+        rebuild.join()
+        assert [match[0] for match in found[0]] == [elsewhere]
+    finally:
+        storage.disconnect()
\ No newline at end of file
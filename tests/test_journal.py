@@ -0,0 +1,111 @@
+import os
+import functools
+import multiprocessing
+from datetime import date
+from typing import Callable
+
+import pytest
+
+from conftest import scratch_database
+from journal import JOURNAL_RECORD, AnswerJournal, JournaledStorage
+from question_store import QuestionStore
+from storage import REPORT_QUESTION_STATISTICS, Storage
+from test_storage import check_concurrent_answers
+
+
+def crash_after_answers(open_storage: Callable[[], Storage], path: str, user_id: int, answers: list[tuple[int, int]], flushed: int):
+    # Child process of `test_recovery`: flush the first `flushed` answers, journal the rest, leave a torn record and die
+    storage = open_storage()
+    questions = QuestionStore(storage)
+    journaled = JournaledStorage(storage, questions, AnswerJournal(storage, path, flush_interval=3600))
+    journaled.connect()
+    questions.refresh()
+    for question_id, answer in answers[:flushed]:
+        journaled.handle_user_answer(user_id, question_id, answer)
+    journaled.journal.sync()
+    for question_id, answer in answers[flushed:]:
+        journaled.handle_user_answer(user_id, question_id, answer)
+    os.write(journaled.journal.fd, JOURNAL_RECORD.pack(user_id, 0, True, 0.0, 0)[:7])
+    os._exit(0)
+
+
+@pytest.mark.parametrize('engine', ('sqlite', 'postgres'))
+def test_recovery(engine: str, open_scratch, tmp_path):
+    # Crash a process with journaled answers, then check they all come back once. The store has to outlive the process
+    if engine == 'postgres':
+        scratch_database()
+    open_storage = functools.partial(open_scratch, engine)
+    path = str(tmp_path / 'trivia.journal')
+    storage = open_storage()
+    storage.connect()
+    question_ids = [storage.create_question(f'Journal question #{n}?', 'A', 'B', 'C', 'D', 1) for n in range(10)]
+    user_id = storage.create_user('journal', 'journal1!', 'journal@example.com', date(2000, 1, 1))
+    storage.play_step(user_id)
+    # Every third answer is wrong, the first four make it to the storage before the crash
+    answers = [(question_id, 1 if n % 3 else 2) for n, question_id in enumerate(question_ids)]
+    storage.disconnect()
+
+    child = multiprocessing.get_context('fork').Process(target=crash_after_answers, args=(open_storage, path, user_id, answers, 4))
+    child.start()
+    child.join()
+    assert child.exitcode == 0, "crashed process exit code"
+
+    storage = open_storage()
+    storage.connect()
+    assert storage.get_user_questions_solved(user_id) == 4, "answers flushed before the crash"
+    storage.disconnect()
+
+    for attempt in ("replay", "replay without a checkpoint"):
+        storage = open_storage()
+        questions = QuestionStore(storage)
+        journaled = JournaledStorage(storage, questions, AnswerJournal(storage, path))
+        journaled.connect()
+        assert journaled.journal.sync(), f"{attempt} drained"
+        statistics = journaled.get_user_statistics(user_id)
+        assert (statistics[5], statistics[7]) == (len(answers), sum(1 for _, answer in answers if answer == 1)), f"{attempt} answers"
+        assert sum(row[1] for row in journaled.stream_report(REPORT_QUESTION_STATISTICS)) == len(answers), f"{attempt} question counters"
+        assert os.path.getsize(path) % JOURNAL_RECORD.size == 0, f"{attempt} torn record dropped"
+        journaled.disconnect()
+        # Simulate a crash between the commit and the checkpoint: everything gets replayed, nothing may count twice
+        os.remove(f'{path}.checkpoint')
+
+
+def test_failing_answers_are_rejected(open_scratch, tmp_path):
+    # An answer the storage refuses for good must not hold up the ones after it, nor every read waiting on the journal
+    storage = open_scratch('sqlite')
+    storage.connect()
+    path = str(tmp_path / 'trivia.journal')
+    journal = AnswerJournal(storage, path)
+    try:
+        question_ids = [storage.create_question(f'Rejected question #{n}?', 'A', 'B', 'C', 'D', 1) for n in range(3)]
+        user_id = storage.create_user('rejected', 'rejected1!', 'rejected@example.com', date(2000, 1, 1))
+        record_answers = storage.record_answers
+
+        def refusing_record_answers(answers: list[tuple]) -> int:
+            if any(question_id == question_ids[1] for _, question_id, _, _ in answers):
+                raise ValueError("refused")
+            return record_answers(answers)
+        storage.record_answers = refusing_record_answers
+        journal.open()
+        for question_id in question_ids:
+            journal.append(user_id, question_id, True, 0.0)
+        assert journal.sync(5), "drained"
+        assert journal.stats()['rejected'] == 1
+        assert storage.get_user_question_ids(user_id) == [question_ids[0], question_ids[2]]
+        assert os.path.getsize(f'{path}.rejected') == JOURNAL_RECORD.size
+        with open(f'{path}.checkpoint') as file:
+            assert int(file.read()) == 3 * JOURNAL_RECORD.size, "checkpoint past the rejected answer"
+    finally:
+        journal.close()
+        storage.disconnect()
+
+
+def test_concurrent_answers(engine: str, open_scratch, tmp_path):
+    # The question store only learns about the questions on its first check, so the answers start out synchronous
+    storage = open_scratch(engine)
+    journaled = JournaledStorage(storage, QuestionStore(storage, check_interval=0), AnswerJournal(storage, str(tmp_path / 'trivia.journal')))
+    journaled.connect()
+    try:
+        check_concurrent_answers(journaled)
+    finally:
+        journaled.disconnect()
\ No newline at end of file
@@ -0,0 +1,63 @@
+import json
+
+import pytest
+
+from conftest import scratch_database
+
+# Hot queries and the index each of them has to be able to use
+INDEXED_QUERIES: list[tuple[str, str, tuple, str]] = [
+    ("login / get_user_id", "SELECT id FROM users WHERE username = %s", ('admin',), 'users_username_key'),
+    ("is_password_matching", "SELECT password FROM users WHERE username = %s", ('admin',), 'users_username_key'),
+    ("create_user", "INSERT INTO users (username, password, email, dob) VALUES (%s, 'x', 'x', DATE '2000-01-01') ON CONFLICT (username) DO NOTHING RETURNING id",
+     ('admin',), 'users_username_key'),
+    ("get_user_question", "SELECT * FROM questions WHERE id > %s ORDER BY id ASC LIMIT 1", (0,), 'questions_pkey'),
+    ("player progress", "SELECT questions_solved FROM players WHERE season = %s AND user_id = %s", (1, 1), 'players_pkey'),
+    ("correct answers of a user", "SELECT COUNT(*) FROM user_answers WHERE season = %s AND user_id = %s AND is_correct = TRUE", (1, 1), 'user_answers_correct'),
+    ("answered questions of a user", "SELECT question_id FROM user_answers WHERE season = %s AND user_id = %s ORDER BY question_id", (1, 1), 'user_answers_pkey'),
+    ("answers of a question", "SELECT COUNT(*) FROM user_answers WHERE question_id = %s", (1,), 'user_answers_question_id'),
+    ("Hall of Fame page", "SELECT user_id FROM leaderboard WHERE season = %s ORDER BY -correct_answers, last_answer_timestamp - play_timestamp, user_id LIMIT %s", (1, 10), 'leaderboard_rank'),
+    ("hardest question", "SELECT MIN(correct_answers) FROM question_stats WHERE season = %s AND correct_answers > %s", (1, 0), 'question_stats_correct'),
+]
+
+
+@pytest.fixture(scope='module')
+def migrated():
+    db = scratch_database()
+    db.connect()
+    # Some answers for the planner to have statistics on, an empty table's guesses favour the primary keys
+    db.query("""
+        INSERT INTO questions (question, answer_1, answer_2, answer_3, answer_4, correct_answer)
+        SELECT 'Index question #' || n || '?', 'A', 'B', 'C', 'D', 1 + n % 4 FROM generate_series(1, 200) AS n;
+        INSERT INTO users (username, password, email, dob)
+        SELECT 'index_' || n, 'x', 'index@example.com', DATE '2000-01-01' FROM generate_series(1, 100) AS n;
+        INSERT INTO user_answers (season, user_id, question_id, is_correct, answer_timestamp)
+        SELECT current_season(), u.id, q.id, q.id % 3 = 0, CURRENT_TIMESTAMP FROM users u CROSS JOIN questions q WHERE q.id % 4 = u.id % 4;
+        ANALYZE;
+    """, commit=True)
+    yield db
+    db.disconnect()
+
+
+def plan_indexes(plan: dict) -> set[str]:
+    # An INSERT ... ON CONFLICT uses its arbiter index to find the conflicting row
+    indexes = {plan['Index Name']} if 'Index Name' in plan else set(plan.get('Conflict Arbiter Indexes', []))
+    for child in plan.get('Plans', []):
+        indexes |= plan_indexes(child)
+    return indexes
+
+
+@pytest.mark.parametrize('name, query, params, index', INDEXED_QUERIES, ids=[entry[0] for entry in INDEXED_QUERIES])
+def test_hot_query_uses_its_index(migrated, name: str, query: str, params: tuple, index: str):
+    # Sequential scans are disabled: on a small database the planner rightly prefers them, what matters here is that the
+    # index exists and fits the query
+    with migrated.cursor('test_hot_query_uses_its_index', commit=False) as cursor:
+        cursor.execute("SET LOCAL enable_seqscan = off;")
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {query}", params)
+        plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        used = plan_indexes(plan[0]['Plan'])
+        # A partition's index counts as the partitioned index it belongs to
+        cursor.execute("SELECT COALESCE(pg_partition_root(name::regclass), name::regclass)::TEXT FROM unnest(%s::TEXT[]) AS name", (list(used),))
+        used = {row[0] for row in cursor.fetchall()}
+    assert index in used, f"{name} uses {', '.join(sorted(used)) or 'no index'}"
\ No newline at end of file
@@ -0,0 +1,155 @@
+import time
+import threading
+from datetime import date
+
+import psycopg2
+import pytest
+
+from conftest import SCRATCH_DB, TEST_REPLICA_DSN, scratch_database
+from pool import PoolTimeout
+from replicas import Replica, ReplicaRouter
+
+# Short, so the tests don't wait long for the bound to pass
+STALENESS: float = 0.5
+REPLICA_TIMEOUT: float = 10.0
+
+
+def execute(replica: Replica, statement: str):
+    connection = replica.pool.checkout()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(statement)
+        connection.commit()
+    finally:
+        replica.pool.checkin(connection)
+
+
+def on_replica(db) -> bool:
+    # Runs where a routed read would
+    return db.query("SELECT pg_is_in_recovery();", 1)[0]
+
+
+def elsewhere(function, *args):
+    # A write from another session, which doesn't pin this thread
+    thread = threading.Thread(target=function, args=args)
+    thread.start()
+    thread.join()
+
+
+@pytest.fixture
+def routed():
+    """A `Database` on the scratch database, reading from the TRIVIA_TEST_REPLICA_DSN streaming replica of its server,
+    with a user who answered a question and two more questions."""
+    if not TEST_REPLICA_DSN:
+        pytest.skip("TRIVIA_TEST_REPLICA_DSN isn't set")
+    db = scratch_database(replicas=(TEST_REPLICA_DSN,), max_staleness=STALENESS)
+    db.connect()
+    deadline = time.monotonic() + REPLICA_TIMEOUT
+    while not on_replica(db):
+        assert time.monotonic() < deadline, f"reads never went to the replica within {REPLICA_TIMEOUT} seconds"
+        time.sleep(db.replicas.probe_interval)
+    yield db
+    db.disconnect()
+
+
+def play(db) -> tuple[int, list[int]]:
+    user_id = db.create_user('replica_user', 'Replica-1', 'replica@example.com', date(2000, 1, 1))
+    question_ids = [db.create_question(f'Replica question {n}?', '1', '2', '3', '4', 1) for n in range(3)]
+    db.handle_user_answer(user_id, question_ids[0], 1)
+    return user_id, question_ids
+
+
+def test_writer_reads_its_own_writes(routed):
+    user_id, question_ids = play(routed)
+    assert routed.get_user_statistics(user_id)[5:8:2] == (1, 1)
+    assert not on_replica(routed), "a read right after a write went to the replica"
+
+    # The user is pinned wherever their next read comes from
+    time.sleep(STALENESS)
+    elsewhere(routed.handle_user_answer, user_id, question_ids[1], 1)
+    assert routed.get_user_statistics(user_id)[5:8:2] == (2, 2)
+    assert routed.get_user_rank(user_id) == 1
+
+
+def test_reads_go_to_a_fresh_replica(routed):
+    play(routed)
+    time.sleep(STALENESS)
+    assert on_replica(routed), f"reads don't go to the replica {STALENESS} seconds after the last write"
+    reads = routed.replicas.stats()['replica_reads']
+    assert [row[1:3] for row in routed.get_hall_of_fame()] == [('replica_user', 1)]
+    assert routed.replicas.stats()['replica_reads'] == reads + 1
+
+
+def test_lagging_replica_is_skipped(routed):
+    user_id, question_ids = play(routed)
+    time.sleep(STALENESS)
+    # With replay paused the replica falls behind the bound: reads go back to the primary and see new writes
+    for replica in routed.replicas.replicas:
+        execute(replica, "SELECT pg_wal_replay_pause();")
+    try:
+        elsewhere(routed.handle_user_answer, user_id, question_ids[1], 1)
+        time.sleep(STALENESS + routed.replicas.probe_interval)
+        assert not on_replica(routed), "reads went to a replica lagging behind the bound"
+        assert [row[1:3] for row in routed.get_hall_of_fame()] == [('replica_user', 2)]
+    finally:
+        for replica in routed.replicas.replicas:
+            execute(replica, "SELECT pg_wal_replay_resume();")
+
+
+def test_replica_failing_mid_read_falls_back_to_the_primary(routed):
+    # The fixture left reads going to the replica, the probe may still see it lagging for a moment under load
+    deadline = time.monotonic() + REPLICA_TIMEOUT
+    while not on_replica(routed):
+        assert time.monotonic() < deadline, f"reads never went to the replica within {REPLICA_TIMEOUT} seconds"
+        time.sleep(routed.replicas.probe_interval)
+    failures = routed.replicas.stats()['failures']
+
+    def terminate():
+        # Kill the read once it is running on the replica
+        connection = psycopg2.connect(TEST_REPLICA_DSN, dbname=SCRATCH_DB)
+        connection.autocommit = True
+        try:
+            with connection.cursor() as cursor:
+                deadline = time.monotonic() + REPLICA_TIMEOUT
+                while time.monotonic() < deadline:
+                    cursor.execute("SELECT pg_terminate_backend(pid) FROM pg_stat_activity WHERE query LIKE '%pg_sleep(2)%' AND pid <> pg_backend_pid();")
+                    if cursor.fetchall():
+                        return
+                    time.sleep(0.05)
+        finally:
+            connection.close()
+
+    killer = threading.Thread(target=terminate)
+    killer.start()
+    try:
+        assert routed.query("SELECT pg_is_in_recovery() FROM pg_sleep(2);", 1) == (False,), "the read was run again on the primary"
+    finally:
+        killer.join()
+    assert routed.replicas.stats()['failures'] == failures + 1
+
+
+def test_unreachable_replica_falls_back_to_the_primary():
+    db = scratch_database(replicas=('host=127.0.0.1 port=1',))
+    db.connect()
+    try:
+        assert not on_replica(db)
+        assert db.get_hall_of_fame() == []
+        stats = db.replicas.stats()
+        assert (stats['replicas_up'], stats['failures']) == (0, 1)
+    finally:
+        db.disconnect()
+
+
+def test_failed_probe_falls_back_to_the_primary():
+    # The probe samples the primary on the read path, a primary pool that is exhausted must not fail the read there
+    class ExhaustedPool:
+        def checkout(self):
+            raise PoolTimeout("no free connection")
+
+    router = ReplicaRouter(ExhaustedPool(), ('host=127.0.0.1 port=1',), psycopg2.connect, 1, 0.1, STALENESS)
+    try:
+        assert router.choose() is None
+        stats = router.stats()
+        assert (stats['probe_failures'], stats['primary_reads'], stats['replica_reads']) == (1, 1, 0)
+    finally:
+        router.close()
\ No newline at end of file
@@ -0,0 +1,168 @@
+import random
+import threading
+from datetime import date, datetime, timezone
+
+import pytest
+
+from storage import (REPORT_EASIEST_QUESTIONS, REPORT_HARDEST_QUESTIONS, REPORT_MOST_ACTIVE_USERS, REPORT_MOST_CORRECT_USERS,
+                     REPORT_QUESTION_DIFFICULTY, REPORT_QUESTION_STATISTICS, REPORT_USER_ANSWERS, Storage)
+
+
+def report(storage: Storage, name: str, params: tuple = ()) -> list[tuple]:
+    return list(storage.stream_report(name, params))
+
+
+def test_conformance(scratch: Storage):
+    # The same game on every engine
+    storage = scratch
+    version = storage.get_question_bank_version()
+    questions = [storage.create_question(f'Conformance question #{n}?', 'A', 'B', 'C', 'D', n) for n in (1, 2, 3)]
+    assert questions == sorted(set(questions)), "question ids increase"
+    rows = [(question_id, f'Conformance question #{n}?', 'A', 'B', 'C', 'D', n) for n, question_id in zip((1, 2, 3), questions)]
+    q1, q2, q3 = questions
+    assert (storage.get_questions(), storage.get_questions(q1, 1), storage.get_questions(q3)) == (rows, rows[1:2], []), "get_questions"
+    new_version = storage.get_question_bank_version()
+    assert (new_version[0] > version[0], tuple(new_version[1:])) == (True, (version[1], 3)), "get_question_bank_version after adding questions"
+    for correct_answer in (0, 5, 300):
+        with pytest.raises(ValueError):
+            storage.create_question('Out of range?', 'A', 'B', 'C', 'D', correct_answer)
+    assert storage.get_question_bank_version() == new_version, "create_question with an out of range correct_answer"
+
+    alice = storage.create_user('alice', 'alice1!', 'alice@example.com', date(2000, 1, 1))
+    bob = storage.create_user('bob', 'bob1!x', 'bob@example.com', date(2001, 2, 3))
+    assert storage.create_user('alice', 'other1!', 'x@example.com', date(2000, 1, 1)) is None, "create_user of a taken username"
+    assert (storage.get_user_id('alice'), storage.get_user_id('bob'), storage.get_user_id('nobody')) == (alice, bob, None), "get_user_id"
+    assert [storage.is_password_matching(*credentials) for credentials in (('alice', 'alice1!'), ('alice', 'wrong1!'), ('nobody', 'alice1!'))] == [True, False, False], "is_password_matching"
+    assert storage.get_user_statistics(bob)[5:6] + storage.get_user_statistics(bob)[7:] == (0, 0), "get_user_statistics without answers"
+    assert storage.get_hall_of_fame() == [], "get_hall_of_fame before anyone played"
+
+    # alice: q1 right, q2 wrong, then stops. bob: q1 right, q2 right, q3 wrong and runs out of questions
+    assert tuple(storage.play_step(alice)) == (None, rows[0]), "play_step entering the game"
+    assert storage.get_user_statistics(alice)[6] is not None, "play_step stamps the play timestamp"
+    assert tuple(storage.play_step(alice, q1, 1)) == (True, rows[1]), "play_step with a right answer"
+    assert tuple(storage.play_step(alice, q2, 4)) == (False, rows[2]), "play_step with a wrong answer"
+    assert storage.get_user_question(alice) == rows[2], "get_user_question"
+    assert [storage.handle_user_answer(alice, q2, 2), storage.play_step(alice, q1, 4)[0]] == [False, True], "handle_user_answer again keeps the first verdict"
+    storage.play_step(bob)
+    assert [storage.handle_user_answer(bob, q1, 1), storage.handle_user_answer(bob, q2, 2)] == [True, True], "handle_user_answer"
+    assert tuple(storage.play_step(bob, q3, 1)) == (False, None), "play_step past the last question"
+    assert storage.get_user_question(bob) is None, "get_user_question past the last question"
+
+    assert (storage.get_user_questions_solved(alice), storage.get_user_questions_solved(bob)) == (2, 3), "get_user_questions_solved"
+    statistics = storage.get_user_statistics(alice)
+    assert (statistics[0], statistics[1], statistics[3], statistics[4], statistics[5], statistics[7]) == (alice, 'alice', 'alice@example.com', date(2000, 1, 1), 2, 1), "get_user_statistics"
+    assert sorted(storage.get_user_answers(alice)) == [(rows[0][1], True), (rows[1][1], False)], "get_user_answers"
+    assert (storage.get_user_question_ids(alice), storage.get_user_question_ids(bob)) == ([q1, q2], [q1, q2, q3]), "get_user_question_ids"
+    assert storage.count_players() == 2, "count_players"
+    assert report(storage, REPORT_MOST_CORRECT_USERS) == [('bob', 2), ('alice', 1)], "most correct users"
+    assert report(storage, REPORT_MOST_ACTIVE_USERS) == [('bob', 3), ('alice', 2)], "most active users"
+    assert [row[:3] for row in storage.get_hall_of_fame()] == [(1, 'bob', 2), (2, 'alice', 1)], "get_hall_of_fame"
+    assert [row[:3] for row in storage.get_hall_of_fame(1, 1)] == [(2, 'alice', 1)], "get_hall_of_fame page"
+    assert all(isinstance(row[3], str) for row in storage.get_hall_of_fame()), "get_hall_of_fame playtime"
+    assert (storage.get_user_rank(bob), storage.get_user_rank(alice)) == (1, 2), "get_user_rank"
+    assert report(storage, REPORT_EASIEST_QUESTIONS) == [(rows[0][1], 2)], "easiest questions"
+    assert report(storage, REPORT_HARDEST_QUESTIONS) == [(rows[1][1], 1)], "hardest questions"
+    assert report(storage, REPORT_QUESTION_STATISTICS) == [(rows[0][1], 2, 2, 0), (rows[1][1], 2, 1, 1), (rows[2][1], 1, 0, 1)], "question statistics"
+    with storage.open_report(REPORT_QUESTION_STATISTICS, page_size=2) as pager:
+        assert (pager.total, pager.pages, pager.page(1), pager.page(0), pager.page(2)) == (3, 2, [(rows[2][1], 1, 0, 1)], [(rows[0][1], 2, 2, 0), (rows[1][1], 2, 1, 1)], []), "open_report pages"
+    with storage.open_report(REPORT_USER_ANSWERS, (alice,)) as pager:
+        assert pager.page(0) == [(rows[0][1], True), (rows[1][1], False)], "open_report with parameters"
+    with storage.open_report(REPORT_MOST_ACTIVE_USERS, page_size=1) as pager:
+        assert [pager.page(number) for number in range(pager.pages)] == [[('bob', 3)], [('alice', 2)]], "open_report of a ranking"
+    with storage.open_report(REPORT_USER_ANSWERS, (-1,)) as pager:
+        assert (pager.total, pager.pages, pager.page(0)) == (0, 1, []), "open_report without rows"
+    assert list(storage.stream_report(REPORT_QUESTION_STATISTICS, batch_size=2)) == [(rows[0][1], 2, 2, 0), (rows[1][1], 2, 1, 1), (rows[2][1], 1, 0, 1)], "stream_report"
+    assert list(storage.stream_report(REPORT_QUESTION_DIFFICULTY)) == [(q1, 2, 2), (q2, 2, 1), (q3, 1, 0)], "question difficulty"
+
+    storage.reset_user_answers(bob)
+    assert storage.get_user_questions_solved(bob) == 0, "reset_user_answers questions solved"
+    assert storage.get_user_rank(bob) is None, "reset_user_answers rank"
+    assert storage.get_user_statistics(bob)[6] is None, "reset_user_answers play timestamp"
+    assert [row[:3] for row in storage.get_hall_of_fame()] == [(1, 'alice', 1)], "get_hall_of_fame after a reset"
+    assert report(storage, REPORT_QUESTION_STATISTICS) == [(rows[0][1], 1, 1, 0), (rows[1][1], 1, 0, 1), (rows[2][1], 0, 0, 0)], "question statistics after a reset"
+    assert report(storage, REPORT_HARDEST_QUESTIONS) == [(rows[0][1], 1)], "hardest questions after a reset"
+    assert storage.count_players() == 1, "count_players after a reset"
+    assert tuple(storage.play_step(bob)) == (None, rows[0]), "play_step after a reset"
+
+    # Write-behind batch: a duplicate inside the batch, one alice already has and one of a missing user are skipped
+    now = datetime.now(timezone.utc)
+    assert storage.record_answers([(bob, q1, True, now), (bob, q1, False, now), (bob, q2, False, now), (alice, q1, False, now), (-1, q1, True, now)]) == 2, "record_answers"
+    assert (storage.get_user_questions_solved(bob), storage.get_user_statistics(bob)[7]) == (2, 1), "record_answers questions solved"
+    assert report(storage, REPORT_QUESTION_STATISTICS) == [(rows[0][1], 2, 2, 0), (rows[1][1], 2, 0, 2), (rows[2][1], 0, 0, 0)], "record_answers question counters"
+    assert storage.get_user_question(bob) == rows[2], "record_answers user cursor"
+    assert storage.get_user_rank(bob) is not None, "record_answers rank"
+    assert storage.record_answers([(bob, q1, True, now), (bob, q2, False, now)]) == 0, "record_answers replayed"
+
+    # A new season starts everyone over, the previous one stays readable
+    season = storage.get_season()
+    hall_of_fame = storage.get_hall_of_fame()
+    most_active = report(storage, REPORT_MOST_ACTIVE_USERS)
+    assert (storage.start_season(), storage.get_season()) == (season + 1, season + 1), "start_season"
+    assert storage.get_user_questions_solved(bob) == 0, "new season questions solved"
+    assert storage.get_user_question(bob) == rows[0], "new season user question"
+    assert storage.get_user_rank(bob) is None, "new season rank"
+    assert storage.get_user_statistics(bob)[5:] == (0, None, 0), "new season user statistics"
+    assert (storage.get_hall_of_fame(), storage.count_players(), report(storage, REPORT_MOST_ACTIVE_USERS)) == ([], 0, []), "new season hall of fame"
+    assert report(storage, REPORT_QUESTION_STATISTICS) == [(row[1], 0, 0, 0) for row in rows], "new season question statistics"
+    assert storage.get_user_question_ids(bob) == [], "new season question ids"
+    assert list(storage.stream_report(REPORT_QUESTION_DIFFICULTY)) == [(q1, 2, 2), (q2, 2, 0)], "question difficulty spans seasons"
+    assert storage.get_hall_of_fame(season=season) == hall_of_fame, "past season hall of fame"
+    with storage.open_report(REPORT_MOST_ACTIVE_USERS, season=season) as pager:
+        assert pager.page(0) == most_active, "past season report"
+    assert sorted(storage.stream_report(REPORT_USER_ANSWERS, (alice,), season=season)) == [(rows[0][1], True), (rows[1][1], False)], "past season stream"
+    assert tuple(storage.play_step(alice, q1, 1)) == (True, rows[1]), "new season play_step"
+    assert storage.record_answers([(alice, q1, False, now), (alice, q2, True, now)]) == 1, "new season record_answers"
+    assert (storage.get_user_questions_solved(alice), sorted(storage.get_user_answers(alice))) == (2, [(rows[0][1], True), (rows[1][1], True)]), "new season answers"
+    assert list(storage.stream_report(REPORT_QUESTION_DIFFICULTY, season=season)) == [(q1, 2, 2), (q2, 2, 0)], "question difficulty of a past season"
+    assert list(storage.stream_report(REPORT_QUESTION_DIFFICULTY)) == [(q1, 3, 3), (q2, 3, 1)], "question difficulty of the new season"
+
+
+def check_concurrent_answers(storage: Storage, threads: int = 50, questions: int = 20):
+    """Have `threads` threads answer the same questions for one user at once (as parallel sessions and client retries
+    would), then check that every answer counted once and every thread got the recorded verdict."""
+    errors: list[str] = []
+    texts = [f'Stress question #{n}?' for n in range(questions)]
+    question_ids = [storage.create_question(text, 'A', 'B', 'C', 'D', 1 + n % 4) for n, text in enumerate(texts)]
+    user_id = storage.create_user('stress', 'stress1!', 'stress@example.com', date(2000, 1, 1))
+    storage.play_step(user_id)
+    verdicts: list[dict[int, bool]] = [{} for _ in range(threads)]
+    barrier = threading.Barrier(threads)
+
+    def hammer(number: int):
+        generator = random.Random(number)
+        order = question_ids[:]
+        generator.shuffle(order)
+        try:
+            barrier.wait()
+            for question_id in order:
+                answer = generator.randint(1, 4)
+                # Half of them like sessions with the question store, half like sessions without
+                if number % 2:
+                    verdicts[number][question_id] = storage.play_step(user_id, question_id, answer)[0]
+                else:
+                    verdicts[number][question_id] = storage.handle_user_answer(user_id, question_id, answer)
+        except Exception as e:
+            errors.append(f"thread #{number}: {e!r}")
+
+    workers = [threading.Thread(target=hammer, args=(number,)) for number in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert errors == []
+    recorded = dict(storage.get_user_answers(user_id))
+    assert sorted(recorded) == sorted(texts), "answers recorded"
+    for question_id, text in zip(question_ids, texts):
+        assert {verdict[question_id] for verdict in verdicts if question_id in verdict} == {recorded.get(text)}, f"verdicts returned for question #{question_id}"
+    correct = sum(1 for is_correct in recorded.values() if is_correct)
+    assert storage.get_user_questions_solved(user_id) == questions, "questions solved"
+    assert storage.get_user_statistics(user_id)[7] == correct, "correct answers"
+    statistics = {row[0]: row[1:] for row in report(storage, REPORT_QUESTION_STATISTICS)}
+    assert [statistics[text] for text in texts] == [(1, int(recorded.get(text, False)), int(not recorded.get(text, True))) for text in texts], "question counters"
+    assert (storage.get_user_rank(user_id) is not None) == (correct > 0), "ranked"
+    assert storage.get_user_question(user_id) is None, "next question after answering everything"
+
+
+def test_concurrent_answers(scratch: Storage):
+    check_concurrent_answers(scratch)
\ No newline at end of file